@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+响应压缩基准
+
+在临时数据目录里导入 db.json，用进程内的 TestClient 请求几个常用接口，
+对比不压缩（identity）与 gzip / br 的响应字节数和服务端耗时；响应缓存
+命中时压缩好的字节直接复用，所以分别测“缓存命中”和“绕过缓存（登录用户）”两种情况。
+传输时间按 BANDWIDTH_MBPS（默认 10 Mbit/s）估算。
+
+用法：python bench_compression.py [每个接口的请求次数]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench-compression-")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from compression import ENCODINGS  # noqa: E402
+
+BANDWIDTH_MBPS = float(os.getenv("BANDWIDTH_MBPS", 10))
+
+
+def measure(client, url, encoding, rounds, headers=None):
+    """返回 (响应字节数, 服务端耗时中位数 ms)"""
+    headers = {**(headers or {}), "Accept-Encoding": encoding}
+    client.get(url, headers=headers)  # 预热（填充响应缓存）
+    timings = []
+    size = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = int(response.headers["content-length"])
+        assert response.headers.get("content-encoding", "identity") == encoding or size < main.COMPRESSION_MIN_SIZE
+    return size, statistics.median(timings)
+
+
+def run():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with TestClient(main.app) as client:
+        client.post("/auth/register", json={"email": "bench@example.com", "password": "bench"})
+        token = client.post("/auth/login", json={"email": "bench@example.com", "password": "bench"}).json()["access_token"]
+        slug = client.get("/posts?limit=1&sort=views_count").json()["items"][0]["slug"]
+        urls = ["/posts?limit=20", "/posts?limit=100", f"/posts/{slug}", "/tags"]
+        print(f"{'接口':<42}{'场景':<8}{'编码':<10}{'字节':>10}{'压缩率':>8}{'耗时 ms':>10}{'传输 ms':>10}")
+        for url in urls:
+            for scenario, headers in (("缓存", None), ("登录", {"Authorization": f"Bearer {token}"})):
+                baseline = None
+                for encoding in ("identity",) + ENCODINGS:
+                    size, latency = measure(client, url, encoding, rounds, headers)
+                    baseline = baseline or size
+                    transfer = size * 8 / (BANDWIDTH_MBPS * 1000)
+                    print(f"{url:<44}{scenario:<8}{encoding:<10}{size:>10}{size / baseline:>9.1%}"
+                          f"{latency:>10.2f}{transfer:>10.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+JSON 编解码基准
+
+把 db.json 按倍数放大（复制各集合的记录并重新编号），对比标准库 json 与
+orjson（jsoncodec 在安装了 orjson 时使用的实现）的序列化、反序列化耗时。
+“json indent=2” 一栏是旧版整库快照的写法，作为对照。
+
+用法：python bench_json.py [放大倍数 ...]     默认 1 10 50
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.json")
+
+
+def scaled_dataset(data, factor):
+    """各集合的记录复制 factor 份，id 依次错开"""
+    scaled = {}
+    for collection, records in data.items():
+        if not isinstance(records, list):
+            scaled[collection] = records
+            continue
+        step = max((r.get("id", 0) for r in records if isinstance(r, dict)), default=0)
+        scaled[collection] = [
+            {**record, "id": record["id"] + copy * step} if isinstance(record, dict) and "id" in record else record
+            for copy in range(factor)
+            for record in records
+        ]
+    return scaled
+
+
+def timed(fn, rounds):
+    """fn 的耗时中位数（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def bench(data, rounds):
+    compact = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    rows = [
+        ("json indent=2 编码", lambda: json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")),
+        ("json 编码", lambda: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+        ("json 解码", lambda: json.loads(compact)),
+    ]
+    if orjson is not None:
+        rows += [
+            ("orjson 编码", lambda: orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)),
+            ("orjson 解码", lambda: orjson.loads(compact)),
+        ]
+    return len(compact), [(name, timed(fn, rounds)) for name, fn in rows]
+
+
+def run(factors):
+    with open(DB_PATH, "rb") as f:
+        data = json.loads(f.read())
+    data.pop("_meta", None)
+    if orjson is None:
+        print("⚠️ 未安装 orjson，只测标准库 json")
+    for factor in factors:
+        dataset = scaled_dataset(data, factor)
+        size, results = bench(dataset, rounds=max(3, 50 // factor))
+        print(f"\n×{factor}  {size / 1024 / 1024:.2f} MB")
+        baseline = {"编码": None, "解码": None}
+        for name, ms in results:
+            kind = name.split()[-1]
+            if name.startswith("json ") and "indent" not in name:
+                baseline[kind] = ms
+            speedup = f"{baseline[kind] / ms:.1f}x" if baseline.get(kind) and not name.startswith("json") else ""
+            print(f"  {name:<18}{ms:>10.2f} ms{size / 1024 / 1024 / (ms / 1000):>10.1f} MB/s  {speedup}")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1, 10, 50])
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+全文搜索基准
+
+用 db.json 中文章的词汇随机生成不同规模的文章集合，建立索引后测量
+几类查询的耗时：少见词、常见词、多词组合，以及段文件的大小和重启时打开它的耗时。对照组是改造前的做法——
+每次查询把所有文章的标题和正文转小写再做子串匹配。
+写入一栏是新增、修改标题、删除一篇文章时更新索引的耗时，以及把这些增量合并进段的耗时。
+另外用 db.json 中的真实文章测量切词和建索引的吞吐量（每秒处理的 UTF-8 文本 MB 数）。
+
+用法：python bench_search.py [文章数 ...]     默认 1000 10000 100000
+"""
+
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search import SearchIndex, document_fields  # noqa: E402
+from storage import Change  # noqa: E402
+from tokenizer import tokenize  # noqa: E402
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.json")
+
+
+class _Posts:
+    """只提供 all / version / pinned 的最小存储，供 SearchIndex 建索引"""
+
+    def __init__(self, posts):
+        self.posts = posts
+
+    def all(self, collection):
+        return self.posts
+
+    def version(self, collection):
+        return 1
+
+    def pinned(self):
+        return nullcontext()
+
+
+def sample_posts():
+    with open(DB_PATH, "rb") as f:
+        return json.loads(f.read())["posts"]
+
+
+def synthetic_posts(count, seed=0):
+    """按 db.json 的词频随机拼出 count 篇文章（每篇约 300 词），并混入少量罕见词"""
+    sample = sample_posts()
+    vocabulary = [token for post in sample for token in tokenize(post.get("content", ""))]
+    tags = sorted({tag for post in sample for tag in post.get("tags") or []})
+    rng = random.Random(seed)
+    posts = []
+    for i in range(1, count + 1):
+        words = rng.choices(vocabulary, k=300)
+        if i % 1000 == 0:
+            words.append("quasar")
+        posts.append({
+            "id": i,
+            "title": " ".join(rng.choices(vocabulary, k=8)),
+            "summary": " ".join(rng.choices(vocabulary, k=20)),
+            "content": " ".join(words),
+            "tags": rng.sample(tags, 2),
+        })
+    return posts
+
+
+def timed(fn, rounds=20):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def substring_search(posts, q):
+    q = q.lower()
+    return [p for p in posts if q in p["title"].lower() or q in p["content"].lower()]
+
+
+def write_latency(index, posts, rounds=200):
+    """新增、修改标题、删除各 rounds 篇文章时 on_change 的平均耗时，以及随后合并的耗时"""
+    rng = random.Random(1)
+    next_id = max(post["id"] for post in posts) + 1
+    results = {}
+    start = time.perf_counter()
+    for i in range(rounds):
+        post = {**rng.choice(posts), "id": next_id + i}
+        index.on_change([Change("posts", post["id"], None, post)])
+    results["新增"] = (time.perf_counter() - start) * 1000 / rounds
+    targets = rng.sample(posts, rounds)
+    start = time.perf_counter()
+    for post in targets:
+        index.on_change([Change("posts", post["id"], post, {**post, "title": post["title"] + " quasar"})])
+    results["改标题"] = (time.perf_counter() - start) * 1000 / rounds
+    start = time.perf_counter()
+    for post in targets:
+        index.on_change([Change("posts", post["id"], {**post, "title": post["title"] + " quasar"}, None)])
+    results["删除"] = (time.perf_counter() - start) * 1000 / rounds
+    start = time.perf_counter()
+    index.merge()
+    results["合并"] = (time.perf_counter() - start) * 1000
+    return results
+
+
+def throughput(copies=200):
+    """切词与建索引的吞吐量：db.json 的文章复制 copies 份"""
+    posts = [{**post, "id": copy * 100000 + post["id"]} for copy in range(copies) for post in sample_posts()]
+    size = sum(len(text.encode("utf-8")) for post in posts for text in document_fields(post).values())
+    megabytes = size / 1024 / 1024
+    start = time.perf_counter()
+    for post in posts:
+        for field, text in document_fields(post).items():
+            tokenize(text, markdown=field == "content")
+    tokenizing = time.perf_counter() - start
+    start = time.perf_counter()
+    SearchIndex(_Posts(posts))
+    indexing = time.perf_counter() - start
+    print(f"文本 {megabytes:.1f} MB  切词 {megabytes / tokenizing:.1f} MB/s  建索引 {megabytes / indexing:.1f} MB/s")
+
+
+def run(sizes):
+    throughput()
+    queries = {"少见词": "quasar", "常见词": "vue", "多词": "vue api 组件"}
+    for size in sizes:
+        posts = synthetic_posts(size)
+        directory = tempfile.mkdtemp(prefix="bench-search-")
+        start = time.perf_counter()
+        index = SearchIndex(_Posts(posts), directory)
+        build = time.perf_counter() - start
+        # 段文件已经存在，重启只需映射它
+        start = time.perf_counter()
+        SearchIndex(_Posts(posts), directory)
+        reopen = time.perf_counter() - start
+        segment = index._index.segment
+        size_mb = os.path.getsize(os.path.join(directory, segment.name)) / 1024 / 1024
+        print(f"\n{size} 篇文章  建索引 {build:.2f} s  词数 {segment.term_count()}  "
+              f"段文件 {size_mb:.1f} MB  重启 {reopen * 1000:.2f} ms")
+        for name, q in queries.items():
+            total = index.search(q, 0, 10)[1]
+            latency = timed(lambda: index.search(q, 0, 10))
+            rounds = 3 if size >= 100000 else 10
+            baseline = timed(lambda: substring_search(posts, q), rounds=rounds)
+            print(f"  {name:<6}{q!r:<16}命中 {total:>7}   倒排 {latency:>8.2f} ms   子串扫描 {baseline:>9.2f} ms")
+        writes = write_latency(index, posts)
+        print("  写入  " + "   ".join(
+            f"{name} {ms:.2f} ms" + ("" if name == "合并" else "/篇") for name, ms in writes.items()
+        ))
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+输入提示基准
+
+用 bench_search.py 的方法随机生成文章（浏览量随机），另外生成同样多的用户，
+模拟逐字输入几个查询，测量每次按键时 Suggestions.suggest 的耗时。
+对照组是改造前 /search/users 的做法：每次把所有用户名转小写做子串匹配。
+
+用法：python bench_suggest.py [文章数 ...]     默认 1000 10000 100000
+"""
+
+import os
+import random
+import sys
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_search import synthetic_posts, timed  # noqa: E402
+from suggest import Suggestions  # noqa: E402
+
+QUERIES = ["vue 组件", "python", "前端开发", "a"]
+
+
+class _Store:
+    """只提供 all / pinned 的最小存储"""
+
+    def __init__(self, collections):
+        self.collections = collections
+
+    def all(self, collection):
+        return self.collections.get(collection, [])
+
+    def pinned(self):
+        return nullcontext()
+
+
+def synthetic_users(count, seed=0):
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [{
+        "id": i,
+        "username": "".join(rng.choices(letters, k=rng.randint(4, 10))),
+        "email": f"user{i}@example.com",
+        "followers_count": int(rng.paretovariate(1.2)),
+    } for i in range(1, count + 1)]
+
+
+def run(sizes):
+    for size in sizes:
+        rng = random.Random(size)
+        posts = [{**post, "views_count": int(rng.paretovariate(1.0) * 10)} for post in synthetic_posts(size)]
+        users = synthetic_users(size)
+        start = time.perf_counter()
+        suggestions = Suggestions(_Store({"posts": posts, "users": users}))
+        build = time.perf_counter() - start
+        print(f"\n{size} 篇文章 / {size} 个用户  建索引 {build:.2f} s")
+        for query in QUERIES:
+            # 逐字输入：每个前缀一次请求
+            latencies = [timed(lambda: suggestions.suggest(query[:n]), rounds=50) for n in range(1, len(query) + 1)]
+            print(f"  {query!r:<12} 每次按键 平均 {sum(latencies) / len(latencies):.3f} ms  最慢 {max(latencies):.3f} ms")
+        baseline = timed(lambda: [u for u in users if "ab" in u["username"].lower()], rounds=10)
+        print(f"  用户名子串扫描 {baseline:.3f} ms")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,162 @@
+"""
+响应压缩
+
+按请求的 Accept-Encoding 协商 br（brotli）或 gzip，只压缩超过阈值的文本类响应。
+响应缓存中的条目在存入时就压缩好各个编码（precompress），命中时直接返回，
+热点页面只压缩一次；其余响应由 CompressionMiddleware 逐个压缩。
+未安装 brotli 时只提供 gzip。
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+# 可以压缩的内容类型（图片等二进制文件本身已压缩过）
+COMPRESSIBLE_TYPES = ("application/json", "image/svg+xml", "text/", "application/javascript")
+
+# 没有响应体的状态
+NO_BODY_STATUSES = (204, 304)
+
+# 服务端的偏好顺序
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encoding(accept_encoding, encodings=ENCODINGS):
+    """按 Accept-Encoding（含 q 值）选出客户端接受、服务端偏好的编码，都不接受时返回 None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    best = None
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+
+def compress(body, encoding, thorough=False):
+    """压缩响应体；thorough 为 True 时用更高的压缩级别（只压缩一次、多次复用的场合）"""
+    if encoding == "br":
+        return brotli.compress(body, quality=8 if thorough else 4)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if thorough else 6, mtime=0)
+    raise ValueError(f"不支持的编码: {encoding}")
+
+
+def is_compressible(content_type):
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def precompress(body, minimum_size):
+    """响应体的各个编码版本 {编码: 字节}，identity 为原文；小于阈值时只有原文"""
+    variants = {"identity": body}
+    if len(body) >= minimum_size:
+        for encoding in ENCODINGS:
+            compressed = compress(body, encoding, thorough=True)
+            if len(compressed) < len(body):
+                variants[encoding] = compressed
+    return variants
+
+
+def _encoded_headers(headers):
+    """
+    编码后的响应头：强 ETag 改为弱 ETag（编码后的字节与原文不同，不能再声称逐字节相同，
+    If-None-Match 的比较忽略 W/ 前缀，协商缓存不受影响），并补上 Vary: Accept-Encoding
+    """
+    result = []
+    vary = False
+    for key, value in headers:
+        name = key.lower()
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        elif name == b"vary" and b"accept-encoding" in value.lower():
+            vary = True
+        result.append((key, value))
+    if not vary:
+        result.append((b"vary", b"Accept-Encoding"))
+    return result
+
+
+class CompressionMiddleware:
+    """
+    ASGI 中间件：压缩超过阈值的文本类响应
+
+    已带 Content-Encoding 的响应（例如来自响应缓存的预压缩版本）不再压缩；
+    不可压缩的类型（上传的图片等）、没有响应体的状态（204、304）、没有 Content-Length
+    的流式响应，以及声明的长度不到阈值的响应都不缓冲，直接透传。
+    """
+
+    def __init__(self, app, minimum_size=1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            # HEAD 响应没有响应体，Content-Length 应保持 GET 时的值
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = accepted_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in response_headers:
+                    passthrough = True
+                    await send({**message, "headers": _encoded_headers(message.get("headers", []))})
+                elif (
+                    not is_compressible(content_type)
+                    or message["status"] in NO_BODY_STATUSES
+                    or int(response_headers.get(b"content-length", 0)) < self.minimum_size
+                ):
+                    # 流式响应没有 Content-Length，按 0 处理，同样透传
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            response_headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            if len(body) >= self.minimum_size:
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    body = compressed
+                    response_headers = _encoded_headers(response_headers)
+                    response_headers.append((b"content-encoding", encoding.encode("ascii")))
+            response_headers.append((b"content-length", str(len(body)).encode("ascii")))
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
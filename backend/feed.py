@@ -0,0 +1,220 @@
+"""
+关注动态（/posts?type=following）
+
+每个用户的时间线是其关注的作者最近发表的文章，按 (发布时间, id) 排序，常驻内存且有长度上限。
+作者发表文章（create_post 提交后的变更通知）时，把文章推送进各粉丝已建立的时间线（写扩散）；
+粉丝数超过 fanout_limit 的热门作者不推送，读取时再与他们的文章列表归并（读扩散），
+避免一篇文章写入成千上万条时间线。时间线在用户第一次读取时建立，常驻的用户数按 LRU 限制。
+读一页只需 O(页大小 + 关注的热门作者数) 次访问，与关注数、文章总数无关。
+"""
+
+import heapq
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+
+def _entry(post):
+    """时间线中的一项：(发布时间, 文章 id)"""
+    return post.get("created_at") or "", post["id"]
+
+
+class _Timeline:
+    """一个用户的时间线"""
+
+    __slots__ = ("entries", "authors", "merged", "truncated")
+
+    def __init__(self, entries, authors, merged, truncated):
+        # 推送进来的文章，按 (发布时间, id) 升序
+        self.entries = entries
+        # 推送文章给它的作者，以及读取时归并的热门作者
+        self.authors = authors
+        self.merged = merged
+        # 是否有更早的文章因长度上限没有放进来（翻过末尾后改为直接查询作者的文章）
+        self.truncated = truncated
+
+
+class FollowingFeed:
+    """
+    关注动态的时间线
+
+    on_change 注册为存储的变更监听：新文章推送进粉丝的时间线，删除或改动发布时间的
+    文章从时间线里移除或调整位置；关注关系变化时丢弃该用户的时间线，下次读取时重建。
+    """
+
+    chunk_size = 64
+
+    def __init__(self, storage, capacity=500, fanout_limit=1000, max_users=10_000):
+        self.storage = storage
+        self.capacity = capacity
+        self.fanout_limit = fanout_limit
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._timelines = OrderedDict()
+        self._follower_counts = Counter()
+        self._popular = set()
+        # 每次变更加一：建立时间线期间有变更时，建好的时间线只用于本次读取，不保存
+        self._generation = 0
+        self.rebuild()
+
+    def __len__(self):
+        return len(self._timelines)
+
+    def rebuild(self):
+        """重新统计各作者的粉丝数并丢弃全部时间线"""
+        counts = Counter(follow["followingId"] for follow in self.storage.all("follows"))
+        with self._lock:
+            self._generation += 1
+            self._follower_counts = counts
+            self._popular = {author for author, n in counts.items() if n > self.fanout_limit}
+            self._timelines.clear()
+
+    def on_change(self, changes):
+        """存储的变更监听"""
+        if changes is None:
+            self.rebuild()
+            return
+        with self._lock:
+            self._generation += 1
+            for change in changes:
+                if change.collection == "follows":
+                    self._follow_changed(change)
+                elif change.collection == "posts":
+                    self._post_changed(change)
+
+    def _follow_changed(self, change):
+        """关注关系变化（需持有锁）"""
+        for follow, delta in ((change.before, -1), (change.after, 1)):
+            if follow is None:
+                continue
+            author = follow["followingId"]
+            self._follower_counts[author] += delta
+            popular = self._follower_counts[author] > self.fanout_limit
+            if popular != (author in self._popular):
+                # 作者在推送与归并之间切换，已建立的时间线都不再准确
+                if popular:
+                    self._popular.add(author)
+                else:
+                    self._popular.discard(author)
+                self._timelines.clear()
+            self._timelines.pop(follow["followerId"], None)
+
+    def _post_changed(self, change):
+        """文章新增、删除或改动了作者、发布时间（需持有锁）"""
+        before, after = change.before, change.after
+        if before is not None and after is not None and _entry(before) == _entry(after) \
+                and before.get("authorId") == after.get("authorId"):
+            return
+        if not self._timelines:
+            return
+        if before is not None:
+            for timeline in self._follower_timelines(before.get("authorId")):
+                self._remove(timeline, _entry(before))
+        if after is not None:
+            for timeline in self._follower_timelines(after.get("authorId")):
+                self._push(timeline, _entry(after))
+
+    def _follower_timelines(self, author):
+        """作者的粉丝中已建立时间线的（热门作者不推送）"""
+        if author is None or author in self._popular:
+            return
+        for follow in self.storage.find("follows", followingId=author):
+            timeline = self._timelines.get(follow["followerId"])
+            if timeline is not None and author in timeline.authors:
+                yield timeline
+
+    def _push(self, timeline, entry):
+        entries = timeline.entries
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            return
+        entries.insert(i, entry)
+        if len(entries) > self.capacity:
+            del entries[0]
+            timeline.truncated = True
+
+    def _remove(self, timeline, entry):
+        entries = timeline.entries
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _timeline(self, user_id):
+        """取用户的时间线，尚未建立时从各作者最新的文章建立"""
+        with self._lock:
+            timeline = self._timelines.get(user_id)
+            if timeline is not None:
+                self._timelines.move_to_end(user_id)
+                return timeline
+            generation = self._generation
+            popular = set(self._popular)
+        # 读最新的数据，而不是本次请求固定的快照（否则会漏掉之后已推送过的文章）
+        with self.storage.pinned():
+            following = {follow["followingId"] for follow in self.storage.find("follows", followerId=user_id)}
+            authors = following - popular
+            entries = []
+            truncated = False
+            for author in authors:
+                posts = self.storage.query(
+                    "posts", order_by="created_at", descending=True, limit=self.capacity, authorId=author
+                )[0]
+                truncated |= len(posts) == self.capacity
+                entries.extend(_entry(post) for post in posts)
+        entries.sort()
+        if len(entries) > self.capacity:
+            entries = entries[-self.capacity:]
+            truncated = True
+        timeline = _Timeline(entries, authors, following & popular, truncated)
+        with self._lock:
+            if self._generation == generation:
+                self._timelines[user_id] = timeline
+                while len(self._timelines) > self.max_users:
+                    self._timelines.popitem(last=False)
+        return timeline
+
+    def posts(self, user_id, after=None):
+        """
+        按发布时间从新到旧遍历用户关注的作者的文章 id
+
+        after 为上一页最后一篇的 (发布时间, id) 时从它之后开始。
+        时间线与各热门作者的文章按时间归并，只读取实际用到的部分。
+        """
+        if after is not None:
+            after = (after[0] or "", after[1])
+        timeline = self._timeline(user_id)
+        streams = [self._timeline_entries(timeline, after)]
+        streams += [self._author_entries(author, after) for author in timeline.merged]
+        for _, post_id in heapq.merge(*streams, reverse=True):
+            yield post_id
+
+    def _timeline_entries(self, timeline, after):
+        """时间线中 after 之后的项；时间线被截断过时，翻过末尾后接着查询推送作者的文章"""
+        position = None if after is None else tuple(after)
+        while True:
+            with self._lock:
+                entries = timeline.entries
+                end = len(entries) if position is None else bisect_left(entries, position)
+                chunk = entries[max(0, end - self.chunk_size):end]
+                truncated = timeline.truncated
+            if not chunk:
+                break
+            yield from reversed(chunk)
+            position = chunk[0]
+        if truncated:
+            yield from heapq.merge(
+                *(self._author_entries(author, position) for author in timeline.authors), reverse=True
+            )
+
+    def _author_entries(self, author, after):
+        """作者在 after 之后的文章（按发布时间从新到旧，走 (authorId, created_at) 索引）"""
+        position = after
+        while True:
+            posts = self.storage.query(
+                "posts", order_by="created_at", descending=True, limit=self.chunk_size,
+                after=position, authorId=author,
+            )[0]
+            for post in posts:
+                yield _entry(post)
+            if len(posts) < self.chunk_size:
+                return
+            position = (posts[-1].get("created_at"), posts[-1]["id"])
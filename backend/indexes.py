@@ -0,0 +1,335 @@
+"""
+内存表与二级索引（json 存储引擎使用）
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+from storage import contained_values, matches, sort_key
+
+
+class _BucketIndex:
+    """按键分桶的索引，支持写时复制：副本与原索引共享桶，修改某个桶前才复制它"""
+
+    bucket_type = dict
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._buckets = {}
+        # 写时复制的副本中已复制过的桶；None 表示所有桶都归自己所有
+        self._owned = None
+
+    def copy(self):
+        """浅复制：桶与原索引共享，修改某个桶前才复制它"""
+        clone = type(self)(self.fields)
+        clone._buckets = dict(self._buckets)
+        clone._owned = set()
+        return clone
+
+    def _writable_bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self.bucket_type()
+        elif self._owned is not None and key not in self._owned:
+            bucket = self.bucket_type(bucket)
+        else:
+            return bucket
+        self._buckets[key] = bucket
+        if self._owned is not None:
+            self._owned.add(key)
+        return bucket
+
+
+class HashIndex(_BucketIndex):
+    """字段组合 -> 记录 id 的哈希索引，桶内保持插入顺序"""
+
+    def key(self, record):
+        return tuple(record.get(field) for field in self.fields)
+
+    def add(self, record):
+        self._writable_bucket(self.key(record))[record["id"]] = None
+
+    def remove(self, record):
+        key = self.key(record)
+        if key not in self._buckets:
+            return
+        bucket = self._writable_bucket(key)
+        bucket.pop(record["id"], None)
+        if not bucket:
+            del self._buckets[key]
+
+    def ids(self, key):
+        return self._buckets.get(key, ())
+
+
+class SortedIndex(_BucketIndex):
+    """
+    有序索引：前面的字段等值分桶，最后一个字段排序
+
+    桶内是按 (排序键, id) 升序排列的数组，增删时用二分查找原地维护，
+    取某个位置之后的前 N 条只需 O(log n + N)。排序键见 storage.sort_key。
+    """
+
+    bucket_type = list
+
+    def __init__(self, fields):
+        super().__init__(fields)
+        self.prefix = fields[:-1]
+        self.field = fields[-1]
+
+    def key(self, record):
+        return tuple(record.get(field) for field in self.prefix)
+
+    def entry(self, record):
+        return sort_key(record, self.field), record["id"]
+
+    def add(self, record):
+        insort(self._writable_bucket(self.key(record)), self.entry(record))
+
+    def remove(self, record):
+        key = self.key(record)
+        if key not in self._buckets:
+            return
+        bucket = self._writable_bucket(key)
+        entry = self.entry(record)
+        i = bisect_left(bucket, entry)
+        if i < len(bucket) and bucket[i] == entry:
+            del bucket[i]
+        if not bucket:
+            del self._buckets[key]
+
+    def entries(self, key):
+        """桶内按 (排序键, id) 升序的数组（只读）"""
+        return self._buckets.get(key, ())
+
+    def ids(self, key, descending=False, after=None):
+        """
+        按顺序遍历桶内的记录 id
+
+        after 为 (排序值, id) 时从它之后的位置开始（方向与 descending 一致）。
+        """
+        entries = self.entries(key)
+        if descending:
+            end = len(entries) if after is None else bisect_left(entries, _after_entry(after))
+            return (entries[i][1] for i in range(end - 1, -1, -1))
+        start = 0 if after is None else bisect_right(entries, _after_entry(after))
+        return (entries[i][1] for i in range(start, len(entries)))
+
+
+class PostingIndex(_BucketIndex):
+    """
+    列表字段的倒排索引：列表中的每个值 -> 包含它的记录 id（升序数组）
+
+    新记录的 id 总是最大的，插入基本是在数组末尾追加。
+    """
+
+    bucket_type = list
+
+    def __init__(self, fields):
+        super().__init__(fields)
+        self.field = fields[0]
+
+    def values(self, record):
+        values = record.get(self.field)
+        if not isinstance(values, list):
+            return set()
+        return {v for v in values if isinstance(v, (str, int, float))}
+
+    def add(self, record):
+        for value in self.values(record):
+            bucket = self._writable_bucket(value)
+            if not bucket or bucket[-1] < record["id"]:
+                bucket.append(record["id"])
+            else:
+                insort(bucket, record["id"])
+
+    def remove(self, record):
+        for value in self.values(record):
+            if value not in self._buckets:
+                continue
+            bucket = self._writable_bucket(value)
+            i = bisect_left(bucket, record["id"])
+            if i < len(bucket) and bucket[i] == record["id"]:
+                del bucket[i]
+            if not bucket:
+                del self._buckets[value]
+
+    def ids(self, value):
+        """包含 value 的记录 id（升序，只读）"""
+        return self._buckets.get(value, ())
+
+
+def intersect(postings):
+    """多个升序 id 数组的交集：从最短的出发，在其余数组中二分查找"""
+    postings = sorted(postings, key=len)
+    if not postings:
+        return []
+    result = list(postings[0])
+    for other in postings[1:]:
+        if not result:
+            break
+        kept = []
+        lo = 0
+        for record_id in result:
+            lo = bisect_left(other, record_id, lo)
+            if lo == len(other):
+                break
+            if other[lo] == record_id:
+                kept.append(record_id)
+        result = kept
+    return result
+
+
+def union(postings):
+    """多个升序 id 数组的并集（升序）"""
+    postings = [p for p in postings if p]
+    if len(postings) == 1:
+        return list(postings[0])
+    return sorted(set().union(*postings))
+
+
+def _after_entry(after):
+    value, record_id = after
+    return (value is not None, value), record_id
+
+
+class Table:
+    """
+    一个集合：按 id 存放记录，并维护该集合上的哈希索引
+
+    所有修改都经过 add / remove / change，哈希索引、有序索引、倒排索引与记录始终一致。
+    记录对象从不被原地修改（change 会换成新的字典），因此 copy() 出的新表
+    可以与旧表共享记录，旧表上的读取不受新表修改的影响。
+    sequence 是已分配过的最大 id，只增不减，删除记录后 id 也不会被复用。
+    version 是最后一次修改该表的日志序号（由存储引擎在提交、重放时设置）。
+    """
+
+    def __init__(self, index_fields=(), records=(), sort_fields=(), list_fields=()):
+        self.records = {}
+        self.indexes = [HashIndex(fields) for fields in index_fields]
+        self.sorted_indexes = [SortedIndex(fields) for fields in sort_fields]
+        self.posting_indexes = {field: PostingIndex((field,)) for field in list_fields}
+        self.sequence = 0
+        self.version = 0
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def copy(self):
+        """写时复制：复制 id -> 记录的映射，记录与索引桶共享"""
+        clone = Table()
+        clone.records = dict(self.records)
+        clone.indexes = [index.copy() for index in self.indexes]
+        clone.sorted_indexes = [index.copy() for index in self.sorted_indexes]
+        clone.posting_indexes = {field: index.copy() for field, index in self.posting_indexes.items()}
+        clone.sequence = self.sequence
+        clone.version = self.version
+        return clone
+
+    def next_id(self):
+        """分配下一个 id（调用方需持有存储的写锁）"""
+        self.sequence += 1
+        return self.sequence
+
+    def add(self, record):
+        self.records[record["id"]] = record
+        if record["id"] > self.sequence:
+            self.sequence = record["id"]
+        for index in self.indexes:
+            index.add(record)
+        for index in self.sorted_indexes:
+            index.add(record)
+        for index in self.posting_indexes.values():
+            index.add(record)
+
+    def remove(self, record_id):
+        record = self.records.pop(record_id)
+        for index in self.indexes:
+            index.remove(record)
+        for index in self.sorted_indexes:
+            index.remove(record)
+        for index in self.posting_indexes.values():
+            index.remove(record)
+        return record
+
+    def change(self, record, changes):
+        """用更新后的新记录替换原记录并同步受影响的索引，返回新记录"""
+        return self._replace(record, {**record, **changes}, changes)
+
+    def unset(self, record, fields):
+        """用去掉指定字段的新记录替换原记录，返回新记录"""
+        return self._replace(record, {k: v for k, v in record.items() if k not in fields}, fields)
+
+    def _replace(self, record, updated, fields):
+        touched = [
+            index for index in self.indexes + self.sorted_indexes + list(self.posting_indexes.values())
+            if any(f in fields for f in index.fields)
+        ]
+        for index in touched:
+            index.remove(record)
+        self.records[record["id"]] = updated
+        for index in touched:
+            index.add(updated)
+        return updated
+
+    def _best_index(self, conditions):
+        best = None
+        for index in self.indexes:
+            if all(field in conditions for field in index.fields):
+                if best is None or len(index.fields) > len(best.fields):
+                    best = index
+        return best
+
+    def _candidates(self, conditions):
+        index = self._best_index(conditions)
+        if index is None:
+            return self.records.values()
+        key = tuple(conditions[field] for field in index.fields)
+        return (self.records[i] for i in index.ids(key))
+
+    def sorted_index(self, order_by, conditions):
+        """能直接按 order_by 顺序遍历满足条件记录的有序索引（分桶字段都在条件里），没有时返回 None"""
+        best = None
+        for index in self.sorted_indexes:
+            if index.field == order_by and all(field in conditions for field in index.prefix):
+                if best is None or len(index.prefix) > len(best.prefix):
+                    best = index
+        return best
+
+    def posting_ids(self, contains=None, contains_any=None):
+        """
+        满足 contains / contains_any 的记录 id（升序），由倒排表求交集、并集得到
+
+        条件中有字段没有倒排索引时返回 None。
+        """
+        postings = []
+        for field, value in (contains or {}).items():
+            index = self.posting_indexes.get(field)
+            if index is None:
+                return None
+            postings.extend(index.ids(v) for v in contained_values(value))
+        for field, value in (contains_any or {}).items():
+            index = self.posting_indexes.get(field)
+            if index is None:
+                return None
+            postings.append(union(index.ids(v) for v in contained_values(value)))
+        return intersect(postings)
+
+    def lookup(self, conditions):
+        """满足全部等值条件的记录；有合适的索引时只检查索引命中的记录"""
+        return [r for r in self._candidates(conditions) if matches(r, conditions)]
+
+    def first(self, conditions):
+        for record in self._candidates(conditions):
+            if matches(record, conditions):
+                return record
+        return None
+
+    def count(self, conditions):
+        if not conditions:
+            return len(self.records)
+        index = self._best_index(conditions)
+        if index is not None and len(index.fields) == len(conditions):
+            return len(index.ids(tuple(conditions[field] for field in index.fields)))
+        return len(self.lookup(conditions))
@@ -0,0 +1,669 @@
+"""
+JSON 文件存储引擎（常驻内存）
+
+启动时加载数据目录中的分段快照并重放写前日志，之后所有读取都直接走内存。
+内存数据按“代”发布：读取面对的是不可变的一代（Snapshot），写事务在写时复制的
+副本上修改，提交后原子地发布为新的一代，读取无需加锁，也不会看到写了一半的状态。
+写入统一通过事务提交：每个事务以一行紧凑 JSON 追加到日志并 fsync，
+写入成本只与改动大小相关；后台压缩任务定期只重写被修改过的分段（见 segments.py）。
+数据目录尚未初始化时，从旧的 db.json（及其日志）导入。
+"""
+
+import contextvars
+import heapq
+import os
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import islice
+from typing import Optional
+
+import jsoncodec
+import segments
+from indexes import Table
+from process_lock import ProcessLock
+from storage import (
+    LIST_INDEXES, LOOKUP_INDEXES, SORT_INDEXES, Change, StorageEngine, matches, matches_contains, sort_key,
+)
+
+# 旧版 db.json 中保存元信息（已合并的日志序号）的键，不是数据集合
+META_KEY = "_meta"
+
+
+def _dumps_line(entry):
+    return jsoncodec.dumps(entry) + b"\n"
+
+
+class Snapshot:
+    """
+    一代数据的只读视图
+
+    发布后其中的表与记录都不再被修改，可以在任意线程中无锁读取。
+    lsn 是这一代包含的最后一条日志的序号。
+    """
+
+    def __init__(self, tables, lsn=0):
+        self.tables = tables
+        self.lsn = lsn
+
+    def all(self, collection):
+        table = self.tables.get(collection)
+        return list(table.records.values()) if table else []
+
+    def get(self, collection, record_id) -> Optional[dict]:
+        table = self.tables.get(collection)
+        return table.records.get(record_id) if table else None
+
+    def find_one(self, collection, **conditions) -> Optional[dict]:
+        table = self.tables.get(collection)
+        return table.first(conditions) if table else None
+
+    def find(self, collection, **conditions):
+        table = self.tables.get(collection)
+        return table.lookup(conditions) if table else []
+
+    def count(self, collection, **conditions):
+        table = self.tables.get(collection)
+        return table.count(conditions) if table else 0
+
+    def version(self, collection):
+        table = self.tables.get(collection)
+        return table.version if table else 0
+
+    def query(self, collection, order_by=None, descending=False, offset=0, limit=None,
+              contains=None, contains_any=None, after=None, **conditions):
+        table = self.tables.get(collection)
+        if table and (contains or contains_any):
+            ids = table.posting_ids(contains, contains_any)
+            if ids is not None:
+                return self._query_postings(table, ids, order_by, descending, offset, limit, after, conditions)
+        index = table.sorted_index(order_by, conditions) if table and order_by else None
+        if index is not None:
+            return self._query_sorted(table, index, descending, offset, limit, contains, contains_any, after, conditions)
+        records = self.find(collection, **conditions)
+        if contains or contains_any:
+            records = [r for r in records if matches_contains(r, contains, contains_any)]
+        total = len(records)
+        if order_by:
+            def key(r):
+                return sort_key(r, order_by), r["id"]
+        else:
+            # 不排序时按 id 升序返回
+            descending = False
+
+            def key(r):
+                return r["id"]
+        if after is not None:
+            value, record_id = after
+            after_key = ((value is not None, value), record_id) if order_by else record_id
+            if descending:
+                records = [r for r in records if key(r) < after_key]
+            else:
+                records = [r for r in records if key(r) > after_key]
+        if order_by:
+            records.sort(key=key, reverse=descending)
+        end = None if limit is None else offset + limit
+        return records[offset:end], total
+
+    @staticmethod
+    def _query_sorted(table, index, descending, offset, limit, contains, contains_any, after, conditions):
+        """沿有序索引取一页：只访问页内（以及被其余条件过滤掉）的记录，不再整体排序"""
+        key = tuple(conditions[field] for field in index.prefix)
+        rest = {field: value for field, value in conditions.items() if field not in index.prefix}
+
+        def selected(ids):
+            for record_id in ids:
+                record = table.records[record_id]
+                if matches(record, rest) and matches_contains(record, contains, contains_any):
+                    yield record
+
+        end = None if limit is None else offset + limit
+        page = list(islice(selected(index.ids(key, descending, after)), offset, end))
+        if rest or contains or contains_any:
+            total = sum(1 for _ in selected(record_id for _, record_id in index.entries(key)))
+        else:
+            total = len(index.entries(key))
+        return page, total
+
+    @staticmethod
+    def _query_postings(table, ids, order_by, descending, offset, limit, after, conditions):
+        """
+        按倒排表求出的记录 id（升序）取一页，总数就是 id 的个数
+
+        命中的记录占比大时沿有序索引遍历、跳过不在其中的记录；
+        占比小时直接取出这些记录排序，不必遍历整个有序索引。
+        """
+        if conditions:
+            ids = [i for i in ids if matches(table.records[i], conditions)]
+        total = len(ids)
+        end = None if limit is None else offset + limit
+        if not order_by:
+            # 不排序时按 id 升序返回
+            start = 0 if after is None else bisect_right(ids, after[1])
+            stop = None if end is None else start + end
+            return [table.records[i] for i in ids[start + offset:stop]], total
+        index = table.sorted_index(order_by, conditions)
+        if index is not None:
+            key = tuple(conditions[field] for field in index.prefix)
+            if total * 8 >= len(index.entries(key)):
+                members = set(ids)
+                selected = (i for i in index.ids(key, descending, after) if i in members)
+                return [table.records[i] for i in islice(selected, offset, end)], total
+        entries = [(sort_key(table.records[i], order_by), i) for i in ids]
+        if after is not None:
+            value, record_id = after
+            after_key = ((value is not None, value), record_id)
+            entries = [e for e in entries if (e < after_key if descending else e > after_key)]
+        if end is None:
+            entries.sort(reverse=descending)
+        else:
+            entries = (heapq.nlargest if descending else heapq.nsmallest)(end, entries)
+        return [table.records[i] for _, i in entries[offset:]], total
+
+
+class Transaction:
+    """
+    写事务
+
+    在存储的写锁内执行，修改作用在当前一代数据的副本上（集合第一次被修改时
+    复制），事务内的读取能看到本事务已做的修改。正常结束时副本作为新的一代
+    发布；抛出异常时副本直接丢弃，不会写入日志，读者也从未看到过这些修改。
+    ops 是要写入日志的操作，changes 是发布后通知监听者的记录变更。
+    """
+
+    def __init__(self, snapshot):
+        self.tables = dict(snapshot.tables)
+        self._copied = set()
+        self._view = Snapshot(self.tables)
+        self.ops = []
+        self.changes = []
+
+    def _table(self, collection):
+        """取得可修改的表（本事务中第一次修改时复制）"""
+        if collection not in self._copied:
+            base = self.tables.get(collection)
+            self.tables[collection] = base.copy() if base is not None else new_table(collection)
+            self._copied.add(collection)
+        return self.tables[collection]
+
+    @property
+    def changed(self):
+        return bool(self._copied)
+
+    @property
+    def modified(self):
+        """本事务修改过的集合"""
+        return self._copied
+
+    # —— 读取（包含本事务的修改）——
+    def all(self, collection):
+        return self._view.all(collection)
+
+    def get(self, collection, record_id):
+        return self._view.get(collection, record_id)
+
+    def find_one(self, collection, **conditions):
+        return self._view.find_one(collection, **conditions)
+
+    def find(self, collection, **conditions):
+        return self._view.find(collection, **conditions)
+
+    def count(self, collection, **conditions):
+        return self._view.count(collection, **conditions)
+
+    def query(self, collection, **options):
+        return self._view.query(collection, **options)
+
+    def version(self, collection):
+        return self._view.version(collection)
+
+    # —— 修改 ——
+    def insert(self, collection, record):
+        """插入记录并从集合的序列分配 id，返回插入后的记录"""
+        table = self._table(collection)
+        record = {"id": table.next_id(), **record}
+        table.add(record)
+        self.ops.append(["insert", collection, record])
+        self.changes.append(Change(collection, record["id"], None, record))
+        return record
+
+    def update(self, collection, record_id, changes):
+        """更新记录的部分字段，返回更新后的记录"""
+        table = self._table(collection)
+        record = table.records.get(record_id)
+        if record is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        updated = table.change(record, changes)
+        self.ops.append(["update", collection, record_id, dict(changes)])
+        self.changes.append(Change(collection, record_id, record, updated))
+        return updated
+
+    def unset(self, collection, record_id, fields):
+        """删除记录中的若干字段，返回更新后的记录"""
+        table = self._table(collection)
+        record = table.records.get(record_id)
+        if record is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        updated = table.unset(record, fields)
+        self.ops.append(["unset", collection, record_id, list(fields)])
+        self.changes.append(Change(collection, record_id, record, updated))
+        return updated
+
+    def increment(self, collection, record_id, field, delta=1, minimum=0):
+        """计数字段加减，结果不低于 minimum，返回新值"""
+        record = self.get(collection, record_id)
+        if record is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        value = max(minimum, record.get(field, 0) + delta)
+        # 日志里记录结果值而不是增量，重放是幂等的
+        self.update(collection, record_id, {field: value})
+        return value
+
+    def delete(self, collection, record_id):
+        """删除一条记录，返回被删除的记录"""
+        table = self._table(collection)
+        if record_id not in table.records:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        record = table.remove(record_id)
+        self.ops.append(["delete", collection, record_id])
+        self.changes.append(Change(collection, record_id, record, None))
+        return record
+
+    def delete_where(self, collection, **conditions):
+        """删除所有满足条件的记录，返回删除数量"""
+        targets = [r["id"] for r in self.find(collection, **conditions)]
+        for record_id in targets:
+            self.delete(collection, record_id)
+        return len(targets)
+
+    def apply(self, op):
+        """应用其他 worker 已提交的日志操作（不再记入本事务的日志）"""
+        change = apply_op(self._table, op)
+        if change is not None:
+            self.changes.append(change)
+
+
+def new_table(collection, records=()):
+    return Table(
+        LOOKUP_INDEXES.get(collection, []), records, SORT_INDEXES.get(collection, []),
+        LIST_INDEXES.get(collection, []),
+    )
+
+
+def _table_getter(tables):
+    def get_table(collection):
+        table = tables.get(collection)
+        if table is None:
+            table = tables[collection] = new_table(collection)
+        return table
+    return get_table
+
+
+def apply_op(get_table, op):
+    """
+    把一条日志操作应用到 get_table(集合) 返回的可修改表（重放时使用）
+
+    返回对应的 Change；记录已不存在、操作没有效果时返回 None。
+    """
+    kind, collection = op[0], op[1]
+    table = get_table(collection)
+    if kind == "insert":
+        before = table.records.get(op[2]["id"])
+        if before is not None:
+            table.remove(before["id"])
+        table.add(op[2])
+        return Change(collection, op[2]["id"], before, op[2])
+    record = table.records.get(op[2])
+    if record is None:
+        return None
+    if kind == "update":
+        return Change(collection, op[2], record, table.change(record, op[3]))
+    if kind == "unset":
+        return Change(collection, op[2], record, table.unset(record, op[3]))
+    if kind == "delete":
+        table.remove(op[2])
+        return Change(collection, op[2], record, None)
+    return None
+
+
+def journal_paths(path):
+    """旧版快照对应的日志文件，以及压缩期间被轮转出去的旧日志"""
+    journal_path = os.path.splitext(path)[0] + ".journal"
+    return journal_path, journal_path + ".compacting"
+
+
+def _build_tables(data, sequences, lsn=0, versions=None):
+    tables = {
+        collection: new_table(collection, records)
+        for collection, records in data.items()
+        if isinstance(records, list)
+    }
+    # 快照记录了各集合的版本时沿用它们（重启前后版本不变）；旧快照只知道整体的日志序号，
+    # 各集合的版本都从它开始
+    versions = versions or {}
+    for collection in versions:
+        tables.setdefault(collection, new_table(collection))
+    for collection, table in tables.items():
+        table.version = versions.get(collection, lsn)
+    # 快照里记录的序列值可能大于现存的最大 id（最大的记录已被删除）
+    get_table = _table_getter(tables)
+    for collection, sequence in sequences.items():
+        table = get_table(collection)
+        table.sequence = max(table.sequence, sequence)
+    return tables
+
+
+def recover_legacy(path):
+    """加载旧版单文件快照 db.json 并重放它的日志，返回 (内存表, 最后的日志序号)"""
+    data = jsoncodec.load(path)
+    meta = data.pop(META_KEY, {})
+    lsn = meta.get("lsn", 0)
+    tables = _build_tables(data, meta.get("sequences", {}), lsn)
+    journal_path, rotated_journal_path = journal_paths(path)
+    for journal in (rotated_journal_path, journal_path):
+        lsn = _replay(tables, journal, lsn)[0]
+    return tables, lsn
+
+
+def recover(data_dir, seed_path=None):
+    """
+    加载分段快照、建立索引并按顺序重放日志
+
+    返回 (内存表, 最后的日志序号, 需要重写的分段)。数据目录还没有
+    manifest 时从 seed_path（旧版 db.json）导入，全部分段都需要写出。
+    加载期间若其他 worker 完成了一次压缩（manifest 变化），重新加载。
+    """
+    while True:
+        manifest = segments.read_manifest(data_dir)
+        if manifest is None:
+            if seed_path and os.path.exists(seed_path):
+                tables, lsn = recover_legacy(seed_path)
+            else:
+                tables, lsn = {}, 0
+            dirty = segments.all_segments()
+        else:
+            lsn = manifest.get("lsn", 0)
+            tables = _build_tables(
+                segments.load_segments(data_dir), manifest.get("sequences", {}), lsn, manifest.get("versions")
+            )
+            dirty = set()
+        journal_path = os.path.join(data_dir, segments.JOURNAL)
+        # 压缩完成前崩溃时，轮转出去的旧日志还在，需要先重放
+        for journal in (journal_path + ".compacting", journal_path):
+            lsn, touched = _replay(tables, journal, lsn)
+            dirty |= touched
+        if segments.read_manifest(data_dir) == manifest:
+            return tables, lsn, dirty
+
+
+def _replay(tables, journal, lsn):
+    """重放一个日志文件，返回 (最后的日志序号, 被修改的分段)"""
+    touched = set()
+    if not os.path.exists(journal):
+        return lsn, touched
+    get_table = _table_getter(tables)
+    valid_end = 0
+    with open(journal, "rb") as f:
+        for line in f:
+            try:
+                entry = jsoncodec.loads(line)
+            except ValueError:
+                break
+            valid_end += len(line)
+            if entry["lsn"] <= lsn:
+                continue
+            for op in entry["ops"]:
+                apply_op(get_table, op)
+                get_table(op[1]).version = entry["lsn"]
+                touched |= segments.touched_segments(op)
+            lsn = entry["lsn"]
+    if valid_end < os.path.getsize(journal):
+        # 崩溃时写了一半的最后一行，该事务未提交成功，截掉以免后续追加接在坏行后面
+        with open(journal, "r+b") as f:
+            f.truncate(valid_end)
+    return lsn, touched
+
+
+def load_json_dataset(data_dir, seed_path=None):
+    """加载完整数据集（用于迁移到其他引擎），返回 (各集合记录, 各集合序列值)"""
+    tables = recover(data_dir, seed_path)[0]
+    data = {collection: list(table.records.values()) for collection, table in tables.items()}
+    sequences = {collection: table.sequence for collection, table in tables.items()}
+    return data, sequences
+
+
+class JsonStore(StorageEngine):
+    """
+    基于分段快照 + 追加写日志的常驻内存存储
+
+    读取走当前发布的一代；在 pinned() 范围内（每个请求一次）固定读同一代，
+    同一请求中的多次读取彼此一致，本请求自己提交的写入之后会切换到新的一代。
+
+    支持多个 worker 进程共用一个数据目录：写事务持有跨进程写锁，先读入其他
+    worker 追加的日志再修改；读取前调用 refresh() 检查日志是否有新内容
+    （按 inode 与文件大小判断），只重放新增的部分。
+    """
+
+    # 日志超过该大小时，周期维护会把它合并进分段快照
+    compact_threshold = 1024 * 1024
+
+    def __init__(self, data_dir, seed_path=None):
+        super().__init__()
+        self.data_dir = data_dir
+        self.seed_path = seed_path
+        os.makedirs(data_dir, exist_ok=True)
+        self.journal_path = os.path.join(data_dir, segments.JOURNAL)
+        self.rotated_journal_path = self.journal_path + ".compacting"
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        # 跨进程：写锁串行化日志追加与轮转，压缩锁保证同一时间只有一个 worker 写分段
+        self._write_lock = ProcessLock(os.path.join(data_dir, "write.lock"))
+        self._compaction_lock = ProcessLock(os.path.join(data_dir, "compact.lock"))
+        self._journal = None
+        self._dirty = set()
+        self._pinned = contextvars.ContextVar(f"json-store-{id(self)}", default=None)
+        with self._lock, self._write_lock:
+            self._load()
+        if segments.read_manifest(data_dir) is None:
+            # 首次启动（或从 db.json 导入）：立即写出完整的数据目录
+            self.compact()
+
+    def _load(self):
+        """从磁盘加载全部数据（需持有写锁：重放时可能截掉残缺的日志尾）"""
+        if self._journal is not None:
+            self._journal.close()
+        tables, self._lsn, dirty = recover(self.data_dir, self.seed_path)
+        self._dirty |= dirty
+        self._publish(tables)
+        self._open_journal()
+        self._journal_offset = self._journal.seek(0, os.SEEK_END)
+
+    def _open_journal(self):
+        self._journal = open(self.journal_path, "a+b")
+        self._journal_ino = os.fstat(self._journal.fileno()).st_ino
+        self._journal_offset = 0
+
+    # —— 数据的代 ——
+    def _publish(self, tables):
+        """把修改后的表发布为新的一代（引用替换是原子的，读者无需加锁）"""
+        self._snapshot = Snapshot(tables, self._lsn)
+        if self._pinned.get() is not None:
+            # 当前请求刚提交了写入，之后的读取应能看到它
+            self._pinned.set(self._snapshot)
+
+    def snapshot(self):
+        """当前读取所用的一代（在 pinned() 范围内是固定的那一代）"""
+        return self._pinned.get() or self._snapshot
+
+    @contextmanager
+    def pinned(self):
+        token = self._pinned.set(self._snapshot)
+        try:
+            yield
+        finally:
+            self._pinned.reset(token)
+
+    # —— 多进程同步 ——
+    def refresh(self):
+        """读入其他 worker 提交的修改；日志没有变化时只需一次 stat"""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return  # 其他 worker 正在轮转日志，下次再读
+        if st.st_ino == self._journal_ino and st.st_size == self._journal_offset:
+            return
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        """重放日志中尚未读过的完整记录（需持有线程锁）"""
+        if not self._read_journal_tail():
+            return
+        try:
+            ino = os.stat(self.journal_path).st_ino
+        except FileNotFoundError:
+            return
+        if ino != self._journal_ino:
+            # 日志已被其他 worker 轮转：旧文件已读完，接着读新日志
+            self._journal.close()
+            self._open_journal()
+            self._read_journal_tail()
+
+    def _read_journal_tail(self):
+        """读取当前日志文件的新内容，返回 False 表示已整体重新加载"""
+        self._journal.seek(self._journal_offset)
+        data = self._journal.read()
+        # 其他 worker 可能正写到一半，只处理以换行结尾的完整记录
+        end = data.rfind(b"\n") + 1
+        tx = Transaction(self._snapshot)
+        for line in data[:end].splitlines():
+            entry = jsoncodec.loads(line)
+            if entry["lsn"] <= self._lsn:
+                continue
+            if entry["lsn"] > self._lsn + 1:
+                # 期间其他 worker 压缩了不止一次，中间的日志已经不在了
+                with self._write_lock:
+                    self._load()
+                self._notify(None)
+                return False
+            for op in entry["ops"]:
+                tx.apply(op)
+                tx.tables[op[1]].version = entry["lsn"]
+                self._dirty |= segments.touched_segments(op)
+            self._lsn = entry["lsn"]
+        self._journal_offset += end
+        if tx.changed:
+            self._publish(tx.tables)
+            self._notify(tx.changes)
+        return True
+
+    # —— 读取 ——
+    def all(self, collection):
+        return self.snapshot().all(collection)
+
+    def get(self, collection, record_id) -> Optional[dict]:
+        return self.snapshot().get(collection, record_id)
+
+    def find_one(self, collection, **conditions) -> Optional[dict]:
+        return self.snapshot().find_one(collection, **conditions)
+
+    def find(self, collection, **conditions):
+        return self.snapshot().find(collection, **conditions)
+
+    def count(self, collection, **conditions):
+        return self.snapshot().count(collection, **conditions)
+
+    def query(self, collection, **options):
+        return self.snapshot().query(collection, **options)
+
+    def version(self, collection):
+        return self.snapshot().version(collection)
+
+    # —— 写入 ——
+    @contextmanager
+    def transaction(self):
+        """开启写事务，正常退出时把修改追加到日志并发布新的一代；异常时直接丢弃"""
+        with self._lock, self._write_lock:
+            self._catch_up()
+            tx = Transaction(self._snapshot)
+            yield tx
+            if tx.ops:
+                self._append(tx.ops)
+                for collection in tx.modified:
+                    tx.tables[collection].version = self._lsn
+                self._publish(tx.tables)
+                self._notify(tx.changes)
+
+    def _append(self, ops):
+        """追加一条日志记录（需持有写锁，且已读完日志）"""
+        if os.fstat(self._journal.fileno()).st_size != self._journal_offset:
+            # 其他 worker 写到一半时崩溃留下的残缺记录
+            self._journal.truncate(self._journal_offset)
+        line = _dumps_line({"lsn": self._lsn + 1, "ops": ops})
+        self._journal.write(line)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_offset += len(line)
+        self._lsn += 1
+        for op in ops:
+            self._dirty |= segments.touched_segments(op)
+
+    def journal_size(self):
+        return self._journal_offset
+
+    # —— 日志压缩 ——
+    def compact(self):
+        """
+        把日志合并进分段快照：锁内取得当前一代并轮转日志，锁外序列化与写盘
+
+        分段逐个原子替换，最后写 manifest。中途崩溃时 manifest 仍指向旧的日志序号，
+        重启后重放轮转出去的日志即可（日志操作是幂等的）。
+        """
+        with self._compact_lock, self._compaction_lock:
+            with self._lock, self._write_lock:
+                self._catch_up()
+                if not self._dirty and self._journal_offset == 0:
+                    return
+                dirty, self._dirty = self._dirty, set()
+                snapshot = self._snapshot
+                self._rotate_journal()
+
+            manifest = {
+                "lsn": snapshot.lsn,
+                "sequences": {name: table.sequence for name, table in snapshot.tables.items()},
+                "versions": {name: table.version for name, table in snapshot.tables.items()},
+            }
+            try:
+                for name in dirty:
+                    segments.write_segment(self.data_dir, name, segments.serialize_segment(name, snapshot.tables))
+                segments.write_manifest(self.data_dir, manifest)
+            except BaseException:
+                # 写盘失败：这些分段下次压缩时重写，轮转出去的日志保留到那时
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            os.remove(self.rotated_journal_path)
+
+    def _rotate_journal(self):
+        """把当前日志移到 .compacting；上次压缩失败留下的旧日志还在时接在它后面"""
+        self._journal.close()
+        if os.path.exists(self.rotated_journal_path):
+            with open(self.journal_path, "rb") as src, open(self.rotated_journal_path, "ab") as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.rotated_journal_path)
+        self._open_journal()
+
+    def maintain(self):
+        self.refresh()
+        if self.journal_size() >= self.compact_threshold:
+            self.compact()
+
+    def close(self):
+        self.compact()
+        self._journal.close()
+        self._write_lock.close()
+        self._compaction_lock.close()
@@ -0,0 +1,39 @@
+"""
+JSON 编解码
+
+安装了 orjson 时用它（比标准库快数倍），否则退回标准库 json，两者输出相同的
+紧凑 UTF-8 格式（不转义中文）。存储引擎的分段快照、写前日志和 API 响应都经过这里。
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj, indent=False):
+        """序列化为 UTF-8 字节；indent 为 True 时缩进两格（供人阅读的文件）"""
+        return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS)
+
+    # 解析 JSON（bytes 或 str）
+    loads = orjson.loads
+else:
+    def dumps(obj, indent=False):
+        """序列化为 UTF-8 字节；indent 为 True 时缩进两格（供人阅读的文件）"""
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
+
+def load(path):
+    """读取并解析 JSON 文件"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
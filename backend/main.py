@@ -1,34 +1,110 @@
-import os, json, secrets, hashlib
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends
+import os, secrets, hashlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from itertools import islice
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+import jsoncodec
 import bcrypt as bcrypt_lib
 from typing import Optional
 from avatar_generator import get_user_avatar_svg
+from storage import create_storage, matches_contains
+from projections import Projector, author_view, list_fields, ADMIN_AUTHOR_FIELDS, PUBLIC_AUTHOR_FIELDS
+from background import PeriodicTask
+from feed import FollowingFeed
+from compression import CompressionMiddleware, ENCODINGS, accepted_encoding, precompress
+from pagination import encode_cursor, decode_cursor
+from ranking import HotRanking
+from response_cache import ResponseCache
+from search import SearchIndex
+from suggest import Suggestions
+from view_counter import ViewCounter, ViewDeduplicator
 
 # —— 数据路径准备 ——
-DB_PATH = "db.json"
+DB_PATH = "db.json"  # 旧版单文件数据，仅在数据目录未初始化时导入
+DATA_DIR = os.getenv("DATA_DIR", "data")
 UPLOAD_DIR = "uploads"
 for sub in ("avatars", "covers"):
     os.makedirs(f"{UPLOAD_DIR}/{sub}", exist_ok=True)
 
 # —— 认证配置 ——
 security = HTTPBearer()
-# 简单的token存储（生产环境应使用JWT）
-active_tokens = {}
 
-# —— 读写 JSON ——  
-def read_db():
-    with open(DB_PATH, encoding="utf-8") as f:
-        return json.load(f)
+# —— 数据存储 ——
+# STORAGE_ENGINE=json（默认，常驻内存 + 分段快照 + 日志）或 sqlite（首次启动时从 json 数据迁移）
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "blog.sqlite3")
+storage = create_storage(STORAGE_ENGINE, DATA_DIR, DB_PATH, SQLITE_PATH)
+
+# 周期维护（json 引擎在日志过大时把它合并进分段快照）
+storage_maintainer = PeriodicTask("storage-maintainer", 30, storage.maintain)
+
+# —— 浏览量统计：同一客户端 1 分钟内只计一次，累计的浏览量每 5 秒批量写入 ——
+view_dedup = ViewDeduplicator(window=60)
+view_counter = ViewCounter(storage)
+view_flusher = PeriodicTask("view-counter", 5, view_counter.flush)
+
+# —— 响应缓存：匿名访问的只读接口缓存渲染好的响应，写入时按依赖精确失效 ——
+# RESPONSE_CACHE_ENTRIES / RESPONSE_CACHE_BYTES 限制每个 worker 的条目数与总字节数
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_ENTRIES", 2048)),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024)),
+)
+storage.subscribe(response_cache.on_change)
+
+# —— 响应压缩：超过 COMPRESSION_MIN_SIZE 字节的文本类响应按 Accept-Encoding 使用 br / gzip ——
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+# —— 热门排序：计数变化时增量调整，每 5 分钟整体重算一次以应用时间衰减 ——
+hot_ranking = HotRanking(storage)
+storage.subscribe(hot_ranking.on_change)
 
-def write_db(data):
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def rebuild_hot_ranking():
+    hot_ranking.rebuild()
+    response_cache.invalidate([("posts-order", "hot")])
+
+hot_ranker = PeriodicTask("hot-ranking", 300, rebuild_hot_ranking)
+
+# —— 全文搜索：倒排索引（BM25 排序），文章的增删改提交后立即写入增量层，
+#    后台任务定期把增量合并成新的段文件。段文件保存在 SEARCH_INDEX_DIR，启动时直接映射，
+#    多个 worker 共用 ——
+SEARCH_INDEX_DIR = os.getenv(
+    "SEARCH_INDEX_DIR", f"{SQLITE_PATH}.search" if STORAGE_ENGINE == "sqlite" else os.path.join(DATA_DIR, "search")
+)
+search_index = SearchIndex(storage, SEARCH_INDEX_DIR)
+storage.subscribe(search_index.on_change)
+search_indexer = PeriodicTask("search-index", 5, search_index.refresh)
+
+# —— 输入提示：标签、用户名、文章标题的前缀索引，按热度排序 ——
+suggestions = Suggestions(storage)
+storage.subscribe(suggestions.on_change)
+
+# —— 关注动态：新文章推送进粉丝的时间线（每人最多 FEED_TIMELINE_SIZE 篇），
+#    粉丝超过 FEED_FANOUT_LIMIT 的作者不推送，读取时归并 ——
+following_feed = FollowingFeed(
+    storage,
+    capacity=int(os.getenv("FEED_TIMELINE_SIZE", 500)),
+    fanout_limit=int(os.getenv("FEED_FANOUT_LIMIT", 1000)),
+)
+storage.subscribe(following_feed.on_change)
+
+# —— 响应序列化：默认响应类用 orjson（未安装时退回标准库 json）——
+class FastJSONResponse(JSONResponse):
+    """
+    用 jsoncodec 序列化的 JSON 响应（应用的默认响应类）
+
+    接口直接返回它而不是 dict 时，FastAPI 不再经过 jsonable_encoder，
+    适合只含 JSON 基本类型的大响应（存储中的记录都是）。
+    """
+
+    def render(self, content):
+        return jsoncodec.dumps(content)
 
 # —— 辅助函数 ——
 def get_current_timestamp():
@@ -38,23 +114,33 @@ def get_current_timestamp():
 def generate_token():
     return secrets.token_urlsafe(32)
 
+def hash_token(token):
+    """会话表里只保存token的哈希"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def get_session_user(token):
+    """按token查找登录会话对应的用户（会话保存在存储中，多个worker共享）"""
+    session = storage.find_one("sessions", tokenHash=hash_token(token))
+    if not session:
+        return None
+    return storage.get("users", session["userId"])
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    if token not in active_tokens:
+    session = storage.find_one("sessions", tokenHash=hash_token(token))
+    if not session:
         raise HTTPException(401, "无效的token")
-    user_id = active_tokens[token]
-    db = read_db()
-    for user in db["users"]:
-        if user["id"] == user_id:
-            return {
-                "id": user["id"],
-                "email": user["email"],
-                "avatar": user["avatar"],
-                "username": user.get("username", user["email"]),
-                "bio": user.get("bio", ""),
-                "role": user.get("role", "user")
-            }
-    raise HTTPException(401, "用户不存在")
+    user = storage.get("users", session["userId"])
+    if not user:
+        raise HTTPException(401, "用户不存在")
+    return {
+        "id": user["id"],
+        "email": user["email"],
+        "avatar": user["avatar"],
+        "username": user.get("username", user["email"]),
+        "bio": user.get("bio", ""),
+        "role": user.get("role", "user")
+    }
 
 def get_admin_user(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "admin":
@@ -66,23 +152,207 @@ def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depend
     if not credentials:
         return None
 
-    token = credentials.credentials
-    if token not in active_tokens:
+    user = get_session_user(credentials.credentials)
+    if not user:
+        return None
+    return {
+        "id": user["id"],
+        "email": user["email"],
+        "avatar": user["avatar"],
+        "username": user.get("username", user["email"]),
+        "bio": user.get("bio", ""),
+        "role": user.get("role", "user")
+    }
+
+def cached_response(request: Request, key, compute):
+    """
+    经过响应缓存返回 JSON 响应
+
+    compute() 返回 (响应数据, 依赖键集合)，依赖键见 response_cache.py。
+    只用于对所有访问者都相同的响应（登录用户的个性化结果不要走缓存）。
+    缓存里同时存着压缩好的各个编码版本，命中时按 Accept-Encoding 直接返回。
+    """
+    def render():
+        payload, dependencies = compute()
+        variants = precompress(jsoncodec.dumps(payload), COMPRESSION_MIN_SIZE)
+        return variants, dependencies, sum(len(body) for body in variants.values())
+
+    variants = response_cache.get(key, render, since=getattr(request.state, "cache_version", None))
+    encoding = accepted_encoding(
+        request.headers.get("accept-encoding"), [e for e in ENCODINGS if e in variants]
+    )
+    if encoding is None:
+        return Response(content=variants["identity"], media_type="application/json")
+    return Response(
+        content=variants[encoding], media_type="application/json",
+        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+    )
+
+def post_dependencies(posts):
+    """文章视图依赖的数据：文章本身及其作者"""
+    dependencies = set()
+    for post in posts:
+        dependencies.add(("posts", post["id"]))
+        dependencies.add(("users", post["authorId"]))
+    return dependencies
+
+# —— 条件 GET（ETag / Last-Modified）——
+def make_etag(*parts):
+    """由集合版本、参数等组成的强 ETag：parts 相同则响应内容相同"""
+    return '"' + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 是否匹配（GET 使用弱比较，忽略 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+def http_date(timestamp):
+    """ISO 时间戳转为 HTTP 日期格式，无法解析时返回 None"""
+    try:
+        moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
         return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
 
-    user_id = active_tokens[token]
-    db = read_db()
-    for user in db["users"]:
-        if user["id"] == user_id:
-            return {
-                "id": user["id"],
-                "email": user["email"],
-                "avatar": user["avatar"],
-                "username": user.get("username", user["email"]),
-                "bio": user.get("bio", ""),
-                "role": user.get("role", "user")
-            }
-    return None
+def user_interaction_versions(current_user):
+    """登录用户的点赞、收藏状态会出现在文章视图里，ETag 需要包含它们的版本"""
+    if not current_user:
+        return None
+    return current_user["id"], storage.version("likes"), storage.version("bookmarks")
+
+def conditional_response(request: Request, etag, build, last_modified=None):
+    """
+    条件 GET：If-None-Match 与 etag 匹配时直接返回 304，不再构造和序列化响应；
+    否则调用 build() 构造响应（数据或 Response），并附上 ETag / Last-Modified
+    """
+    headers = {"ETag": etag, "Vary": "Authorization, Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response = build()
+    if not isinstance(response, Response):
+        response = FastJSONResponse(response)
+    response.headers.update(headers)
+    return response
+
+def post_list_fields(fields):
+    """列表接口 fields= 参数对应的文章字段（默认不含正文）"""
+    try:
+        return list_fields(fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+def page_position(page, limit, cursor, order_by):
+    """游标分页时返回 (游标位置, 0)，否则返回 (None, 页码对应的偏移量)"""
+    if not cursor:
+        return None, (page - 1) * limit
+    try:
+        return decode_cursor(cursor, order_by), 0
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+def query_page(collection, page, limit, cursor=None, order_by=None, descending=False, **options):
+    """
+    取一页记录，返回 (当前页记录, 总数, 是否还有下一页, 下一页的游标)
+
+    传了 cursor 时从游标位置接着取（忽略 page），代价与翻到第几页无关；
+    否则按页码跳过前面的记录。
+    """
+    after, offset = page_position(page, limit, cursor, order_by)
+    # 多取一条判断是否还有下一页
+    records, total = storage.query(
+        collection, order_by=order_by, descending=descending, offset=offset, limit=limit + 1,
+        after=after, **options
+    )
+    has_more = len(records) > limit
+    records = records[:limit]
+    next_cursor = encode_cursor(records[-1], order_by) if has_more and records else None
+    return records, total, has_more, next_cursor
+
+def tag_filter(tag="", tags="", match="all"):
+    """
+    列表接口的标签参数转为存储查询条件，返回 (标签列表, 传给 storage.query 的条件)
+
+    tag 为单个标签，tags 为逗号分隔的多个标签；match=all 要求包含全部标签，
+    match=any 只要包含其中一个（由倒排索引求交集、并集）。
+    """
+    if match not in ("all", "any"):
+        raise HTTPException(400, "match 只能是 all 或 any")
+    names = list(dict.fromkeys(([tag] if tag else []) + [t.strip() for t in tags.split(",") if t.strip()]))
+    if not names:
+        return names, {}
+    return names, {"contains": {"tags": names}} if match == "all" else {"contains_any": {"tags": names}}
+
+def search_posts(q, offset=0, limit=None):
+    """全文搜索文章（按相关度排序），返回 (文章列表, 命中总数)；空查询返回全部文章（按 id）"""
+    if not q.strip():
+        return storage.query("posts", offset=offset, limit=limit)
+    hits, total = search_index.search(q, offset, limit)
+    posts = [storage.get("posts", post_id) for post_id, _ in hits]
+    return [post for post in posts if post], total
+
+def sync_tag_counts(tx, names):
+    """在写事务中按倒排索引重新统计这些标签的 post_count（文章的标签有变化时调用）"""
+    for name in set(names):
+        tag = tx.find_one("tags", name=name)
+        if not tag:
+            continue
+        count = tx.query("posts", limit=0, contains={"tags": name})[1]
+        if tag.get("post_count") != count:
+            tx.update("tags", tag["id"], {"post_count": count})
+
+def hot_page(page, limit, cursor=None, tag_options=None):
+    """按热度取一页文章（排名由 hot_ranking 维护），返回值同 query_page"""
+    after, offset = page_position(page, limit, cursor, "hot")
+    tag_options = tag_options or {}
+
+    def ranked_posts():
+        for post_id, score in hot_ranking.ranked(after):
+            post = storage.get("posts", post_id)
+            if post and matches_contains(post, **tag_options):
+                yield post, score
+
+    rows = list(islice(ranked_posts(), offset, offset + limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    total = storage.query("posts", limit=0, **tag_options)[1]
+    next_cursor = None
+    if has_more and rows:
+        post, score = rows[-1]
+        next_cursor = encode_cursor({"id": post["id"], "hot": score}, "hot")
+    return [post for post, _ in rows], total, has_more, next_cursor
+
+def following_page(user_id, page, limit, cursor=None, tag_options=None):
+    """用户关注的作者的文章（按发布时间倒序，时间线由 following_feed 维护），返回值同 query_page"""
+    after, offset = page_position(page, limit, cursor, "created_at")
+    tag_options = tag_options or {}
+
+    def followed_posts():
+        for post_id in following_feed.posts(user_id, after):
+            post = storage.get("posts", post_id)
+            if post and matches_contains(post, **tag_options):
+                yield post
+
+    posts = list(islice(followed_posts(), offset, offset + limit + 1))
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    # 总数按作者逐个计数（走 authorId 索引），不需要取出文章
+    total = sum(
+        storage.query("posts", limit=0, authorId=follow["followingId"], **tag_options)[1]
+        for follow in storage.find("follows", followerId=user_id)
+    )
+    next_cursor = encode_cursor(posts[-1], "created_at") if has_more and posts else None
+    return posts, total, has_more, next_cursor
 
 # —— 请求模型 ——  
 class UserIn(BaseModel):
@@ -122,7 +392,26 @@ class AnonymousMessageCreate(BaseModel):
     content: str
 
 # —— 启动 FastAPI ——
-app = FastAPI(title="博客论坛 API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 旧数据中标签的 post_count 可能已经不准，启动时按倒排索引校正一次（准确时不产生写入）
+    with storage.transaction() as tx:
+        sync_tag_counts(tx, [tag["name"] for tag in tx.all("tags")])
+    storage_maintainer.start()
+    view_flusher.start()
+    hot_ranker.start()
+    search_indexer.start()
+    yield
+    search_indexer.stop()
+    hot_ranker.stop()
+    view_flusher.stop()
+    view_counter.flush()
+    # 退出前把增量合并进段文件（浏览量也会改变文章集合的版本，放在最后），下次启动不需要重建
+    search_index.merge()
+    storage_maintainer.stop()
+    storage.close()
+
+app = FastAPI(title="博客论坛 API", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # —— 添加 CORS 中间件 ——
 app.add_middleware(
@@ -133,6 +422,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# —— 请求级读快照：先读入其他 worker 提交的修改，整个请求读取同一版本的数据 ——
+@app.middleware("http")
+async def storage_snapshot(request: Request, call_next):
+    await run_in_threadpool(storage.refresh)
+    # 固定读快照之前记下缓存的失效计数：之后数据若有变化，本请求算出的结果不进缓存
+    request.state.cache_version = response_cache.version
+    with storage.pinned():
+        return await call_next(request)
+
 # ✅ 健康检查端点 ——
 @app.get("/health")
 def health_check():
@@ -152,42 +452,40 @@ def read_root():
 # —— 挂载静态资源 ——  
 app.mount("/static", StaticFiles(directory=UPLOAD_DIR), name="static")
 
-# ✅ 用户注册 ——  
+# ✅ 用户注册 ——
 @app.post("/auth/register")
 def register(user: UserIn):
-    db = read_db()
-    if any(u["email"] == user.email for u in db["users"]):
-        raise HTTPException(400, "邮箱已存在")
-    uid = max((u["id"] for u in db["users"]), default=0) + 1
+    # bcrypt 计算较慢，放在写锁之外
     hashed = bcrypt_lib.hashpw(user.password.encode('utf-8'), bcrypt_lib.gensalt()).decode('utf-8')
-    new_user = {"id": uid, "email": user.email, "password": hashed, "avatar": None}
-    db["users"].append(new_user)
-    write_db(db)
-    return {"id": uid, "email": user.email}
+    with storage.transaction() as tx:
+        if tx.find_one("users", email=user.email):
+            raise HTTPException(400, "邮箱已存在")
+        new_user = tx.insert("users", {"email": user.email, "password": hashed, "avatar": None})
+    return {"id": new_user["id"], "email": user.email}
 
 # ✅ 用户登录 ——
 @app.post("/auth/login")
 def login(user: UserIn):
-    db = read_db()
-    for u in db["users"]:
-        if u["email"] == user.email and bcrypt_lib.checkpw(user.password.encode('utf-8'), u["password"].encode('utf-8')):
-            # 生成token
-            token = generate_token()
-            active_tokens[token] = u["id"]
-
-            user_info = {
-                "id": u["id"],
-                "email": u["email"],
-                "avatar": u["avatar"],
-                "username": u.get("username", u["email"]),
-                "role": u.get("role", "user"),
-                "bio": u.get("bio", "")
-            }
-            return {
-                "access_token": token,
-                "token_type": "bearer",
-                "user": user_info
-            }
+    u = storage.find_one("users", email=user.email)
+    if u and bcrypt_lib.checkpw(user.password.encode('utf-8'), u["password"].encode('utf-8')):
+        # 生成token
+        token = generate_token()
+        with storage.transaction() as tx:
+            tx.insert("sessions", {"tokenHash": hash_token(token), "userId": u["id"], "created_at": get_current_timestamp()})
+
+        user_info = {
+            "id": u["id"],
+            "email": u["email"],
+            "avatar": u["avatar"],
+            "username": u.get("username", u["email"]),
+            "role": u.get("role", "user"),
+            "bio": u.get("bio", "")
+        }
+        return {
+            "access_token": token,
+            "token_type": "bearer",
+            "user": user_info
+        }
     raise HTTPException(401, "邮箱或密码错误")
 
 # ✅ 获取当前用户信息 ——
@@ -198,51 +496,44 @@ def get_profile(current_user: dict = Depends(get_current_user)):
 # ✅ 更新用户资料 ——
 @app.put("/auth/profile")
 def update_profile(profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    for u in db["users"]:
-        if u["id"] == current_user["id"]:
-            # 更新用户信息
-            if profile_data.username is not None:
-                u["username"] = profile_data.username
-            if profile_data.bio is not None:
-                u["bio"] = profile_data.bio
-            if profile_data.email is not None:
-                # 检查邮箱是否已被其他用户使用
-                if any(user["email"] == profile_data.email and user["id"] != current_user["id"] for user in db["users"]):
-                    raise HTTPException(400, "邮箱已被使用")
-                u["email"] = profile_data.email
-
-            write_db(db)
-
-            # 返回更新后的用户信息
-            return {
-                "id": u["id"],
-                "email": u["email"],
-                "username": u.get("username", u["email"]),
-                "bio": u.get("bio", ""),
-                "avatar": u["avatar"]
-            }
-
-    raise HTTPException(404, "用户不存在")
+    with storage.transaction() as tx:
+        if not tx.get("users", current_user["id"]):
+            raise HTTPException(404, "用户不存在")
+
+        # 更新用户信息
+        changes = {}
+        if profile_data.username is not None:
+            changes["username"] = profile_data.username
+        if profile_data.bio is not None:
+            changes["bio"] = profile_data.bio
+        if profile_data.email is not None:
+            # 检查邮箱是否已被其他用户使用
+            owner = tx.find_one("users", email=profile_data.email)
+            if owner and owner["id"] != current_user["id"]:
+                raise HTTPException(400, "邮箱已被使用")
+            changes["email"] = profile_data.email
+
+        u = tx.update("users", current_user["id"], changes)
+
+    # 返回更新后的用户信息
+    return {
+        "id": u["id"],
+        "email": u["email"],
+        "username": u.get("username", u["email"]),
+        "bio": u.get("bio", ""),
+        "avatar": u["avatar"]
+    }
 
 # ✅ 获取用户信息 ——
 @app.get("/users/{user_id}")
 def get_user(user_id: int):
-    db = read_db()
-
     # 查找用户
-    user = None
-    for u in db["users"]:
-        if u["id"] == user_id:
-            user = u
-            break
-
+    user = storage.get("users", user_id)
     if not user:
         raise HTTPException(404, "用户不存在")
 
     # 统计用户文章数
-    post_count = len([p for p in db["posts"] if p["authorId"] == user_id])
+    post_count = storage.count("posts", authorId=user_id)
 
     return {
         "id": user["id"],
@@ -258,78 +549,47 @@ def get_user(user_id: int):
 
 # ✅ 获取用户文章列表 ——
 @app.get("/users/{user_id}/posts")
-def get_user_posts(user_id: int, page: int = 1, limit: int = 10):
-    db = read_db()
-
+def get_user_posts(user_id: int, page: int = Query(1, ge=1), limit: int = Query(10, ge=1), cursor: Optional[str] = None):
     # 检查用户是否存在
-    user_exists = any(u["id"] == user_id for u in db["users"])
-    if not user_exists:
+    user = storage.get("users", user_id)
+    if not user:
         raise HTTPException(404, "用户不存在")
 
-    # 获取用户的文章
-    user_posts = []
-    for p in db["posts"]:
-        if p["authorId"] == user_id:
-            # 添加作者信息
-            for user in db["users"]:
-                if user["id"] == p["authorId"]:
-                    p["author"] = {
-                        "id": user["id"],
-                        "username": user.get("username", user["email"]),
-                        "email": user["email"],
-                        "avatar": user["avatar"]
-                    }
-                    break
-            user_posts.append(p)
-
-    # 按创建时间排序
-    user_posts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_posts = user_posts[start:end]
+    # 按创建时间倒序分页
+    user_posts, total, has_more, next_cursor = query_page(
+        "posts", page, limit, cursor, order_by="created_at", descending=True, authorId=user_id
+    )
+    projector = Projector(storage)
+    paginated_posts = [projector.post(p) for p in user_posts]
 
-    return {
+    return FastJSONResponse({
         "items": paginated_posts,
-        "has_more": end < len(user_posts),
-        "total": len(user_posts),
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "total": total,
         "page": page,
         "limit": limit
-    }
+    })
 
 # ✅ 获取用户收藏列表 ——
 @app.get("/users/{user_id}/bookmarks")
-def get_user_bookmarks(user_id: int, page: int = 1, limit: int = 10):
-    db = read_db()
-
+def get_user_bookmarks(user_id: int, page: int = Query(1, ge=1), limit: int = Query(10, ge=1), fields: str = ""):
     # 检查用户是否存在
-    user_exists = any(u["id"] == user_id for u in db["users"])
-    if not user_exists:
+    if not storage.get("users", user_id):
         raise HTTPException(404, "用户不存在")
+    selected_fields = post_list_fields(fields)
 
     # 获取用户的收藏
-    user_bookmarks = [b for b in db["bookmarks"] if b["userId"] == user_id]
+    user_bookmarks = storage.find("bookmarks", userId=user_id)
 
-    # 获取收藏的文章详情
+    # 获取收藏的文章详情（附加作者信息与收藏时间）
+    projector = Projector(storage)
     bookmarked_posts = []
     for bookmark in user_bookmarks:
-        for post in db["posts"]:
-            if post["id"] == bookmark["postId"]:
-                # 添加作者信息
-                for user in db["users"]:
-                    if user["id"] == post["authorId"]:
-                        post["author"] = {
-                            "id": user["id"],
-                            "username": user.get("username", user["email"]),
-                            "email": user["email"],
-                            "avatar": user["avatar"]
-                        }
-                        break
-                # 添加收藏时间
-                post["bookmarked_at"] = bookmark["created_at"]
-                bookmarked_posts.append(post)
-                break
+        post = storage.get("posts", bookmark["postId"])
+        if not post:
+            continue
+        bookmarked_posts.append(projector.post(post, fields=selected_fields, bookmarked_at=bookmark["created_at"]))
 
     # 按收藏时间排序
     bookmarked_posts.sort(key=lambda x: x.get("bookmarked_at", ""), reverse=True)
@@ -339,50 +599,36 @@ def get_user_bookmarks(user_id: int, page: int = 1, limit: int = 10):
     end = start + limit
     paginated_bookmarks = bookmarked_posts[start:end]
 
-    return {
+    return FastJSONResponse({
         "items": paginated_bookmarks,
         "total": len(bookmarked_posts),
         "has_more": end < len(bookmarked_posts)
-    }
+    })
 
 # ✅ 获取用户浏览历史 ——
 @app.get("/users/{user_id}/history")
-def get_user_history(user_id: int, limit: int = 5):
-    db = read_db()
-
+def get_user_history(user_id: int, limit: int = Query(5, ge=1)):
     # 检查用户是否存在
-    user_exists = any(u["id"] == user_id for u in db["users"])
-    if not user_exists:
+    if not storage.get("users", user_id):
         raise HTTPException(404, "用户不存在")
 
     # 获取用户的浏览历史（最近5篇）
-    user_history = [h for h in db.get("history", []) if h["userId"] == user_id]
+    user_history = storage.find("history", userId=user_id)
 
     # 按访问时间排序，取最近的记录
     user_history.sort(key=lambda x: x.get("visited_at", ""), reverse=True)
     user_history = user_history[:limit]
 
-    # 获取历史文章详情
+    # 获取历史文章详情（附加作者信息与访问时间）
+    projector = Projector(storage)
     history_posts = []
     for history in user_history:
-        for post in db["posts"]:
-            if post["id"] == history["postId"]:
-                # 添加作者信息
-                for user in db["users"]:
-                    if user["id"] == post["authorId"]:
-                        post["author"] = {
-                            "id": user["id"],
-                            "username": user.get("username", user["email"]),
-                            "email": user["email"],
-                            "avatar": user["avatar"]
-                        }
-                        break
-                # 添加访问时间
-                post["visited_at"] = history["visited_at"]
-                history_posts.append(post)
-                break
-
-    return history_posts
+        post = storage.get("posts", history["postId"])
+        if not post:
+            continue
+        history_posts.append(projector.post(post, visited_at=history["visited_at"]))
+
+    return FastJSONResponse(history_posts)
 
 # ✅ 记录浏览历史 ——
 @app.post("/users/{user_id}/history")
@@ -391,523 +637,420 @@ def add_user_history(user_id: int, post_id: int = Form(...), current_user: dict
     if current_user["id"] != user_id:
         raise HTTPException(403, "无权限")
 
-    db = read_db()
+    with storage.transaction() as tx:
+        # 检查文章是否存在
+        if not tx.get("posts", post_id):
+            raise HTTPException(404, "文章不存在")
 
-    # 检查文章是否存在
-    post_exists = any(p["id"] == post_id for p in db["posts"])
-    if not post_exists:
-        raise HTTPException(404, "文章不存在")
+        # 检查是否已经有这篇文章的记录
+        existing_history = tx.find_one("history", userId=user_id, postId=post_id)
 
-    # 初始化历史记录
-    if "history" not in db:
-        db["history"] = []
-
-    # 检查是否已经有这篇文章的记录
-    existing_history = None
-    for h in db["history"]:
-        if h["userId"] == user_id and h["postId"] == post_id:
-            existing_history = h
-            break
-
-    if existing_history:
-        # 更新访问时间
-        existing_history["visited_at"] = get_current_timestamp()
-    else:
-        # 创建新的历史记录
-        history_id = max((h["id"] for h in db["history"]), default=0) + 1
-        new_history = {
-            "id": history_id,
-            "userId": user_id,
-            "postId": post_id,
-            "visited_at": get_current_timestamp()
-        }
-        db["history"].append(new_history)
+        if existing_history:
+            # 更新访问时间
+            tx.update("history", existing_history["id"], {"visited_at": get_current_timestamp()})
+        else:
+            # 创建新的历史记录
+            tx.insert("history", {
+                "userId": user_id,
+                "postId": post_id,
+                "visited_at": get_current_timestamp()
+            })
 
-    # 保持最多5条记录
-    user_histories = [h for h in db["history"] if h["userId"] == user_id]
-    user_histories.sort(key=lambda x: x.get("visited_at", ""), reverse=True)
+        # 保持最多5条记录
+        user_histories = tx.find("history", userId=user_id)
+        user_histories.sort(key=lambda x: x.get("visited_at", ""), reverse=True)
 
-    if len(user_histories) > 5:
         # 删除多余的记录
-        to_remove = user_histories[5:]
-        for remove_h in to_remove:
-            db["history"] = [h for h in db["history"] if h["id"] != remove_h["id"]]
+        for remove_h in user_histories[5:]:
+            tx.delete("history", remove_h["id"])
 
-    write_db(db)
     return {"message": "浏览历史已记录"}
 
+def store_upload(path, data, apply):
+    """
+    写出上传的文件，再在写事务中执行 apply(tx)
+
+    写文件和存储事务（跨进程写锁、fsync、变更监听）都会阻塞，async 的上传接口先读完
+    上传内容，再通过 run_in_threadpool 调用，不占用事件循环。
+    """
+    with open(path, "wb") as f:
+        f.write(data)
+    with storage.transaction() as tx:
+        apply(tx)
+
+
+def set_user_avatar(user_id, avatar):
+    def apply(tx):
+        if tx.get("users", user_id):
+            tx.update("users", user_id, {"avatar": avatar})
+    return apply
+
+
 # ✅ 上传用户头像 ——
 @app.post("/upload/avatar")
 async def upload_avatar(user_id: int = Form(...), file: UploadFile = File(...)):
     ext = os.path.splitext(file.filename)[1]
     path = f"{UPLOAD_DIR}/avatars/{user_id}{ext}"
-    with open(path, "wb") as f:
-        f.write(await file.read())
-    db = read_db()
-    for u in db["users"]:
-        if u["id"] == user_id:
-            u["avatar"] = path
-            break
-    write_db(db)
+    data = await file.read()
+    await run_in_threadpool(store_upload, path, data, set_user_avatar(user_id, path))
     return {"avatar": path}
 
 # ✅ 创建文章 ——
 @app.post("/posts")
 def create_post(post: PostIn, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-    if any(p["slug"] == post.slug for p in db["posts"]):
-        raise HTTPException(400, "slug 已存在")
-    pid = max((p["id"] for p in db["posts"]), default=0) + 1
-    new_post = {
-        "id": pid,
-        "slug": post.slug,
-        "title": post.title,
-        "content": post.content,
-        "summary": getattr(post, 'summary', ''),
-        "cover": None,
-        "authorId": current_user["id"],
-        "likes_count": 0,
-        "views_count": 0,
-        "comments_count": 0,
-        "bookmarks_count": 0,
-        "tags": getattr(post, 'tags', []),
-        "status": "published",
-        "created_at": get_current_timestamp(),
-        "updated_at": get_current_timestamp()
-    }
-    db["posts"].append(new_post)
-    write_db(db)
+    with storage.transaction() as tx:
+        if tx.find_one("posts", slug=post.slug):
+            raise HTTPException(400, "slug 已存在")
+        new_post = tx.insert("posts", {
+            "slug": post.slug,
+            "title": post.title,
+            "content": post.content,
+            "summary": getattr(post, 'summary', ''),
+            "cover": None,
+            "authorId": current_user["id"],
+            "likes_count": 0,
+            "views_count": 0,
+            "comments_count": 0,
+            "bookmarks_count": 0,
+            "tags": getattr(post, 'tags', []),
+            "status": "published",
+            "created_at": get_current_timestamp(),
+            "updated_at": get_current_timestamp()
+        })
+        sync_tag_counts(tx, new_post["tags"] or [])
 
     # 返回包含作者信息的文章
-    new_post["author"] = {
-        "id": current_user["id"],
-        "username": current_user.get("username", current_user["email"]),
-        "email": current_user["email"],
-        "avatar": current_user["avatar"]
-    }
-
-    return new_post
+    return {**new_post, "author": author_view(current_user)}
 
 # ✅ 获取文章列表 ——
 @app.get("/posts")
-def list_posts(page: int = 1, limit: int = 10, sort: str = "created_at", tag: str = "", type: str = "latest", current_user: dict = Depends(get_current_user_optional)):
-    db = read_db()
-    posts = db["posts"].copy()
-
-    # 标签筛选
-    if tag:
-        posts = [p for p in posts if tag in p.get("tags", [])]
-
-    # 排序
-    if sort == "created_at":
-        posts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    elif sort == "likes_count":
-        posts.sort(key=lambda x: x.get("likes_count", 0), reverse=True)
-    elif sort == "comments_count":
-        posts.sort(key=lambda x: x.get("comments_count", 0), reverse=True)
-    elif sort == "views_count":
-        posts.sort(key=lambda x: x.get("views_count", 0), reverse=True)
-
-    # 添加作者信息和用户交互状态
-    for post in posts:
-        # 添加作者信息
-        for user in db["users"]:
-            if user["id"] == post["authorId"]:
-                post["author"] = {
-                    "id": user["id"],
-                    "username": user.get("username", user["email"]),
-                    "email": user["email"],
-                    "avatar": user["avatar"]
-                }
-                break
-
-        # 添加用户交互状态（如果用户已登录）
-        if current_user:
-            # 检查是否点赞
-            post["is_liked"] = any(
-                like["userId"] == current_user["id"] and like["postId"] == post["id"]
-                for like in db["likes"]
-            )
-
-            # 检查是否收藏
-            post["is_bookmarked"] = any(
-                bookmark["userId"] == current_user["id"] and bookmark["postId"] == post["id"]
-                for bookmark in db["bookmarks"]
-            )
+def list_posts(request: Request, page: int = Query(1, ge=1), limit: int = Query(10, ge=1), sort: str = "created_at", tag: str = "", tags: str = "", match: str = "all", type: str = "latest", cursor: Optional[str] = None, fields: str = "", current_user: dict = Depends(get_current_user_optional)):
+    # 列表只返回摘要字段，正文由详情接口返回
+    selected_fields = post_list_fields(fields)
+    # 标签筛选：tags=a,b&match=all 同时带有这些标签，match=any 带有其中任一个
+    tag_names, tag_options = tag_filter(tag, tags, match)
+    if type == "hot":
+        order = "hot"
+    elif type == "following":
+        # 关注动态：只返回当前用户关注的作者的文章，按发布时间倒序
+        if not current_user:
+            raise HTTPException(401, "需要登录")
+        order = "following"
+    else:
+        order = sort if sort in ("created_at", "likes_count", "comments_count", "views_count") else "created_at"
+
+    def compute():
+        if order == "hot":
+            # 热门：按热度排名（点赞、评论、收藏、浏览加权并随时间衰减）
+            page_posts, total, has_more, next_cursor = hot_page(page, limit, cursor, tag_options)
+        elif order == "following":
+            page_posts, total, has_more, next_cursor = following_page(current_user["id"], page, limit, cursor, tag_options)
         else:
-            post["is_liked"] = False
-            post["is_bookmarked"] = False
+            # 标签筛选、排序和分页交给存储引擎
+            page_posts, total, has_more, next_cursor = query_page(
+                "posts", page, limit, cursor,
+                order_by=order,
+                descending=True,
+                **tag_options,
+            )
+        # 添加作者信息和用户交互状态（只处理当前页）
+        projector = Projector(storage, current_user)
+        paginated_posts = [projector.post(post, interactions=True, fields=selected_fields) for post in page_posts]
+
+        dependencies = post_dependencies(page_posts) | {("posts-order", order)}
+        dependencies.update(("posts-tag", name) for name in tag_names)
+        return {
+            "items": paginated_posts,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "total": total,
+            "page": page,
+            "limit": limit
+        }, dependencies
+
+    key = ("list_posts", page, limit, order, tuple(sorted(tag_names)), match if len(tag_names) > 1 else "",
+           cursor or "", tuple(sorted(selected_fields)))
+    etag = make_etag(
+        *key, storage.version("posts"), storage.version("users"),
+        hot_ranking.built_at if order == "hot" else None, user_interaction_versions(current_user),
+        storage.version("follows") if order == "following" else None,
+    )
 
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_posts = posts[start:end]
+    def build():
+        if current_user:
+            return compute()[0]
+        # 匿名访问走响应缓存（键为规范化后的参数）
+        return cached_response(request, key, compute)
 
-    return {
-        "items": paginated_posts,
-        "has_more": end < len(posts),
-        "total": len(posts),
-        "page": page,
-        "limit": limit
-    }
+    return conditional_response(request, etag, build)
 
 # ✅ 通过ID获取文章详情（用于编辑） ——
 @app.get("/posts/id/{post_id}")
 def get_post_by_id(post_id: int, current_user: dict = Depends(get_current_user_optional)):
-    db = read_db()
-    for p in db["posts"]:
-        if p["id"] == post_id:
-            # 添加作者信息
-            for user in db["users"]:
-                if user["id"] == p["authorId"]:
-                    p["author"] = {
-                        "id": user["id"],
-                        "username": user.get("username", user["email"]),
-                        "email": user["email"],
-                        "avatar": user["avatar"]
-                    }
-                    break
-
-            # 添加用户交互状态（如果用户已登录）
-            if current_user:
-                # 检查是否点赞
-                p["is_liked"] = any(
-                    like["userId"] == current_user["id"] and like["postId"] == p["id"]
-                    for like in db["likes"]
-                )
-
-                # 检查是否收藏
-                p["is_bookmarked"] = any(
-                    bookmark["userId"] == current_user["id"] and bookmark["postId"] == p["id"]
-                    for bookmark in db["bookmarks"]
-                )
-            else:
-                p["is_liked"] = False
-                p["is_bookmarked"] = False
-
-            return p
-    raise HTTPException(404, "文章不存在")
+    p = storage.get("posts", post_id)
+    if not p:
+        raise HTTPException(404, "文章不存在")
+
+    # 添加作者信息和用户交互状态
+    return Projector(storage, current_user).post(p, interactions=True)
+
+# ✅ 文章搜索（需注册在 /posts/{slug} 之前，否则 search 会被当作 slug） ——
+@app.get("/posts/search")
+def search_posts_old(q: str = "", fields: str = ""):
+    selected_fields = post_list_fields(fields)
+    projector = Projector(storage)
+    posts, _ = search_posts(q)
+    return FastJSONResponse([projector.post(p, author_fields=None, fields=selected_fields) for p in posts])
 
 # ✅ 获取文章详情 ——
 @app.get("/posts/{slug}")
 def get_post(slug: str, request: Request, current_user: dict = Depends(get_current_user_optional)):
-    db = read_db()
-    for p in db["posts"]:
-        if p["slug"] == slug:
-            # 添加作者信息
-            for user in db["users"]:
-                if user["id"] == p["authorId"]:
-                    p["author"] = {
-                        "id": user["id"],
-                        "username": user.get("username", user["email"]),
-                        "email": user["email"],
-                        "avatar": user["avatar"]
-                    }
-                    break
-
-            # 添加用户交互状态（如果用户已登录）
-            if current_user:
-                # 检查是否点赞
-                p["is_liked"] = any(
-                    like["userId"] == current_user["id"] and like["postId"] == p["id"]
-                    for like in db["likes"]
-                )
-
-                # 检查是否收藏
-                p["is_bookmarked"] = any(
-                    bookmark["userId"] == current_user["id"] and bookmark["postId"] == p["id"]
-                    for bookmark in db["bookmarks"]
-                )
-            else:
-                p["is_liked"] = False
-                p["is_bookmarked"] = False
-
-            # 增加浏览量（简单防刷：同一IP 1分钟内只计算一次浏览）
-            client_ip = request.client.host
-            current_time = get_current_timestamp()
-
-            # 检查是否需要增加浏览量
-            should_increment = True
-            if "view_records" not in p:
-                p["view_records"] = {}
-
-            if client_ip in p["view_records"]:
-                last_view_time = p["view_records"][client_ip]
-                # 简单的时间比较（这里为了简化，每次都增加浏览量）
-                # 在生产环境中应该实现更复杂的防刷逻辑
-
-            if should_increment:
-                p["views_count"] = p.get("views_count", 0) + 1
-                p["view_records"][client_ip] = current_time
-                write_db(db)
-
-            return p
-    raise HTTPException(404, "文章不存在")
-
-# ✅ 上传文章封面 ——  
+    p = storage.find_one("posts", slug=slug)
+    if not p:
+        raise HTTPException(404, "文章不存在")
+
+    # 增加浏览量（简单防刷：同一IP 1分钟内只计算一次浏览），先在内存中累加
+    if view_dedup.first_view(p["id"], request.client.host):
+        view_counter.record(p["id"])
+
+    if current_user:
+        # 添加作者信息和用户交互状态，浏览量包含尚未写入的部分
+        views_count = p.get("views_count", 0) + view_counter.pending(p["id"])
+        etag = make_etag("get_post", p["id"], storage.version("posts"), storage.version("users"),
+                         user_interaction_versions(current_user), views_count)
+        return conditional_response(
+            request, etag,
+            lambda: Projector(storage, current_user).post(p, interactions=True, views_count=views_count),
+            http_date(p.get("updated_at")),
+        )
+
+    # 匿名访问走响应缓存，浏览量为已写入的部分（批量写入时缓存随之失效）
+    def compute():
+        return Projector(storage).post(p, interactions=True), post_dependencies([p])
+
+    etag = make_etag("get_post", p["id"], storage.version("posts"), storage.version("users"))
+    return conditional_response(
+        request, etag, lambda: cached_response(request, ("get_post", slug), compute), http_date(p.get("updated_at"))
+    )
+
+# ✅ 上传文章封面 ——
 @app.post("/upload/cover")
 async def upload_cover(slug: str = Form(...), file: UploadFile = File(...)):
     ext = os.path.splitext(file.filename)[1]
     path = f"{UPLOAD_DIR}/covers/{slug}{ext}"
-    with open(path, "wb") as f:
-        f.write(await file.read())
-    db = read_db()
-    for p in db["posts"]:
-        if p["slug"] == slug:
-            p["cover"] = path
-            break
-    write_db(db)
-    return {"cover": path}
+    data = await file.read()
 
-# ✅ 文章搜索 ——
-@app.get("/posts/search")
-def search_posts_old(q: str = ""):
-    db = read_db()
-    return [p for p in db["posts"] if q.lower() in p["title"].lower()]
+    def set_cover(tx):
+        p = tx.find_one("posts", slug=slug)
+        if p:
+            tx.update("posts", p["id"], {"cover": path})
+
+    await run_in_threadpool(store_upload, path, data, set_cover)
+    return {"cover": path}
 
 # ✅ 统一搜索API ——
 @app.get("/search")
-def search_all(q: str = ""):
+def search_all(q: str = "", fields: str = ""):
     """全局搜索"""
-    db = read_db()
-    results = []
-
-    # 搜索文章
-    for post in db["posts"]:
-        if q.lower() in post["title"].lower() or q.lower() in post["content"].lower():
-            # 添加作者信息
-            for user in db["users"]:
-                if user["id"] == post["authorId"]:
-                    post["author"] = {
-                        "id": user["id"],
-                        "username": user.get("username", user["email"]),
-                        "avatar": user["avatar"]
-                    }
-                    break
-            results.append(post)
-
-    return results
+    selected_fields = post_list_fields(fields)
+
+    # 搜索文章（按相关度排序，附加作者信息）
+    projector = Projector(storage)
+    posts, _ = search_posts(q)
+    return FastJSONResponse([
+        projector.post(post, author_fields=PUBLIC_AUTHOR_FIELDS, fields=selected_fields) for post in posts
+    ])
 
 @app.get("/search/posts")
-def search_posts_api(q: str = "", page: int = 1, limit: int = 10):
+def search_posts_api(q: str = "", page: int = Query(1, ge=1), limit: int = Query(10, ge=1), fields: str = ""):
     """搜索文章"""
-    db = read_db()
-    posts = []
-
-    for post in db["posts"]:
-        if q.lower() in post["title"].lower() or q.lower() in post["content"].lower() or any(q.lower() in tag.lower() for tag in post.get("tags", [])):
-            # 添加作者信息
-            for user in db["users"]:
-                if user["id"] == post["authorId"]:
-                    post["author"] = {
-                        "id": user["id"],
-                        "username": user.get("username", user["email"]),
-                        "avatar": user["avatar"]
-                    }
-                    break
-            posts.append(post)
+    selected_fields = post_list_fields(fields)
 
-    # 分页
+    # 只取当前页（堆中保留前 page * limit 名），添加作者信息
     start = (page - 1) * limit
-    end = start + limit
-    paginated_posts = posts[start:end]
-
-    return {
+    posts, total = search_posts(q, start, limit)
+    projector = Projector(storage)
+    paginated_posts = [
+        projector.post(post, author_fields=PUBLIC_AUTHOR_FIELDS, fields=selected_fields)
+        for post in posts
+    ]
+
+    return FastJSONResponse({
         "items": paginated_posts,
-        "total": len(posts),
-        "has_more": end < len(posts)
-    }
+        "total": total,
+        "has_more": start + limit < total
+    })
 
 @app.get("/search/users")
-def search_users_api(q: str = "", page: int = 1, limit: int = 10):
-    """搜索用户"""
-    db = read_db()
-    users = []
-
-    for user in db["users"]:
-        username = user.get("username", user["email"])
-        if q.lower() in username.lower() or q.lower() in user["email"].lower():
-            users.append({
-                "id": user["id"],
-                "username": username,
-                "email": user["email"],
-                "avatar": user["avatar"],
-                "bio": user.get("bio", ""),
-                "followers_count": user.get("followers_count", 0)
-            })
-
-    # 分页
+def search_users_api(q: str = "", page: int = Query(1, ge=1), limit: int = Query(10, ge=1)):
+    """搜索用户（用户名、邮箱前缀按前缀匹配，按粉丝数排序）"""
     start = (page - 1) * limit
-    end = start + limit
-    paginated_users = users[start:end]
+    if q.strip():
+        ids, total = suggestions.search("users", q, start, limit)
+        users = [user for user in (storage.get("users", user_id) for user_id in ids) if user]
+    else:
+        users, total = storage.query("users", offset=start, limit=limit)
 
     return {
-        "items": paginated_users,
-        "total": len(users),
-        "has_more": end < len(users)
+        "items": [{
+            "id": user["id"],
+            "username": user.get("username", user["email"]),
+            "email": user["email"],
+            "avatar": user["avatar"],
+            "bio": user.get("bio", ""),
+            "followers_count": user.get("followers_count", 0)
+        } for user in users],
+        "total": total,
+        "has_more": start + limit < total
     }
 
 @app.get("/search/tags")
 def search_tags_api(q: str = ""):
-    """搜索标签"""
-    db = read_db()
-    tags = []
-
-    for tag in db["tags"]:
-        if q.lower() in tag["name"].lower() or q.lower() in tag.get("description", "").lower():
-            tags.append(tag)
-
-    return tags
+    """搜索标签（名称、描述按前缀匹配，按文章数排序）"""
+    if not q.strip():
+        return storage.all("tags")
+    ids, _ = suggestions.search("tags", q)
+    return [tag for tag in (storage.get("tags", tag_id) for tag_id in ids) if tag]
+
+@app.get("/search/suggest")
+@app.get("/search/suggestions")
+def search_suggest_api(q: str = "", limit: int = Query(5, ge=1)):
+    """搜索框的输入提示：按前缀匹配的标签、用户、文章标题，各取最热门的 limit 条"""
+    matched = suggestions.suggest(q, max(1, min(limit, 20)))
+    tags = (storage.get("tags", tag_id) for tag_id in matched["tags"])
+    users = (storage.get("users", user_id) for user_id in matched["users"])
+    posts = (storage.get("posts", post_id) for post_id in matched["posts"])
+    return FastJSONResponse({
+        "tags": [
+            {"id": tag["id"], "name": tag["name"], "post_count": tag.get("post_count", 0)}
+            for tag in tags if tag
+        ],
+        "users": [
+            {
+                "id": user["id"],
+                "username": user.get("username", user["email"]),
+                "avatar": user["avatar"],
+                "followers_count": user.get("followers_count", 0),
+            }
+            for user in users if user
+        ],
+        "posts": [
+            {"id": post["id"], "title": post["title"], "slug": post["slug"], "views_count": post.get("views_count", 0)}
+            for post in posts if post
+        ],
+    })
 
 # ✅ 评论系统 API ——
 
 # 获取文章的评论
 @app.get("/posts/{post_id}/comments")
 def get_post_comments(post_id: int):
-    db = read_db()
-    comments = [c for c in db["comments"] if c["postId"] == post_id]
-
-    # 获取评论作者信息
-    for comment in comments:
-        for user in db["users"]:
-            if user["id"] == comment["authorId"]:
-                comment["author"] = {
-                    "id": user["id"],
-                    "username": user.get("username", user["email"]),
-                    "avatar": user["avatar"]
-                }
-                break
-
-    return comments
+    # 附加评论作者信息
+    projector = Projector(storage)
+    return FastJSONResponse([projector.comment(comment) for comment in storage.find("comments", postId=post_id)])
 
 # 创建评论
 @app.post("/posts/{post_id}/comments")
 def create_comment(post_id: int, comment: CommentIn, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 检查文章是否存在
-    post_exists = any(p["id"] == post_id for p in db["posts"])
-    if not post_exists:
-        raise HTTPException(404, "文章不存在")
-
-    # 如果是回复评论，检查父评论是否存在
-    if comment.parentId:
-        parent_exists = any(c["id"] == comment.parentId and c["postId"] == post_id for c in db["comments"])
-        if not parent_exists:
-            raise HTTPException(404, "父评论不存在")
-
-    comment_id = max((c["id"] for c in db["comments"]), default=0) + 1
-    new_comment = {
-        "id": comment_id,
-        "postId": post_id,
-        "authorId": current_user["id"],
-        "content": comment.content,
-        "parentId": comment.parentId,
-        "likes": 0,
-        "created_at": get_current_timestamp(),
-        "updated_at": get_current_timestamp()
-    }
-
-    db["comments"].append(new_comment)
-
-    # 更新文章评论数
-    for post in db["posts"]:
-        if post["id"] == post_id:
-            # 重新计算评论数
-            comment_count = len([c for c in db["comments"] if c["postId"] == post["id"]])
-            post["comments_count"] = comment_count
-            break
+    with storage.transaction() as tx:
+        # 检查文章是否存在
+        if not tx.get("posts", post_id):
+            raise HTTPException(404, "文章不存在")
+
+        # 如果是回复评论，检查父评论是否存在
+        if comment.parentId:
+            parent = tx.get("comments", comment.parentId)
+            if not parent or parent["postId"] != post_id:
+                raise HTTPException(404, "父评论不存在")
+
+        new_comment = tx.insert("comments", {
+            "postId": post_id,
+            "authorId": current_user["id"],
+            "content": comment.content,
+            "parentId": comment.parentId,
+            "likes": 0,
+            "created_at": get_current_timestamp(),
+            "updated_at": get_current_timestamp()
+        })
 
-    write_db(db)
+        # 更新文章评论数（重新计算）
+        tx.update("posts", post_id, {"comments_count": tx.count("comments", postId=post_id)})
 
     # 返回包含作者信息的评论
-    new_comment["author"] = {
-        "id": current_user["id"],
-        "username": current_user.get("username", current_user["email"]),
-        "avatar": current_user["avatar"]
-    }
-
-    return new_comment
+    return {**new_comment, "author": author_view(current_user, PUBLIC_AUTHOR_FIELDS)}
 
 # 删除评论
 @app.delete("/comments/{comment_id}")
 def delete_comment(comment_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    comment_index = None
-    for i, comment in enumerate(db["comments"]):
-        if comment["id"] == comment_id:
-            # 只有评论作者或管理员可以删除评论
-            if comment["authorId"] != current_user["id"] and current_user.get("role") != "admin":
-                raise HTTPException(403, "无权限删除此评论")
-            comment_index = i
-            break
-
-    if comment_index is None:
-        raise HTTPException(404, "评论不存在")
-
-    deleted_comment = db["comments"].pop(comment_index)
-
-    # 更新文章评论数
-    for post in db["posts"]:
-        if post["id"] == deleted_comment["postId"]:
-            # 重新计算评论数
-            comment_count = len([c for c in db["comments"] if c["postId"] == post["id"]])
-            post["comments_count"] = comment_count
-            break
-
-    write_db(db)
+    with storage.transaction() as tx:
+        comment = tx.get("comments", comment_id)
+        if not comment:
+            raise HTTPException(404, "评论不存在")
+
+        # 只有评论作者或管理员可以删除评论
+        if comment["authorId"] != current_user["id"] and current_user.get("role") != "admin":
+            raise HTTPException(403, "无权限删除此评论")
+
+        deleted_comment = tx.delete("comments", comment_id)
+
+        # 更新文章评论数（重新计算）
+        post_id = deleted_comment["postId"]
+        if tx.get("posts", post_id):
+            tx.update("posts", post_id, {"comments_count": tx.count("comments", postId=post_id)})
+
     return {"message": "评论已删除"}
 
 # 点赞评论
 @app.post("/comments/{comment_id}/like")
 def like_comment(comment_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    for comment in db["comments"]:
-        if comment["id"] == comment_id:
-            comment["likes"] = comment.get("likes", 0) + 1
-            write_db(db)
-            return {"likes": comment["likes"]}
+    with storage.transaction() as tx:
+        if not tx.get("comments", comment_id):
+            raise HTTPException(404, "评论不存在")
+        likes = tx.increment("comments", comment_id, "likes")
 
-    raise HTTPException(404, "评论不存在")
+    return {"likes": likes}
 
 # ✅ 标签系统 API ——
 
 # 获取所有标签
 @app.get("/tags")
-def get_tags():
-    db = read_db()
-    return db["tags"]
+def get_tags(request: Request):
+    return conditional_response(
+        request, make_etag("get_tags", storage.version("tags")),
+        lambda: cached_response(request, ("get_tags",), lambda: (storage.all("tags"), {("tags",)})),
+    )
 
 # 创建标签
 @app.post("/tags")
 def create_tag(tag: TagIn, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 检查标签是否已存在
-    if any(t["name"] == tag.name for t in db["tags"]):
-        raise HTTPException(400, "标签已存在")
-
-    tag_id = max((t["id"] for t in db["tags"]), default=0) + 1
-    new_tag = {
-        "id": tag_id,
-        "name": tag.name,
-        "description": tag.description or "",
-        "color": tag.color,
-        "post_count": 0
-    }
+    with storage.transaction() as tx:
+        # 检查标签是否已存在
+        if tx.find_one("tags", name=tag.name):
+            raise HTTPException(400, "标签已存在")
+
+        new_tag = tx.insert("tags", {
+            "name": tag.name,
+            "description": tag.description or "",
+            "color": tag.color,
+            "post_count": 0
+        })
 
-    db["tags"].append(new_tag)
-    write_db(db)
     return new_tag
 
 # 根据标签获取文章
 @app.get("/tags/{tag_name}/posts")
-def get_posts_by_tag(tag_name: str):
-    db = read_db()
-    posts = [p for p in db["posts"] if tag_name in p.get("tags", [])]
-    return posts
+def get_posts_by_tag(request: Request, tag_name: str, fields: str = ""):
+    selected_fields = post_list_fields(fields)
+
+    def compute():
+        posts, _ = storage.query("posts", contains={"tags": tag_name})
+        projector = Projector(storage)
+        return (
+            [projector.post(post, fields=selected_fields) for post in posts],
+            post_dependencies(posts) | {("posts-tag", tag_name)},
+        )
+
+    return cached_response(request, ("get_posts_by_tag", tag_name, tuple(sorted(selected_fields))), compute)
 
 # ✅ 文件上传增强 ——
 
@@ -924,61 +1067,51 @@ async def upload_user_avatar(user_id: int, file: UploadFile = File(...), current
 
     ext = os.path.splitext(file.filename)[1]
     path = f"{UPLOAD_DIR}/avatars/{user_id}{ext}"
-
-    with open(path, "wb") as f:
-        f.write(await file.read())
-
-    db = read_db()
     avatar_url = f"/static/avatars/{user_id}{ext}"
-    for u in db["users"]:
-        if u["id"] == user_id:
-            u["avatar"] = avatar_url
-            break
-    write_db(db)
+    data = await file.read()
+    await run_in_threadpool(store_upload, path, data, set_user_avatar(user_id, avatar_url))
 
     return {"avatar": avatar_url, "url": avatar_url}
 
 # 获取用户信息（增强版）
 @app.get("/users/{user_id}/profile")
-def get_user_profile(user_id: int):
-    db = read_db()
-    for u in db["users"]:
-        if u["id"] == user_id:
-            # 计算用户的文章数
-            post_count = len([p for p in db["posts"] if p["authorId"] == user_id])
-
-            return {
-                "id": u["id"],
-                "username": u.get("username", u["email"]),
-                "email": u["email"],
-                "bio": u.get("bio", ""),
-                "avatar": u["avatar"],
-                "created_at": u.get("created_at"),
-                "followers_count": u.get("followers_count", 0),
-                "following_count": u.get("following_count", 0),
-                "post_count": post_count
-            }
-    raise HTTPException(404, "用户不存在")
+def get_user_profile(request: Request, user_id: int):
+    u = storage.get("users", user_id)
+    if not u:
+        raise HTTPException(404, "用户不存在")
+
+    def compute():
+        # 计算用户的文章数
+        post_count = storage.count("posts", authorId=user_id)
+
+        return {
+            "id": u["id"],
+            "username": u.get("username", u["email"]),
+            "email": u["email"],
+            "bio": u.get("bio", ""),
+            "avatar": u["avatar"],
+            "created_at": u.get("created_at"),
+            "followers_count": u.get("followers_count", 0),
+            "following_count": u.get("following_count", 0),
+            "post_count": post_count
+        }, {("users", user_id), ("posts-author", user_id)}
+
+    return cached_response(request, ("get_user_profile", user_id), compute)
 
 # ✅ SVG头像生成 ——
 @app.get("/users/{user_id}/avatar.svg")
-def get_user_avatar_svg_endpoint(user_id: int, style: str = "initial"):
-    db = read_db()
-
+def get_user_avatar_svg_endpoint(request: Request, user_id: int, style: str = "initial"):
     # 查找用户
-    user = None
-    for u in db["users"]:
-        if u["id"] == user_id:
-            user = u
-            break
-
+    user = storage.get("users", user_id)
     if not user:
         raise HTTPException(404, "用户不存在")
 
+    # 头像只由用户 id、用户名和样式决定
     username = user.get("username", user["email"])
-    svg_content = get_user_avatar_svg(user_id, username, style)
-
-    return Response(content=svg_content, media_type="image/svg+xml")
+    return conditional_response(
+        request, make_etag("avatar", user_id, username, style),
+        lambda: Response(content=get_user_avatar_svg(user_id, username, style), media_type="image/svg+xml"),
+    )
 
 # ✅ 关注系统 API ——
 
@@ -988,161 +1121,117 @@ def follow_user(user_id: int, current_user: dict = Depends(get_current_user)):
     if current_user["id"] == user_id:
         raise HTTPException(400, "不能关注自己")
 
-    db = read_db()
-
-    # 检查目标用户是否存在
-    target_user = None
-    for u in db["users"]:
-        if u["id"] == user_id:
-            target_user = u
-            break
-
-    if not target_user:
-        raise HTTPException(404, "用户不存在")
-
-    # 检查是否已经关注
-    existing_follow = any(
-        f["followerId"] == current_user["id"] and f["followingId"] == user_id
-        for f in db["follows"]
-    )
+    with storage.transaction() as tx:
+        # 检查目标用户是否存在
+        if not tx.get("users", user_id):
+            raise HTTPException(404, "用户不存在")
 
-    if existing_follow:
-        raise HTTPException(400, "已经关注了该用户")
+        # 检查是否已经关注
+        if tx.find_one("follows", followerId=current_user["id"], followingId=user_id):
+            raise HTTPException(400, "已经关注了该用户")
 
-    # 创建关注关系
-    follow_id = max((f["id"] for f in db["follows"]), default=0) + 1
-    new_follow = {
-        "id": follow_id,
-        "followerId": current_user["id"],
-        "followingId": user_id,
-        "created_at": get_current_timestamp()
-    }
+        # 创建关注关系
+        tx.insert("follows", {
+            "followerId": current_user["id"],
+            "followingId": user_id,
+            "created_at": get_current_timestamp()
+        })
 
-    db["follows"].append(new_follow)
-
-    # 更新用户关注数
-    for u in db["users"]:
-        if u["id"] == current_user["id"]:
-            u["following_count"] = u.get("following_count", 0) + 1
-        elif u["id"] == user_id:
-            u["followers_count"] = u.get("followers_count", 0) + 1
-
-    # 创建通知
-    notification_id = max((n["id"] for n in db["notifications"]), default=0) + 1
-    notification = {
-        "id": notification_id,
-        "userId": user_id,
-        "type": "follow",
-        "title": "新的关注者",
-        "content": f"{current_user.get('username', current_user['email'])} 关注了你",
-        "relatedId": current_user["id"],
-        "relatedType": "user",
-        "isRead": False,
-        "created_at": get_current_timestamp()
-    }
+        # 更新用户关注数
+        tx.increment("users", current_user["id"], "following_count")
+        tx.increment("users", user_id, "followers_count")
 
-    db["notifications"].append(notification)
-    write_db(db)
+        # 创建通知
+        tx.insert("notifications", {
+            "userId": user_id,
+            "type": "follow",
+            "title": "新的关注者",
+            "content": f"{current_user.get('username', current_user['email'])} 关注了你",
+            "relatedId": current_user["id"],
+            "relatedType": "user",
+            "isRead": False,
+            "created_at": get_current_timestamp()
+        })
 
     return {"message": "关注成功"}
 
 # 取消关注
 @app.delete("/users/{user_id}/follow")
 def unfollow_user(user_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
+    with storage.transaction() as tx:
+        # 查找关注关系
+        follow = tx.find_one("follows", followerId=current_user["id"], followingId=user_id)
+        if not follow:
+            raise HTTPException(400, "未关注该用户")
 
-    # 查找关注关系
-    follow_index = None
-    for i, follow in enumerate(db["follows"]):
-        if follow["followerId"] == current_user["id"] and follow["followingId"] == user_id:
-            follow_index = i
-            break
+        # 删除关注关系
+        tx.delete("follows", follow["id"])
 
-    if follow_index is None:
-        raise HTTPException(400, "未关注该用户")
+        # 更新用户关注数
+        tx.increment("users", current_user["id"], "following_count", -1)
+        if tx.get("users", user_id):
+            tx.increment("users", user_id, "followers_count", -1)
 
-    # 删除关注关系
-    db["follows"].pop(follow_index)
-
-    # 更新用户关注数
-    for u in db["users"]:
-        if u["id"] == current_user["id"]:
-            u["following_count"] = max(0, u.get("following_count", 0) - 1)
-        elif u["id"] == user_id:
-            u["followers_count"] = max(0, u.get("followers_count", 0) - 1)
-
-    write_db(db)
     return {"message": "取消关注成功"}
 
 # 获取用户的关注列表
 @app.get("/users/{user_id}/following")
 def get_user_following(user_id: int, current_user: dict = Depends(get_current_user_optional)):
-    db = read_db()
-
-    following_ids = [f["followingId"] for f in db["follows"] if f["followerId"] == user_id]
     following_users = []
 
-    for u in db["users"]:
-        if u["id"] in following_ids:
-            # 检查当前用户是否关注了这个用户
-            is_following = False
-            if current_user:
-                is_following = any(
-                    f["followerId"] == current_user["id"] and f["followingId"] == u["id"]
-                    for f in db["follows"]
-                )
-
-            following_users.append({
-                "id": u["id"],
-                "username": u.get("username", u["email"]),
-                "email": u["email"],
-                "avatar": u["avatar"],
-                "bio": u.get("bio", ""),
-                "followers_count": u.get("followers_count", 0),
-                "is_following": is_following
-            })
+    for f in storage.find("follows", followerId=user_id):
+        u = storage.get("users", f["followingId"])
+        if not u:
+            continue
+
+        # 检查当前用户是否关注了这个用户
+        is_following = False
+        if current_user:
+            is_following = storage.find_one("follows", followerId=current_user["id"], followingId=u["id"]) is not None
+
+        following_users.append({
+            "id": u["id"],
+            "username": u.get("username", u["email"]),
+            "email": u["email"],
+            "avatar": u["avatar"],
+            "bio": u.get("bio", ""),
+            "followers_count": u.get("followers_count", 0),
+            "is_following": is_following
+        })
 
     return following_users
 
 # 获取用户的粉丝列表
 @app.get("/users/{user_id}/followers")
 def get_user_followers(user_id: int, current_user: dict = Depends(get_current_user_optional)):
-    db = read_db()
-
-    follower_ids = [f["followerId"] for f in db["follows"] if f["followingId"] == user_id]
     followers = []
 
-    for u in db["users"]:
-        if u["id"] in follower_ids:
-            # 检查当前用户是否关注了这个用户
-            is_following = False
-            if current_user:
-                is_following = any(
-                    f["followerId"] == current_user["id"] and f["followingId"] == u["id"]
-                    for f in db["follows"]
-                )
-
-            followers.append({
-                "id": u["id"],
-                "username": u.get("username", u["email"]),
-                "email": u["email"],
-                "avatar": u["avatar"],
-                "bio": u.get("bio", ""),
-                "followers_count": u.get("followers_count", 0),
-                "is_following": is_following
-            })
+    for f in storage.find("follows", followingId=user_id):
+        u = storage.get("users", f["followerId"])
+        if not u:
+            continue
+
+        # 检查当前用户是否关注了这个用户
+        is_following = False
+        if current_user:
+            is_following = storage.find_one("follows", followerId=current_user["id"], followingId=u["id"]) is not None
+
+        followers.append({
+            "id": u["id"],
+            "username": u.get("username", u["email"]),
+            "email": u["email"],
+            "avatar": u["avatar"],
+            "bio": u.get("bio", ""),
+            "followers_count": u.get("followers_count", 0),
+            "is_following": is_following
+        })
 
     return followers
 
 # 检查是否关注某用户
 @app.get("/users/{user_id}/follow/status")
 def check_follow_status(user_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    is_following = any(
-        f["followerId"] == current_user["id"] and f["followingId"] == user_id
-        for f in db["follows"]
-    )
+    is_following = storage.find_one("follows", followerId=current_user["id"], followingId=user_id) is not None
 
     return {"isFollowing": is_following}
 
@@ -1150,78 +1239,61 @@ def check_follow_status(user_id: int, current_user: dict = Depends(get_current_u
 
 # 获取用户通知
 @app.get("/notifications")
-def get_notifications(current_user: dict = Depends(get_current_user), page: int = 1, limit: int = 20):
-    db = read_db()
-
-    user_notifications = [n for n in db["notifications"] if n["userId"] == current_user["id"]]
-    user_notifications.sort(key=lambda x: x["created_at"], reverse=True)
-
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_notifications = user_notifications[start:end]
+def get_notifications(request: Request, current_user: dict = Depends(get_current_user), page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None):
+    def build():
+        # 按时间倒序分页
+        paginated_notifications, total, has_more, next_cursor = query_page(
+            "notifications", page, limit, cursor, order_by="created_at", descending=True,
+            userId=current_user["id"]
+        )
+
+        return {
+            "items": paginated_notifications,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "total": total,
+            "unread_count": storage.count("notifications", userId=current_user["id"], isRead=False)
+        }
 
-    return {
-        "items": paginated_notifications,
-        "has_more": end < len(user_notifications),
-        "total": len(user_notifications),
-        "unread_count": len([n for n in user_notifications if not n["isRead"]])
-    }
+    etag = make_etag("notifications", current_user["id"], page, limit, cursor or "", storage.version("notifications"))
+    return conditional_response(request, etag, build)
 
 # 标记通知为已读
 @app.put("/notifications/{notification_id}/read")
 def mark_notification_read(notification_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    for notification in db["notifications"]:
-        if notification["id"] == notification_id and notification["userId"] == current_user["id"]:
-            notification["isRead"] = True
-            write_db(db)
-            return {"message": "通知已标记为已读"}
+    with storage.transaction() as tx:
+        notification = tx.get("notifications", notification_id)
+        if not notification or notification["userId"] != current_user["id"]:
+            raise HTTPException(404, "通知不存在")
+        tx.update("notifications", notification_id, {"isRead": True})
 
-    raise HTTPException(404, "通知不存在")
+    return {"message": "通知已标记为已读"}
 
 # 标记所有通知为已读
 @app.put("/notifications/read-all")
 def mark_all_notifications_read(current_user: dict = Depends(get_current_user)):
-    db = read_db()
+    with storage.transaction() as tx:
+        unread = tx.find("notifications", userId=current_user["id"], isRead=False)
+        for notification in unread:
+            tx.update("notifications", notification["id"], {"isRead": True})
 
-    count = 0
-    for notification in db["notifications"]:
-        if notification["userId"] == current_user["id"] and not notification["isRead"]:
-            notification["isRead"] = True
-            count += 1
-
-    write_db(db)
-    return {"message": f"已标记 {count} 条通知为已读"}
+    return {"message": f"已标记 {len(unread)} 条通知为已读"}
 
 # 删除通知
 @app.delete("/notifications/{notification_id}")
 def delete_notification(notification_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    notification_index = None
-    for i, notification in enumerate(db["notifications"]):
-        if notification["id"] == notification_id and notification["userId"] == current_user["id"]:
-            notification_index = i
-            break
-
-    if notification_index is None:
-        raise HTTPException(404, "通知不存在")
+    with storage.transaction() as tx:
+        notification = tx.get("notifications", notification_id)
+        if not notification or notification["userId"] != current_user["id"]:
+            raise HTTPException(404, "通知不存在")
+        tx.delete("notifications", notification_id)
 
-    db["notifications"].pop(notification_index)
-    write_db(db)
     return {"message": "通知已删除"}
 
 # 获取未读通知数量
 @app.get("/notifications/unread-count")
 def get_unread_count(current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    unread_count = len([
-        n for n in db["notifications"]
-        if n["userId"] == current_user["id"] and not n["isRead"]
-    ])
+    unread_count = storage.count("notifications", userId=current_user["id"], isRead=False)
 
     return {"count": unread_count}
 
@@ -1230,69 +1302,43 @@ def get_unread_count(current_user: dict = Depends(get_current_user)):
 # 点赞文章
 @app.post("/posts/{post_id}/like")
 def like_post(post_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 检查文章是否存在
-    post = None
-    for p in db["posts"]:
-        if p["id"] == post_id:
-            post = p
-            break
-
-    if not post:
-        raise HTTPException(404, "文章不存在")
-
-    # 检查是否已经点赞
-    existing_like = any(
-        like["userId"] == current_user["id"] and like["postId"] == post_id
-        for like in db["likes"]
-    )
-
-    if existing_like:
-        raise HTTPException(400, "已经点赞过了")
-
-    # 创建点赞记录
-    like_id = max((like["id"] for like in db["likes"]), default=0) + 1
-    new_like = {
-        "id": like_id,
-        "userId": current_user["id"],
-        "postId": post_id,
-        "created_at": get_current_timestamp()
-    }
-
-    db["likes"].append(new_like)
+    with storage.transaction() as tx:
+        # 检查文章是否存在
+        if not tx.get("posts", post_id):
+            raise HTTPException(404, "文章不存在")
+
+        # 检查是否已经点赞
+        if tx.find_one("likes", userId=current_user["id"], postId=post_id):
+            raise HTTPException(400, "已经点赞过了")
+
+        # 创建点赞记录
+        tx.insert("likes", {
+            "userId": current_user["id"],
+            "postId": post_id,
+            "created_at": get_current_timestamp()
+        })
 
-    # 更新文章点赞数
-    post["likes_count"] = post.get("likes_count", 0) + 1
+        # 更新文章点赞数
+        tx.increment("posts", post_id, "likes_count")
 
-    write_db(db)
     return {"message": "点赞成功"}
 
 # 取消点赞
 @app.delete("/posts/{post_id}/like")
 def unlike_post(post_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
+    with storage.transaction() as tx:
+        # 查找点赞记录
+        like = tx.find_one("likes", userId=current_user["id"], postId=post_id)
+        if not like:
+            raise HTTPException(400, "未点赞该文章")
 
-    # 查找点赞记录
-    like_index = None
-    for i, like in enumerate(db["likes"]):
-        if like["userId"] == current_user["id"] and like["postId"] == post_id:
-            like_index = i
-            break
+        # 删除点赞记录
+        tx.delete("likes", like["id"])
 
-    if like_index is None:
-        raise HTTPException(400, "未点赞该文章")
+        # 更新文章点赞数
+        if tx.get("posts", post_id):
+            tx.increment("posts", post_id, "likes_count", -1)
 
-    # 删除点赞记录
-    db["likes"].pop(like_index)
-
-    # 更新文章点赞数
-    for post in db["posts"]:
-        if post["id"] == post_id:
-            post["likes_count"] = max(0, post.get("likes_count", 0) - 1)
-            break
-
-    write_db(db)
     return {"message": "取消点赞成功"}
 
 # ✅ 收藏系统 API ——
@@ -1300,69 +1346,43 @@ def unlike_post(post_id: int, current_user: dict = Depends(get_current_user)):
 # 收藏文章
 @app.post("/posts/{post_id}/bookmark")
 def bookmark_post(post_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 检查文章是否存在
-    post = None
-    for p in db["posts"]:
-        if p["id"] == post_id:
-            post = p
-            break
-
-    if not post:
-        raise HTTPException(404, "文章不存在")
-
-    # 检查是否已经收藏
-    existing_bookmark = any(
-        bookmark["userId"] == current_user["id"] and bookmark["postId"] == post_id
-        for bookmark in db["bookmarks"]
-    )
-
-    if existing_bookmark:
-        raise HTTPException(400, "已经收藏过了")
-
-    # 创建收藏记录
-    bookmark_id = max((bookmark["id"] for bookmark in db["bookmarks"]), default=0) + 1
-    new_bookmark = {
-        "id": bookmark_id,
-        "userId": current_user["id"],
-        "postId": post_id,
-        "created_at": get_current_timestamp()
-    }
-
-    db["bookmarks"].append(new_bookmark)
+    with storage.transaction() as tx:
+        # 检查文章是否存在
+        if not tx.get("posts", post_id):
+            raise HTTPException(404, "文章不存在")
+
+        # 检查是否已经收藏
+        if tx.find_one("bookmarks", userId=current_user["id"], postId=post_id):
+            raise HTTPException(400, "已经收藏过了")
+
+        # 创建收藏记录
+        tx.insert("bookmarks", {
+            "userId": current_user["id"],
+            "postId": post_id,
+            "created_at": get_current_timestamp()
+        })
 
-    # 更新文章收藏数
-    post["bookmarks_count"] = post.get("bookmarks_count", 0) + 1
+        # 更新文章收藏数
+        tx.increment("posts", post_id, "bookmarks_count")
 
-    write_db(db)
     return {"message": "收藏成功"}
 
 # 取消收藏
 @app.delete("/posts/{post_id}/bookmark")
 def unbookmark_post(post_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 查找收藏记录
-    bookmark_index = None
-    for i, bookmark in enumerate(db["bookmarks"]):
-        if bookmark["userId"] == current_user["id"] and bookmark["postId"] == post_id:
-            bookmark_index = i
-            break
+    with storage.transaction() as tx:
+        # 查找收藏记录
+        bookmark = tx.find_one("bookmarks", userId=current_user["id"], postId=post_id)
+        if not bookmark:
+            raise HTTPException(400, "未收藏该文章")
 
-    if bookmark_index is None:
-        raise HTTPException(400, "未收藏该文章")
+        # 删除收藏记录
+        tx.delete("bookmarks", bookmark["id"])
 
-    # 删除收藏记录
-    db["bookmarks"].pop(bookmark_index)
+        # 更新文章收藏数
+        if tx.get("posts", post_id):
+            tx.increment("posts", post_id, "bookmarks_count", -1)
 
-    # 更新文章收藏数
-    for post in db["posts"]:
-        if post["id"] == post_id:
-            post["bookmarks_count"] = max(0, post.get("bookmarks_count", 0) - 1)
-            break
-
-    write_db(db)
     return {"message": "取消收藏成功"}
 
 # ✅ 文章管理 API ——
@@ -1370,119 +1390,101 @@ def unbookmark_post(post_id: int, current_user: dict = Depends(get_current_user)
 # 删除文章（用户）
 @app.delete("/posts/{post_id}")
 def delete_post(post_id: int, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 查找文章
-    post_index = None
-    post = None
-    for i, p in enumerate(db["posts"]):
-        if p["id"] == post_id:
-            post = p
-            post_index = i
-            break
-
-    if post_index is None:
-        raise HTTPException(404, "文章不存在")
+    with storage.transaction() as tx:
+        # 查找文章
+        post = tx.get("posts", post_id)
+        if not post:
+            raise HTTPException(404, "文章不存在")
 
-    # 权限检查：只有作者本人或管理员可以删除文章
-    if post["authorId"] != current_user["id"] and current_user.get("role") != "admin":
-        raise HTTPException(403, "无权限删除此文章")
+        # 权限检查：只有作者本人或管理员可以删除文章
+        if post["authorId"] != current_user["id"] and current_user.get("role") != "admin":
+            raise HTTPException(403, "无权限删除此文章")
 
-    # 删除文章
-    db["posts"].pop(post_index)
+        # 删除文章
+        tx.delete("posts", post_id)
+        sync_tag_counts(tx, post.get("tags") or [])
 
-    # 删除相关评论
-    db["comments"] = [c for c in db["comments"] if c["postId"] != post_id]
+        # 删除相关评论
+        tx.delete_where("comments", postId=post_id)
 
-    # 删除相关点赞
-    db["likes"] = [l for l in db["likes"] if l["postId"] != post_id]
+        # 删除相关点赞
+        tx.delete_where("likes", postId=post_id)
 
-    # 删除相关收藏
-    db["bookmarks"] = [b for b in db["bookmarks"] if b["postId"] != post_id]
+        # 删除相关收藏
+        tx.delete_where("bookmarks", postId=post_id)
 
-    # 删除相关浏览历史
-    if "history" in db:
-        db["history"] = [h for h in db["history"] if h["postId"] != post_id]
+        # 删除相关浏览历史
+        tx.delete_where("history", postId=post_id)
 
-    write_db(db)
     return {"message": "文章删除成功"}
 
 # 编辑文章（用户）
 @app.put("/posts/{post_id}")
 def update_post(post_id: int, post_data: PostIn, current_user: dict = Depends(get_current_user)):
-    db = read_db()
-
-    # 查找文章
-    post = None
-    for p in db["posts"]:
-        if p["id"] == post_id:
-            post = p
-            break
-
-    if not post:
-        raise HTTPException(404, "文章不存在")
-
-    # 权限检查：只有作者本人或管理员可以编辑文章
-    if post["authorId"] != current_user["id"] and current_user.get("role") != "admin":
-        raise HTTPException(403, "无权限编辑此文章")
-
-    # 检查slug是否与其他文章冲突
-    if post_data.slug != post["slug"]:
-        if any(p["slug"] == post_data.slug and p["id"] != post_id for p in db["posts"]):
-            raise HTTPException(400, "slug 已存在")
-
-    # 更新文章
-    post["title"] = post_data.title
-    post["content"] = post_data.content
-    post["summary"] = getattr(post_data, 'summary', '')
-    post["slug"] = post_data.slug
-    post["tags"] = getattr(post_data, 'tags', [])
-    post["updated_at"] = get_current_timestamp()
-
-    write_db(db)
+    with storage.transaction() as tx:
+        # 查找文章
+        post = tx.get("posts", post_id)
+        if not post:
+            raise HTTPException(404, "文章不存在")
+
+        # 权限检查：只有作者本人或管理员可以编辑文章
+        if post["authorId"] != current_user["id"] and current_user.get("role") != "admin":
+            raise HTTPException(403, "无权限编辑此文章")
+
+        # 检查slug是否与其他文章冲突
+        if post_data.slug != post["slug"]:
+            conflict = tx.find_one("posts", slug=post_data.slug)
+            if conflict and conflict["id"] != post_id:
+                raise HTTPException(400, "slug 已存在")
+
+        # 更新文章
+        old_tags = post.get("tags") or []
+        post = tx.update("posts", post_id, {
+            "title": post_data.title,
+            "content": post_data.content,
+            "summary": getattr(post_data, 'summary', ''),
+            "slug": post_data.slug,
+            "tags": getattr(post_data, 'tags', []),
+            "updated_at": get_current_timestamp()
+        })
+        sync_tag_counts(tx, set(old_tags) ^ set(post["tags"] or []))
 
     # 返回更新后的文章（包含作者信息）
-    for user in db["users"]:
-        if user["id"] == post["authorId"]:
-            post["author"] = {
-                "id": user["id"],
-                "username": user.get("username", user["email"]),
-                "email": user["email"],
-                "avatar": user["avatar"]
-            }
-            break
-
-    return post
+    return Projector(storage).post(post)
 
 # ✅ 管理后台 API ——
 
 # 获取系统统计信息
 @app.get("/admin/stats")
 def get_admin_stats(admin_user: dict = Depends(get_admin_user)):
-    db = read_db()
-
     stats = {
-        "users_count": len(db["users"]),
-        "posts_count": len(db["posts"]),
-        "comments_count": len(db["comments"]),
-        "tags_count": len(db["tags"]),
-        "follows_count": len(db["follows"]),
-        "notifications_count": len(db["notifications"])
+        "users_count": storage.count("users"),
+        "posts_count": storage.count("posts"),
+        "comments_count": storage.count("comments"),
+        "tags_count": storage.count("tags"),
+        "follows_count": storage.count("follows"),
+        "notifications_count": storage.count("notifications")
     }
 
     return stats
 
+# 响应缓存统计（用于调整缓存大小）
+@app.get("/admin/cache")
+def get_cache_stats(admin_user: dict = Depends(get_admin_user)):
+    return response_cache.stats()
+
 # 获取所有用户（管理员）
 @app.get("/admin/users")
-def get_all_users(admin_user: dict = Depends(get_admin_user), page: int = 1, limit: int = 20):
-    db = read_db()
+def get_all_users(admin_user: dict = Depends(get_admin_user), page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None):
+    # 按 id 分页
+    page_users, total, has_more, next_cursor = query_page("users", page, limit, cursor)
 
-    users = []
-    for u in db["users"]:
-        post_count = len([p for p in db["posts"] if p["authorId"] == u["id"]])
-        comment_count = len([c for c in db["comments"] if c["authorId"] == u["id"]])
+    paginated_users = []
+    for u in page_users:
+        post_count = storage.count("posts", authorId=u["id"])
+        comment_count = storage.count("comments", authorId=u["id"])
 
-        users.append({
+        paginated_users.append({
             "id": u["id"],
             "email": u["email"],
             "username": u.get("username", u["email"]),
@@ -1495,15 +1497,11 @@ def get_all_users(admin_user: dict = Depends(get_admin_user), page: int = 1, lim
             "comment_count": comment_count
         })
 
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_users = users[start:end]
-
     return {
         "items": paginated_users,
-        "has_more": end < len(users),
-        "total": len(users)
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "total": total
     }
 
 # 删除用户（管理员）
@@ -1512,139 +1510,109 @@ def delete_user_admin(user_id: int, admin_user: dict = Depends(get_admin_user)):
     if user_id == admin_user["id"]:
         raise HTTPException(400, "不能删除自己")
 
-    db = read_db()
-
-    # 删除用户
-    user_index = None
-    for i, u in enumerate(db["users"]):
-        if u["id"] == user_id:
-            user_index = i
-            break
+    with storage.transaction() as tx:
+        # 删除用户
+        if not tx.get("users", user_id):
+            raise HTTPException(404, "用户不存在")
 
-    if user_index is None:
-        raise HTTPException(404, "用户不存在")
-
-    db["users"].pop(user_index)
+        tx.delete("users", user_id)
 
-    # 删除用户相关数据
-    db["posts"] = [p for p in db["posts"] if p["authorId"] != user_id]
-    db["comments"] = [c for c in db["comments"] if c["authorId"] != user_id]
-    db["follows"] = [f for f in db["follows"] if f["followerId"] != user_id and f["followingId"] != user_id]
-    db["notifications"] = [n for n in db["notifications"] if n["userId"] != user_id]
+        # 删除用户相关数据（文章用到的标签随后重新统计 post_count）
+        tags = [tag for post in tx.find("posts", authorId=user_id) for tag in post.get("tags") or []]
+        tx.delete_where("posts", authorId=user_id)
+        sync_tag_counts(tx, tags)
+        tx.delete_where("comments", authorId=user_id)
+        tx.delete_where("follows", followerId=user_id)
+        tx.delete_where("follows", followingId=user_id)
+        tx.delete_where("notifications", userId=user_id)
 
-    write_db(db)
     return {"message": "用户已删除"}
 
 # 获取所有文章（管理员）
 @app.get("/admin/posts")
-def get_all_posts_admin(admin_user: dict = Depends(get_admin_user), page: int = 1, limit: int = 20):
-    db = read_db()
-
-    posts = []
-    for p in db["posts"]:
-        # 获取作者信息
-        author = None
-        for u in db["users"]:
-            if u["id"] == p["authorId"]:
-                author = {
-                    "id": u["id"],
-                    "username": u.get("username", u["email"]),
-                    "email": u["email"]
-                }
-                break
-
-        comment_count = len([c for c in db["comments"] if c["postId"] == p["id"]])
-
-        posts.append({
-            **p,
-            "author": author,
-            "comment_count": comment_count
-        })
-
-    # 按创建时间排序
-    posts.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+def get_all_posts_admin(admin_user: dict = Depends(get_admin_user), page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None):
+    # 按创建时间倒序分页
+    page_posts, total, has_more, next_cursor = query_page(
+        "posts", page, limit, cursor, order_by="created_at", descending=True
+    )
 
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_posts = posts[start:end]
+    # 附加作者信息（作者不存在时为 None）和评论数
+    projector = Projector(storage)
+    paginated_posts = [
+        projector.post(
+            p,
+            author_fields=None,
+            author=projector.author(p["authorId"], ADMIN_AUTHOR_FIELDS),
+            comment_count=storage.count("comments", postId=p["id"]),
+        )
+        for p in page_posts
+    ]
 
     return {
         "items": paginated_posts,
-        "has_more": end < len(posts),
-        "total": len(posts)
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "total": total
     }
 
 # 删除文章（管理员）
 @app.delete("/admin/posts/{post_id}")
 def delete_post_admin(post_id: int, admin_user: dict = Depends(get_admin_user)):
-    db = read_db()
+    with storage.transaction() as tx:
+        # 删除文章
+        post = tx.get("posts", post_id)
+        if not post:
+            raise HTTPException(404, "文章不存在")
 
-    # 删除文章
-    post_index = None
-    for i, p in enumerate(db["posts"]):
-        if p["id"] == post_id:
-            post_index = i
-            break
+        tx.delete("posts", post_id)
+        sync_tag_counts(tx, post.get("tags") or [])
 
-    if post_index is None:
-        raise HTTPException(404, "文章不存在")
+        # 删除相关评论
+        tx.delete_where("comments", postId=post_id)
 
-    db["posts"].pop(post_index)
-
-    # 删除相关评论
-    db["comments"] = [c for c in db["comments"] if c["postId"] != post_id]
-
-    write_db(db)
     return {"message": "文章已删除"}
 
 # 获取所有评论（管理员）
 @app.get("/admin/comments")
-def get_all_comments_admin(admin_user: dict = Depends(get_admin_user), page: int = 1, limit: int = 20):
-    db = read_db()
+def get_all_comments_admin(admin_user: dict = Depends(get_admin_user), page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None):
+    # 按创建时间倒序分页
+    page_comments, total, has_more, next_cursor = query_page(
+        "comments", page, limit, cursor, order_by="created_at", descending=True
+    )
 
-    comments = []
-    for c in db["comments"]:
+    paginated_comments = []
+    for c in page_comments:
         # 获取作者信息
         author = None
-        for u in db["users"]:
-            if u["id"] == c["authorId"]:
-                author = {
-                    "id": u["id"],
-                    "username": u.get("username", u["email"]),
-                    "email": u["email"]
-                }
-                break
+        u = storage.get("users", c["authorId"])
+        if u:
+            author = {
+                "id": u["id"],
+                "username": u.get("username", u["email"]),
+                "email": u["email"]
+            }
 
         # 获取文章信息
         post = None
-        for p in db["posts"]:
-            if p["id"] == c["postId"]:
-                post = {
-                    "id": p["id"],
-                    "title": p["title"],
-                    "slug": p["slug"]
-                }
-                break
-
-        comments.append({
+        p = storage.get("posts", c["postId"])
+        if p:
+            post = {
+                "id": p["id"],
+                "title": p["title"],
+                "slug": p["slug"]
+            }
+
+        paginated_comments.append({
             **c,
             "author": author,
             "post": post
         })
 
-    # 按创建时间排序
-    comments.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_comments = comments[start:end]
-
     return {
         "items": paginated_comments,
-        "has_more": end < len(comments),
-        "total": len(comments)
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "total": total
     }
 
 # ✅ 匿名消息系统 API ——
@@ -1656,39 +1624,33 @@ def get_ip_hash(request: Request) -> str:
 
 # 获取匿名消息列表
 @app.get("/anonymous/messages")
-def get_anonymous_messages(page: int = 1, limit: int = 20):
+def get_anonymous_messages(page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None):
     """获取匿名消息列表"""
-    db = read_db()
-
-    # 过滤未删除的消息
-    messages = [msg for msg in db["anonymous_messages"] if not msg.get("is_deleted", False)]
-
-    # 按时间倒序排列
-    messages.sort(key=lambda x: x["created_at"], reverse=True)
-
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_messages = messages[start:end]
+    # 未删除的消息，按时间倒序分页
+    messages, total, has_more, next_cursor = query_page(
+        "anonymous_messages", page, limit, cursor, order_by="created_at", descending=True,
+        is_deleted=False
+    )
 
-    # 移除敏感信息（IP哈希）
-    for msg in paginated_messages:
-        msg.pop("ip_hash", None)
+    # 移除敏感信息（IP哈希），在副本上处理，不影响存储
+    paginated_messages = [
+        {k: v for k, v in msg.items() if k != "ip_hash"}
+        for msg in messages
+    ]
 
     return {
         "items": paginated_messages,
-        "total": len(messages),
+        "total": total,
         "page": page,
         "limit": limit,
-        "has_more": end < len(messages)
+        "has_more": has_more,
+        "next_cursor": next_cursor
     }
 
 # 发送匿名消息
 @app.post("/anonymous/messages")
 def create_anonymous_message(message: AnonymousMessageCreate, request: Request):
     """发送匿名消息"""
-    db = read_db()
-
     # 内容验证
     content = message.content.strip()
     if not content:
@@ -1703,17 +1665,13 @@ def create_anonymous_message(message: AnonymousMessageCreate, request: Request):
         raise HTTPException(400, "消息包含不当内容")
 
     # 创建新消息
-    message_id = max((msg["id"] for msg in db["anonymous_messages"]), default=0) + 1
-    new_message = {
-        "id": message_id,
-        "content": content,
-        "created_at": get_current_timestamp(),
-        "ip_hash": get_ip_hash(request),
-        "is_deleted": False
-    }
-
-    db["anonymous_messages"].append(new_message)
-    write_db(db)
+    with storage.transaction() as tx:
+        new_message = tx.insert("anonymous_messages", {
+            "content": content,
+            "created_at": get_current_timestamp(),
+            "ip_hash": get_ip_hash(request),
+            "is_deleted": False
+        })
 
     # 返回消息（不包含IP哈希）
     response_message = new_message.copy()
@@ -1725,52 +1683,40 @@ def create_anonymous_message(message: AnonymousMessageCreate, request: Request):
 @app.delete("/anonymous/messages/{message_id}")
 def delete_anonymous_message(message_id: int, admin_user: dict = Depends(get_admin_user)):
     """管理员删除匿名消息"""
-    db = read_db()
-
-    # 查找消息
-    message = None
-    for msg in db["anonymous_messages"]:
-        if msg["id"] == message_id:
-            message = msg
-            break
-
-    if not message:
-        raise HTTPException(404, "消息不存在")
-
-    if message.get("is_deleted", False):
-        raise HTTPException(400, "消息已被删除")
-
-    # 标记为已删除（软删除）
-    message["is_deleted"] = True
-    message["deleted_at"] = get_current_timestamp()
-    message["deleted_by"] = admin_user["id"]
-
-    write_db(db)
+    with storage.transaction() as tx:
+        # 查找消息
+        message = tx.get("anonymous_messages", message_id)
+        if not message:
+            raise HTTPException(404, "消息不存在")
+
+        if message.get("is_deleted", False):
+            raise HTTPException(400, "消息已被删除")
+
+        # 标记为已删除（软删除）
+        tx.update("anonymous_messages", message_id, {
+            "is_deleted": True,
+            "deleted_at": get_current_timestamp(),
+            "deleted_by": admin_user["id"]
+        })
 
     return {"message": "消息已删除"}
 
 # 管理员获取所有匿名消息（包括已删除的）
 @app.get("/admin/anonymous/messages")
-def get_all_anonymous_messages(page: int = 1, limit: int = 20, admin_user: dict = Depends(get_admin_user)):
+def get_all_anonymous_messages(page: int = Query(1, ge=1), limit: int = Query(20, ge=1), cursor: Optional[str] = None, admin_user: dict = Depends(get_admin_user)):
     """管理员获取所有匿名消息"""
-    db = read_db()
-
-    messages = db["anonymous_messages"].copy()
-
-    # 按时间倒序排列
-    messages.sort(key=lambda x: x["created_at"], reverse=True)
-
-    # 分页
-    start = (page - 1) * limit
-    end = start + limit
-    paginated_messages = messages[start:end]
+    # 按时间倒序分页
+    paginated_messages, total, has_more, next_cursor = query_page(
+        "anonymous_messages", page, limit, cursor, order_by="created_at", descending=True
+    )
 
     return {
         "items": paginated_messages,
-        "total": len(messages),
+        "total": total,
         "page": page,
         "limit": limit,
-        "has_more": end < len(messages)
+        "has_more": has_more,
+        "next_cursor": next_cursor
     }
 
 # ✅ 启动服务器（可选）——
@@ -1781,6 +1727,8 @@ if __name__ == "__main__":
     # 从环境变量获取端口，默认使用9000
     port = int(os.getenv("PORT", 9000))
     host = os.getenv("HOST", "127.0.0.1")
+    # WORKERS>1 时以多进程运行（不支持自动重载），各 worker 通过数据目录的文件锁和日志同步
+    workers = int(os.getenv("WORKERS", 1))
 
     print(f"🚀 启动博客论坛API服务")
     print(f"📡 地址: http://{host}:{port}")
@@ -1791,6 +1739,7 @@ if __name__ == "__main__":
         "main:app",
         host=host,
         port=port,
-        reload=True,
+        reload=workers == 1,
+        workers=workers,
         log_level="info"
     )
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把 json 引擎的数据（data 目录，含未压缩的日志）一次性迁移到 SQLite 数据库
+
+用法: python migrate_to_sqlite.py [数据目录] [sqlite路径]
+数据目录尚未初始化时直接从同级的 db.json 导入。
+迁移完成后以 STORAGE_ENGINE=sqlite 启动后端即可使用。
+"""
+
+import os
+import sys
+
+from json_store import load_json_dataset
+from sqlite_store import SqliteStore
+
+
+def migrate(data_dir, sqlite_path, seed_path=None):
+    """迁移全部集合，保留原有 id 与 id 序列"""
+    print(f"🚚 开始迁移 {data_dir} -> {sqlite_path}")
+
+    if os.path.exists(sqlite_path):
+        print(f"❌ 目标数据库已存在: {sqlite_path}，为避免覆盖数据请先移走")
+        return False
+
+    data, sequences = load_json_dataset(data_dir, seed_path)
+    store = SqliteStore(sqlite_path)
+    try:
+        store.import_dataset(data, sequences)
+
+        print("✅ 迁移完成！")
+        print("📊 迁移统计:")
+        for collection, records in data.items():
+            if isinstance(records, list):
+                print(f"   - {collection}: {store.count(collection)} / {len(records)} 条")
+    finally:
+        store.close()
+    return True
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(script_dir, "data")
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(script_dir, "blog.sqlite3")
+    seed_path = os.path.join(script_dir, "db.json")
+    sys.exit(0 if migrate(data_dir, sqlite_path, seed_path) else 1)
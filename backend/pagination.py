@@ -0,0 +1,37 @@
+"""
+列表接口的游标（keyset）分页
+
+游标记录上一页最后一条记录的 (排序字段, 排序值, id)，对客户端是不透明的字符串。
+下一页从该位置之后接着取，不需要跳过前面的记录，翻到多深代价都一样；
+期间插入新记录也不会让后面的页错位或重复。
+"""
+
+import base64
+import json
+
+# 游标中允许出现的排序值类型
+_CURSOR_VALUE_TYPES = (str, int, float, type(None))
+
+
+def encode_cursor(record, order_by=None):
+    """指向 record 之后位置的游标；order_by 为 None 时表示按 id 排序"""
+    value = record.get(order_by) if order_by else None
+    payload = json.dumps([order_by, value, record["id"]], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, order_by=None):
+    """
+    解析游标，返回可以传给 storage.query(after=...) 的 (排序值, id)
+
+    游标格式不对或不是按同一字段排序时生成的，抛出 ValueError。
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, value, record_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("无效的游标")
+    if field != order_by or not isinstance(value, _CURSOR_VALUE_TYPES) \
+            or not isinstance(record_id, int) or isinstance(record_id, bool):
+        raise ValueError("无效的游标")
+    return value, record_id
@@ -0,0 +1,44 @@
+"""
+跨进程文件锁（多 worker 部署时串行化对数据目录的写入）
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 flock，只支持单进程运行
+    fcntl = None
+
+
+class ProcessLock:
+    """
+    基于 flock 的排他锁
+
+    flock 是按打开的文件生效的，同一进程内的线程之间不互斥，
+    调用方需要同时持有对应的线程锁；在此前提下可重入。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._depth = 0
+
+    def acquire(self):
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        os.close(self._fd)
@@ -0,0 +1,114 @@
+"""
+响应视图（投影层）
+
+由存储中的只读记录构造接口返回的新字典：作者信息、当前用户的点赞/收藏状态、
+收藏时间、访问时间等按请求计算的字段只出现在视图里，从不写回存储。
+"""
+
+# 按请求计算的文章字段，不属于存储中的记录（旧版本曾把它们写进 db.json）
+COMPUTED_POST_FIELDS = ("author", "is_liked", "is_bookmarked", "bookmarked_at", "visited_at")
+
+# 旧版本保存在文章里的字段，已不再使用，也不返回给客户端（浏览去重见 view_counter.py）
+OBSOLETE_POST_FIELDS = ("view_records",)
+
+_EXCLUDED_POST_FIELDS = frozenset(COMPUTED_POST_FIELDS + OBSOLETE_POST_FIELDS)
+
+# 列表接口默认返回的文章字段：不含正文（content），正文只由详情接口返回
+LIST_POST_FIELDS = frozenset((
+    "id", "slug", "title", "summary", "cover", "author", "authorId", "tags", "status",
+    "likes_count", "comments_count", "views_count", "bookmarks_count",
+    "is_liked", "is_bookmarked", "created_at", "updated_at",
+))
+
+# 作者信息包含的字段
+AUTHOR_FIELDS = ("id", "username", "email", "avatar")
+PUBLIC_AUTHOR_FIELDS = ("id", "username", "avatar")
+ADMIN_AUTHOR_FIELDS = ("id", "username", "email")
+
+
+def author_view(user, fields=AUTHOR_FIELDS):
+    """用户的作者信息（username 缺失时用邮箱代替）"""
+    return {
+        field: user.get("username", user["email"]) if field == "username" else user[field]
+        for field in fields
+    }
+
+
+def list_fields(fields=None):
+    """
+    解析列表接口的 fields= 参数（逗号分隔），未指定时返回默认的列表字段
+
+    只能在默认的列表字段中选择（始终包含 id）；有不支持的字段时抛出 ValueError。
+    """
+    if not fields:
+        return LIST_POST_FIELDS
+    selected = frozenset(field.strip() for field in fields.split(",") if field.strip())
+    unknown = selected - LIST_POST_FIELDS
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}")
+    return selected | {"id"}
+
+
+class Projector:
+    """
+    在一次请求内构造文章与评论的视图
+
+    reader 为存储（或请求固定的那一代数据），current_user 为当前登录用户。
+    同一页里重复出现的作者只查一次。
+    """
+
+    def __init__(self, reader, current_user=None):
+        self.reader = reader
+        self.current_user = current_user
+        self._authors = {}
+
+    def author(self, user_id, fields=AUTHOR_FIELDS):
+        """作者信息，用户不存在时返回 None"""
+        key = (user_id, fields)
+        if key not in self._authors:
+            user = self.reader.get("users", user_id)
+            self._authors[key] = author_view(user, fields) if user else None
+        return self._authors[key]
+
+    def interactions(self, post_id):
+        """当前用户对文章的点赞、收藏状态（未登录时都为 False）"""
+        if not self.current_user:
+            return {"is_liked": False, "is_bookmarked": False}
+        user_id = self.current_user["id"]
+        return {
+            "is_liked": self.reader.find_one("likes", userId=user_id, postId=post_id) is not None,
+            "is_bookmarked": self.reader.find_one("bookmarks", userId=user_id, postId=post_id) is not None,
+        }
+
+    def post(self, post, author_fields=AUTHOR_FIELDS, interactions=False, fields=None, **extra):
+        """
+        文章视图：去掉计算字段与隐藏字段，附加作者信息（作者存在时）、
+        可选的交互状态以及 extra 中的字段；author_fields 为 None 时不附加作者
+
+        fields 不为 None 时只保留其中的字段（见 list_fields），不需要的作者信息和
+        交互状态也不再查询；extra 中的字段总是保留。
+        """
+        if fields is None:
+            view = {k: v for k, v in post.items() if k not in _EXCLUDED_POST_FIELDS}
+        else:
+            view = {k: v for k, v in post.items() if k in fields and k not in _EXCLUDED_POST_FIELDS}
+        if author_fields is not None and (fields is None or "author" in fields):
+            author = self.author(post["authorId"], author_fields)
+            if author:
+                view["author"] = author
+        if interactions and (fields is None or "is_liked" in fields or "is_bookmarked" in fields):
+            view.update(
+                (k, v) for k, v in self.interactions(post["id"]).items() if fields is None or k in fields
+            )
+        view.update(extra)
+        return view
+
+    def comment(self, comment, author_fields=PUBLIC_AUTHOR_FIELDS, **extra):
+        """评论视图：附加作者信息（作者存在时）以及 extra 中的字段"""
+        view = dict(comment)
+        if author_fields is not None:
+            author = self.author(comment["authorId"], author_fields)
+            if author:
+                view["author"] = author
+        view.update(extra)
+        return view
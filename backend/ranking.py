@@ -0,0 +1,132 @@
+"""
+热门排序（/posts?type=hot）
+
+热度 = (加权互动数 + 1) / (发布小时数 + 2) ^ gravity，互动数按点赞、评论、收藏、
+浏览加权。计数变化时通过存储的变更通知只重算那一篇；时间衰减会改变所有文章
+之间的相对顺序，由后台任务定期整体重算。
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+# 各互动计数的权重
+HOT_WEIGHTS = {"likes_count": 3.0, "comments_count": 5.0, "bookmarks_count": 4.0, "views_count": 0.1}
+
+# 影响热度的文章字段
+SCORE_FIELDS = frozenset(HOT_WEIGHTS) | {"created_at"}
+
+
+def post_timestamp(post):
+    """文章发布时间（Unix 秒），缺失或无法解析时返回 None"""
+    value = post.get("created_at")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def hot_score(post, now, gravity=1.5):
+    """文章在 now 时刻的热度；发布时间未知时按刚发布计算"""
+    created = post_timestamp(post)
+    age_hours = 0.0 if created is None else max(0.0, (now - created) / 3600)
+    interactions = sum(weight * (post.get(field) or 0) for field, weight in HOT_WEIGHTS.items())
+    return (interactions + 1) / (age_hours + 2) ** gravity
+
+
+class HotRanking:
+    """
+    常驻内存的热度排名
+
+    排名保存在按 (热度, id) 升序的数组里，计数变化时二分查找原地调整，
+    取前 N 条为 O(log n + N)。on_change 注册为存储的变更监听，rebuild
+    由后台任务定期调用以应用时间衰减。
+    """
+
+    chunk_size = 64
+
+    def __init__(self, storage, gravity=1.5, clock=time.time):
+        self.storage = storage
+        self.gravity = gravity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._scores = {}
+        self._entries = []
+        # 最近一次整体重算的时间（时间衰减改变了排名，可用于构造 ETag）
+        self.built_at = None
+        # 重建期间收到的变更（id -> 最新记录），重建完成后补上
+        self._rebuilding = None
+        self.rebuild()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def rebuild(self):
+        """按当前时间重算全部文章的热度（应用时间衰减）"""
+        with self._rebuild_lock:
+            with self._lock:
+                self._rebuilding = {}
+            now = self._clock()
+            scores = {post["id"]: hot_score(post, now, self.gravity) for post in self.storage.all("posts")}
+            entries = sorted((score, post_id) for post_id, score in scores.items())
+            with self._lock:
+                changed, self._rebuilding = self._rebuilding, None
+                self._scores, self._entries = scores, entries
+                self.built_at = now
+                for post_id, post in changed.items():
+                    self._set(post_id, post, now)
+
+    def on_change(self, changes):
+        """存储的变更监听：只重算计数或发布时间变化了的文章"""
+        if changes is None:
+            self.rebuild()
+            return
+        now = self._clock()
+        with self._lock:
+            for change in changes:
+                if change.collection != "posts":
+                    continue
+                if change.before is not None and change.after is not None and not any(
+                    change.before.get(field) != change.after.get(field) for field in SCORE_FIELDS
+                ):
+                    continue
+                self._set(change.id, change.after, now)
+                if self._rebuilding is not None:
+                    self._rebuilding[change.id] = change.after
+
+    def _set(self, post_id, post, now):
+        """更新一篇文章的热度，post 为 None 时移除（需持有锁）"""
+        old = self._scores.pop(post_id, None)
+        if old is not None:
+            i = bisect_left(self._entries, (old, post_id))
+            if i < len(self._entries) and self._entries[i] == (old, post_id):
+                del self._entries[i]
+        if post is not None:
+            score = hot_score(post, now, self.gravity)
+            self._scores[post_id] = score
+            insort(self._entries, (score, post_id))
+
+    def score(self, post_id):
+        return self._scores.get(post_id)
+
+    def ranked(self, after=None):
+        """
+        按热度从高到低遍历 (文章 id, 热度)
+
+        after 为上一页最后一篇的 (热度, id) 时从它之后开始。每次在锁内取一小批，
+        下一批按上一批最后的位置重新定位，遍历期间的修改不会导致出错。
+        """
+        position = after
+        while True:
+            with self._lock:
+                end = len(self._entries) if position is None else bisect_left(self._entries, tuple(position))
+                chunk = self._entries[max(0, end - self.chunk_size):end]
+            if not chunk:
+                return
+            for score, post_id in reversed(chunk):
+                yield post_id, score
+            position = chunk[0]
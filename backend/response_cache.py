@@ -0,0 +1,190 @@
+"""
+匿名请求的响应缓存
+
+缓存渲染好的响应体，按 LRU 淘汰，同时限制条目数与总字节数。每个条目登记它
+依赖的数据（依赖键），存储提交变更后由 invalidated_dependencies() 算出受影响的
+依赖键，只淘汰依赖它们的条目。同一个键并发未命中时只计算一次，其余请求等待结果。
+
+依赖键：
+    ("posts", id)              某篇文章的内容或计数
+    ("users", id)              某个用户（作者信息、个人资料）
+    ("posts-order", 字段)      按该字段（或 "hot"）排序的文章列表的成员与顺序
+    ("posts-tag", 标签名)      带该标签的文章集合
+    ("posts-author", 用户 id)  该用户的文章集合
+    ("tags",)                  标签列表
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from ranking import SCORE_FIELDS
+
+# 列表可以使用的排序方式（"hot" 为热度排名）
+POST_ORDERS = ("created_at", "likes_count", "comments_count", "views_count", "hot")
+
+CacheEntry = namedtuple("CacheEntry", "value dependencies size")
+
+
+def invalidated_dependencies(changes):
+    """存储的一批变更使哪些依赖键失效"""
+    keys = set()
+    for change in changes:
+        if change.collection == "users":
+            keys.add(("users", change.id))
+        elif change.collection == "tags":
+            keys.add(("tags",))
+        elif change.collection == "posts":
+            keys.add(("posts", change.id))
+            before, after = change.before or {}, change.after or {}
+            if change.before is None or change.after is None:
+                # 新增或删除：所有排序的成员都变了
+                keys.update(("posts-order", order) for order in POST_ORDERS)
+                changed = set(before) | set(after)
+            else:
+                changed = {field for field in set(before) | set(after) if before.get(field) != after.get(field)}
+                keys.update(("posts-order", field) for field in changed if field in POST_ORDERS)
+                if changed & SCORE_FIELDS:
+                    keys.add(("posts-order", "hot"))
+            if "tags" in changed:
+                keys.update(("posts-tag", tag) for tag in set(before.get("tags") or []) ^ set(after.get("tags") or []))
+            if "authorId" in changed:
+                keys.update(("posts-author", post["authorId"]) for post in (before, after) if "authorId" in post)
+    return keys
+
+
+class _Flight:
+    """正在计算中的一个键，其余请求等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    LRU 响应缓存
+
+    compute() 返回 (值, 依赖键集合, 字节数)。version 是失效计数：调用方在读取
+    数据之前记下它并传给 get()，计算期间发生过失效时结果照常返回但不缓存，
+    避免把基于旧数据算出的结果存进去。
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._dependents = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.size = 0
+        self.hits = self.misses = self.collapsed = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute, since=None):
+        """取缓存的值，未命中时调用 compute() 计算（同一个键同时只计算一次）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+                if since is None:
+                    since = self.version
+            else:
+                self.collapsed += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            value, dependencies, size = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            with self._lock:
+                if self.version == since:
+                    self._store(key, CacheEntry(value, frozenset(dependencies), size))
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _store(self, key, entry):
+        """存入条目并按条目数、字节数淘汰最久未使用的（需持有锁）"""
+        if entry.size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self.size += entry.size
+        for dependency in entry.dependencies:
+            self._dependents.setdefault(dependency, set()).add(key)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        for dependency in entry.dependencies:
+            keys = self._dependents.get(dependency)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[dependency]
+
+    def invalidate(self, dependencies):
+        """淘汰依赖任一给定依赖键的条目"""
+        if not dependencies:
+            return
+        with self._lock:
+            self.version += 1
+            for dependency in dependencies:
+                for key in list(self._dependents.get(dependency, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._dependents.clear()
+            self.size = 0
+
+    def on_change(self, changes):
+        """存储的变更监听：按变更淘汰相关条目，无法得知具体改动时清空"""
+        if changes is None:
+            self.clear()
+        else:
+            self.invalidate(invalidated_dependencies(changes))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.collapsed
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "collapsed": self.collapsed,
+                "hit_rate": (self.hits + self.collapsed) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
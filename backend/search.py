@@ -0,0 +1,558 @@
+"""
+全文搜索（/search、/search/posts、/posts/search）
+
+倒排索引覆盖文章的标题、摘要、正文和标签。每个词的倒排表是 (文章 id 数组, 权重数组)：
+权重是该词在各字段的词频按字段权重加权、按字段长度归一化后的和（BM25F），查询时做
+BM25 饱和、乘以词的 idf 再相加。多个词的查询要求文章包含全部词：从最短的倒排表出发
+求交集，再用堆取出前 offset + limit 名。
+
+索引分两层：建好后不再修改的段文件（search_segments.py），和其上常驻内存的增量层。
+文章的增删改在提交后的变更通知里立即写进增量层：新文章直接加入；修改只对变化了的
+字段重新切词，按差值调整这些词的权重；删除只记一个墓碑。后台任务定期把增量层和墓碑
+合并成新的段文件。一次写入的开销只与这篇文章的长度有关，与文章总数无关。
+
+段文件保存在 directory 中，CURRENT 记录当前的段及其对应的存储版本。启动时直接映射
+这个文件，不需要读入文章重新切词；所有 worker 映射同一个文件，共用操作系统的页缓存，
+各自的内存里只有增量层。一个 worker 写出新的段后，其他 worker 在下次 refresh 时换用它。
+"""
+
+import heapq
+import math
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+import jsoncodec
+from process_lock import ProcessLock
+from search_segments import create_segment, open_segment, splice
+from segments import write_file
+from tokenizer import is_single_cjk, tokenize
+
+# 字段权重：标题命中比正文命中重要得多
+FIELD_BOOSTS = {"title": 3.0, "tags": 2.0, "summary": 1.5, "content": 1.0}
+FIELDS = tuple(FIELD_BOOSTS)
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+# 按 Markdown 处理的字段
+MARKDOWN_FIELDS = {"content"}
+
+# 权重不超过它视为不含该词（按差值调整权重时的浮点误差）
+EPSILON = 1e-4
+
+# 索引目录中记录当前段的文件，以及写出段文件时的跨进程锁
+CURRENT = "CURRENT"
+LOCK = "search.lock"
+
+
+def document_fields(post):
+    """文章参与索引的各字段文本"""
+    return {
+        "title": post.get("title") or "",
+        "tags": " ".join(tag for tag in post.get("tags") or [] if isinstance(tag, str)),
+        "summary": post.get("summary") or "",
+        "content": post.get("content") or "",
+    }
+
+
+def field_terms(field, text):
+    """字段中各词的词频"""
+    return Counter(tokenize(text, markdown=field in MARKDOWN_FIELDS))
+
+
+def field_norm(averages, field, length):
+    """字段的归一化系数：字段越长，单次命中越不说明问题"""
+    if not length:
+        return 0.0
+    return FIELD_BOOSTS[field] / (1 - B + B * length / averages[field])
+
+
+def saturate(weight):
+    """BM25 词频饱和"""
+    return weight * (K1 + 1) / (K1 + weight)
+
+
+def idf(doc_count, doc_freq):
+    return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def build_segment(directory, posts, version):
+    """从全部文章（按 id 升序）建立段文件"""
+    analyzed = []
+    totals = dict.fromkeys(FIELDS, 0)
+    for post in posts:
+        texts = document_fields(post)
+        terms = {field: field_terms(field, texts[field]) for field in FIELDS}
+        analyzed.append((post["id"], terms))
+        for field, counts in terms.items():
+            totals[field] += sum(counts.values())
+    count = len(analyzed)
+    averages = {field: (total / count if count else 0) or 1 for field, total in totals.items()}
+
+    doc_ids, norm_rows, postings = array("i"), array("f"), {}
+    for post_id, terms in analyzed:
+        weights = {}
+        norms = [field_norm(averages, field, sum(terms[field].values())) for field in FIELDS]
+        for norm, field in zip(norms, FIELDS):
+            for term, frequency in terms[field].items():
+                weights[term] = weights.get(term, 0.0) + norm * frequency
+        for term, weight in weights.items():
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = (array("i"), array("f"))
+            entry[0].append(post_id)
+            entry[1].append(weight)
+        doc_ids.append(post_id)
+        norm_rows.extend(norms)
+    header = {"version": version, "averages": averages, "fields": list(FIELDS)}
+    # str 按码位排序，与 UTF-8 字节序一致
+    ordered = ((term, *postings[term]) for term in sorted(postings))
+    return create_segment(directory, header, doc_ids, norm_rows, ordered)
+
+
+def merge_segment(directory, segment, overlay, tombstones, norms, version):
+    """
+    把增量合并进段，写出新的段文件
+
+    overlay[词] = {文章 id: 新权重}，tombstones = {文章 id: 删除前的记录}，
+    norms = {文章 id: 各字段的归一化系数}。只有涉及到的词的倒排表需要拼接，其余整段复制。
+    """
+    edits = defaultdict(dict)
+    for term, changes in overlay.items():
+        for doc, weight in changes.items():
+            edits[term][doc] = weight if weight > EPSILON else None
+    # 删除的文章按删除前的记录重新切词，得到要从哪些倒排表中去掉
+    for doc, post in tombstones.items():
+        texts = document_fields(post)
+        for field in FIELDS:
+            for term in field_terms(field, texts[field]):
+                edits[term][doc] = None
+    doc_ids, norm_rows = splice(
+        segment.doc_ids, segment.norm_rows(), {**norms, **dict.fromkeys(tombstones)}, width=len(FIELDS)
+    )
+
+    def postings():
+        # 段中的词与改动的词都按字节序排列，依次归并
+        edited = sorted(edits)
+        empty = array("i"), array("f")
+        i = 0
+        for term, ids, weights in segment.terms():
+            while i < len(edited) and edited[i] < term:
+                yield (edited[i], *splice(*empty, edits[edited[i]]))
+                i += 1
+            if i < len(edited) and edited[i] == term:
+                ids, weights = splice(ids, weights, edits[term])
+                i += 1
+            yield term, ids, weights
+        for term in edited[i:]:
+            yield (term, *splice(*empty, edits[term]))
+
+    header = {"version": version, "averages": segment.averages, "fields": list(FIELDS)}
+    merged = (entry for entry in postings() if len(entry[1]))
+    return create_segment(directory, header, doc_ids, norm_rows, merged)
+
+
+class _Index:
+    """
+    一个段及其后的增量
+
+    layers = (段, 增量层) 总是整体替换，查询开始时取一次；增量层 overlay[词] = {文章 id: (新权重, 版本)}，
+    内层字典写时复制，外层字典只增加键。其余字段只由持有写锁的一方修改。
+    版本是写入时存储中文章集合的版本：换用更新的段时，不比段新的增量已经包含在段里，可以丢掉。
+    """
+
+    def __init__(self, segment, version):
+        self.layers = (segment, {})
+        self.averages = segment.averages
+        # 已经反映到索引里的存储版本
+        self.version = version
+        # 段之后新增或修改过的文章：id -> (各字段的归一化系数, 版本)，修改时用来扣除旧字段的贡献
+        self.norms = {}
+        # 段之后新增的文章：id -> 版本
+        self.created = {}
+        # 已删除、尚未合并的文章：id -> (删除前的记录, 版本)
+        self.tombstones = {}
+        # 各词的文档频率相对段的增减
+        self.doc_freq = Counter()
+        # 增量层的条目数，及其中最早一条写入的时间
+        self.pending = 0
+        self.pending_since = None
+
+    @property
+    def segment(self):
+        return self.layers[0]
+
+    @property
+    def live(self):
+        return len(self.segment) + len(self.created) - len(self.tombstones)
+
+    def frequency(self, term):
+        return self.segment.doc_freq(term) + self.doc_freq[term]
+
+    def doc_norms(self, post_id):
+        """文章各字段的归一化系数，不在索引中时为 None"""
+        if post_id in self.tombstones:
+            return None
+        entry = self.norms.get(post_id)
+        return entry[0] if entry else self.segment.norms(post_id)
+
+
+class SearchIndex:
+    """
+    文章全文索引
+
+    on_change 注册为存储的变更监听，文章的增删改在提交后立即反映到索引里；
+    refresh() 由后台任务定期调用：换用其他 worker 写出的更新的段，增量层积累到
+    merge_threshold 条或存在超过 merge_interval 秒时合并成新的段。无法得知具体改动时
+    （changes 为 None）整体重建，重建期间查询继续使用旧的索引。
+    directory 为 None 时段写在匿名临时文件里，只在本进程内使用。
+    """
+
+    def __init__(self, storage, directory=None, merge_threshold=20_000, merge_interval=300):
+        self.storage = storage
+        self.directory = directory
+        self.merge_threshold = merge_threshold
+        self.merge_interval = merge_interval
+        # _lock 保护写入与索引的切换；_rebuild_lock 使重建与合并不会同时进行；
+        # _file_lock 在 worker 之间串行化段文件的写出
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._file_lock = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._file_lock = ProcessLock(os.path.join(directory, LOCK))
+        self._stale = False
+        # 每次写入加一：重建期间有写入时，建好的索引缺少这些写入，需要重来
+        self._generation = 0
+        current = self._current()
+        if current is None:
+            self._index = _Index(build_segment(None, (), 0), 0)
+            self.rebuild()
+        else:
+            # 段落后于存储（上次没有正常退出）时先用着，由后台任务重建
+            self._index = _Index(*current)
+            self._stale = current[1] != storage.version("posts")
+
+    def __len__(self):
+        return self._index.live
+
+    # —— 段文件 ——
+    def _read_current(self):
+        """CURRENT 的内容 {"segment": 文件名, "version": 版本}，没有时为 None"""
+        if self.directory is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, CURRENT), "rb") as f:
+                return jsoncodec.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _current(self):
+        """映射当前的段，返回 (段, 版本)；没有或已被替换时为 None"""
+        current = self._read_current()
+        if current is None:
+            return None
+        try:
+            segment = open_segment(os.path.join(self.directory, current["segment"]))
+        except ValueError:
+            return None
+        return None if segment is None else (segment, current["version"])
+
+    def _persisting(self):
+        """写出段文件期间持有的跨进程锁"""
+        return self._file_lock if self._file_lock is not None else nullcontext()
+
+    def _publish(self, segment, version):
+        """把段记为当前的段并删除其余段文件（需持有 _persisting）"""
+        if self.directory is None:
+            return
+        write_file(
+            os.path.join(self.directory, CURRENT),
+            jsoncodec.dumps({"segment": segment.name, "version": version}),
+        )
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name != segment.name:
+                # 其他 worker 已经映射的文件删除后仍然可以读取，直到它们换用新的段
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    # —— 重建与合并 ——
+    def rebuild(self):
+        """从存储重新建立整个索引"""
+        with self._rebuild_lock:
+            for _ in range(3):
+                # 先清除标记：重建期间再有整体变化会重新标记，下次再重建
+                self._stale = False
+                generation = self._generation
+                with self.storage.pinned():
+                    version = self.storage.version("posts")
+                    posts = self.storage.all("posts")
+                    if self.storage.version("posts") != version:
+                        continue
+                with self._persisting():
+                    current = self._current()
+                    if current is not None and current[1] == version:
+                        # 其他 worker 刚建好了同一版本的段
+                        segment = current[0]
+                    else:
+                        segment = build_segment(self.directory, posts, version)
+                        self._publish(segment, version)
+                with self._lock:
+                    if self._generation == generation:
+                        self._index = _Index(segment, version)
+                        return
+            # 写入过于频繁，交给下一次 refresh 再试
+            self._stale = True
+
+    def refresh(self):
+        """后台任务：需要时整体重建，换用其他 worker 写出的段，或把增量层合并成新的段"""
+        if self._stale:
+            current = self._current()
+            with self._lock:
+                if current is not None and current[1] == self.storage.version("posts"):
+                    # 其他 worker 已经写出了与存储一致的段
+                    self._stale = False
+                    self._index = _Index(*current)
+                    return
+            self.rebuild()
+            return
+        current = self._read_current()
+        if current is not None and current["segment"] != self._index.segment.name:
+            current = self._current()
+            if current is not None:
+                self._adopt(*current)
+        index = self._index
+        if index.pending >= self.merge_threshold or len(index.tombstones) >= self.merge_threshold // 100 or (
+            index.pending_since is not None and time.monotonic() - index.pending_since >= self.merge_interval
+        ):
+            self.merge()
+
+    def merge(self):
+        """把增量层和墓碑合并成新的段；没有增量时只把 CURRENT 中的版本更新到最新"""
+        with self._rebuild_lock:
+            if self._stale:
+                return
+            with self._lock:
+                index = self._index
+                segment, overlay = index.layers
+                overlay = {term: {doc: entry[0] for doc, entry in changes.items()} for term, changes in overlay.items()}
+                tombstones = {doc: entry[0] for doc, entry in index.tombstones.items()}
+                norms = {doc: entry[0] for doc, entry in index.norms.items()}
+                version = index.version
+            with self._persisting():
+                current = self._read_current()
+                if current is not None and current["version"] >= version and current["segment"] != segment.name:
+                    # 其他 worker 已经写出了不比这更旧的段，换用它即可
+                    merged = None
+                elif not (overlay or tombstones or norms) and (
+                    self.directory is None or current is not None and current["segment"] == segment.name
+                ):
+                    if current is not None and current["version"] < version:
+                        self._publish(segment, version)
+                    with self._lock:
+                        if self._index is index and not index.pending and not index.tombstones:
+                            index.pending_since = None
+                    return
+                else:
+                    merged = merge_segment(self.directory, segment, overlay, tombstones, norms, version)
+                    self._publish(merged, version)
+            if merged is None:
+                current = self._current()
+                if current is not None:
+                    self._adopt(*current)
+            else:
+                self._adopt(merged, version)
+
+    def _adopt(self, segment, version):
+        """换用包含了存储版本 version 及之前全部修改的段，只保留其后的增量"""
+        with self._lock:
+            index = self._index
+            if segment is index.segment or version > index.version:
+                # 本进程还没有读到段里的全部修改，追上之后再换
+                return
+            adopted = _Index(segment, index.version)
+            adopted.norms = {doc: entry for doc, entry in index.norms.items() if entry[1] > version}
+            adopted.created = {doc: v for doc, v in index.created.items() if v > version}
+            adopted.tombstones = {doc: entry for doc, entry in index.tombstones.items() if entry[1] > version}
+            if adopted.norms and segment.averages != index.averages:
+                # 其他 worker 重建过：保留下来的增量按旧的平均长度计算，与新的段对不上
+                self._stale = True
+                return
+            overlay = adopted.layers[1]
+            for term, changes in index.layers[1].items():
+                kept = {doc: entry for doc, entry in changes.items() if entry[1] > version}
+                if kept:
+                    overlay[term] = kept
+                    for doc, (weight, _) in kept.items():
+                        adopted.doc_freq[term] += (weight > 0) - (segment.weight(term, doc) > 0)
+            adopted.pending = sum(len(changes) for changes in overlay.values())
+            if adopted.pending or adopted.tombstones:
+                adopted.pending_since = time.monotonic()
+            self._index = adopted
+
+    # —— 写入 ——
+    def on_change(self, changes):
+        """存储的变更监听：把文章的增删改写进增量层"""
+        if changes is None:
+            self._stale = True
+            return
+        changes = [change for change in changes if change.collection == "posts"]
+        if not changes:
+            return
+        version = self.storage.version("posts")
+        with self._lock:
+            self._generation += 1
+            index = self._index
+            index.version = version
+            for change in changes:
+                self._apply(index, change.before, change.after, version)
+
+    def _apply(self, index, before, after, version):
+        """把一篇文章的变化写进增量层（需持有写锁）"""
+        if after is None:
+            if index.doc_norms(before["id"]) is not None:
+                index.tombstones[before["id"]] = (before, version)
+                if index.pending_since is None:
+                    index.pending_since = time.monotonic()
+            return
+        post_id = after["id"]
+        norms = index.doc_norms(post_id)
+        if norms is None:
+            index.created[post_id] = version
+            norms = (0.0,) * len(FIELDS)
+            old_texts = dict.fromkeys(FIELDS, "")
+        elif before is None:
+            # 重建时已经读到了这篇文章
+            return
+        else:
+            old_texts = document_fields(before)
+        texts = document_fields(after)
+        # 只对变化了的字段重新切词：扣除旧内容的贡献，加上新内容的
+        deltas = Counter()
+        norms = list(norms)
+        for i, field in enumerate(FIELDS):
+            if texts[field] == old_texts[field]:
+                continue
+            for term, frequency in field_terms(field, old_texts[field]).items():
+                deltas[term] -= norms[i] * frequency
+            counts = field_terms(field, texts[field])
+            norms[i] = field_norm(index.averages, field, sum(counts.values()))
+            for term, frequency in counts.items():
+                deltas[term] += norms[i] * frequency
+        if post_id not in index.created and not deltas:
+            return
+        index.norms[post_id] = (tuple(norms), version)
+        if index.pending_since is None:
+            index.pending_since = time.monotonic()
+
+        segment, overlay = index.layers
+        for term, delta in deltas.items():
+            changes = overlay.get(term)
+            current = changes[post_id][0] if changes and post_id in changes else segment.weight(term, post_id)
+            weight = current + delta
+            if weight <= EPSILON:
+                weight = 0.0
+            if weight == current:
+                continue
+            if (current > 0) != (weight > 0):
+                index.doc_freq[term] += 1 if weight > 0 else -1
+            entry = (weight, version)
+            overlay[term] = {**changes, post_id: entry} if changes else {post_id: entry}
+            index.pending += 1
+
+    # —— 查询 ——
+    def search(self, query, offset=0, limit=None):
+        """
+        按相关度搜索文章，返回 ([(文章 id, 得分)], 命中总数)
+
+        文章需包含查询中的全部词；查询切不出词时返回空结果。文章里连续的汉字只按二元词
+        索引，查询中单独的一个汉字匹配它本身以及以它开头的二元词（“前”匹配前端、前面……）。
+        """
+        index = self._index
+        segment, overlay = index.layers
+        terms = list(dict.fromkeys(tokenize(query)))
+        # 单个汉字展开后的倒排表 {文章 id: 权重}，当作一个词参与查询
+        expanded = {term: self._expand(index, term) for term in terms if is_single_cjk(term)}
+        frequencies = {
+            term: len(expanded[term]) if term in expanded else index.frequency(term)
+            for term in terms
+        }
+        if not terms or not all(frequencies.values()):
+            return [], 0
+        # 从最少见的词出发，在其余词的倒排表中查找
+        terms.sort(key=frequencies.get)
+        # 已删除的文章在合并前仍计入文档频率，文章总数也把它们算上
+        count = index.live + len(index.tombstones)
+        weights = [idf(count, frequencies[term]) for term in terms]
+        tombstones = index.tombstones
+        if terms[0] in expanded:
+            postings = expanded[terms[0]].items()
+        else:
+            entry = segment.get(terms[0]) or ((), ())
+            changes = overlay.get(terms[0])
+            if len(terms) == 1 and not changes and not tombstones:
+                # 单个词且没有增量：得分随权重单调，直接按权重取前几名
+                docs, impacts = entry
+                total = len(docs)
+                end = total if limit is None else min(total, offset + limit)
+                top = heapq.nlargest(end, range(total), key=impacts.__getitem__)
+                return [(docs[i], weights[0] * saturate(impacts[i])) for i in top[offset:]], total
+            postings = self._postings(entry, changes)
+
+        others = [
+            (weight, expanded.get(term), overlay.get(term), segment.get(term) or ((), ()))
+            for weight, term in zip(weights[1:], terms[1:])
+        ]
+        scored = []
+        for doc, weight in postings:
+            if doc in tombstones:
+                continue
+            score = weights[0] * saturate(weight)
+            for term_weight, merged, term_changes, (docs, impacts) in others:
+                if merged is not None:
+                    weight = merged.get(doc, 0.0)
+                elif term_changes and doc in term_changes:
+                    weight = term_changes[doc][0]
+                else:
+                    i = bisect_left(docs, doc)
+                    weight = impacts[i] if i < len(docs) and docs[i] == doc else 0.0
+                if weight <= 0:
+                    break
+                score += term_weight * saturate(weight)
+            else:
+                scored.append((score, doc))
+        total = len(scored)
+        if limit is None:
+            top = sorted(scored, reverse=True)
+        else:
+            # 只需要前 offset + limit 名，用堆而不是整体排序
+            top = heapq.nlargest(offset + limit, scored)
+        return [(doc, score) for score, doc in top[offset:]], total
+
+    def _expand(self, index, char):
+        """单个汉字：它本身及以它开头的二元词的倒排表合在一起，同一篇文章的权重相加"""
+        segment, overlay = index.layers
+        terms = {char, *segment.prefix_terms(char), *(term for term in list(overlay) if term.startswith(char))}
+        merged = defaultdict(float)
+        for term in terms:
+            for doc, weight in self._postings(segment.get(term) or ((), ()), overlay.get(term)):
+                merged[doc] += weight
+        return merged
+
+    @staticmethod
+    def _postings(entry, changes):
+        """段中的倒排表叠加增量层后的 (文章 id, 权重)"""
+        if not changes:
+            return zip(*entry)
+        return [
+            *((doc, weight) for doc, weight in zip(*entry) if doc not in changes),
+            *((doc, weight) for doc, (weight, _) in changes.items() if weight > 0),
+        ]
@@ -0,0 +1,248 @@
+"""
+全文搜索索引的段文件
+
+段文件建好后不再修改，读取时整个文件 mmap 只读映射，多个 worker 打开同一个文件时
+共用操作系统的页缓存，启动时也不需要读入或解析任何内容。文件结构：
+
+    BLOGIDX1 | 头部长度 (uint32) | 头部 JSON | 各区（按 8 字节对齐）
+
+头部记录索引对应的存储版本、各字段平均长度，以及各区的位置。各区都是定长数组：
+
+    doc_ids          文章 id（int32，升序）
+    norms            各文章每个字段的归一化系数（float32，按文章、字段排列）
+    term_offsets     词在 term_bytes 中的起止位置（uint64）
+    term_bytes       按 UTF-8 字节序排列的全部词
+    posting_offsets  词的倒排表在 ids / weights 中的起止位置（uint64）
+    ids, weights     所有倒排表首尾相接：文章 id（int32，每个词内升序）与权重（float32）
+    table            词的哈希表（crc32 开放寻址，存词的序号 + 1，0 为空位）
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+
+MAGIC = b"BLOGIDX1"
+_LENGTH = struct.Struct("<I")
+
+SECTIONS = ("doc_ids", "norms", "term_offsets", "term_bytes", "posting_offsets", "ids", "weights", "table")
+_TYPECODES = {
+    "doc_ids": "i", "norms": "f", "term_offsets": "Q", "posting_offsets": "Q",
+    "ids": "i", "weights": "f", "table": "i",
+}
+
+
+def splice(ids, values, edits, width=1):
+    """
+    按 edits = {id: 新值（width 个数的元组，width 为 1 时是单个数）或 None} 修改按 id 升序的数组
+
+    返回新的 (ids, values)。未改动的连续部分整段复制，只对改动的 id 做二分查找。
+    """
+    new_ids, new_values = array("i"), array("f")
+    start = 0
+    for doc in sorted(edits):
+        i = bisect_left(ids, doc, start)
+        _extend(new_ids, ids[start:i])
+        _extend(new_values, values[start * width:i * width])
+        start = i + 1 if i < len(ids) and ids[i] == doc else i
+        value = edits[doc]
+        if value is not None:
+            new_ids.append(doc)
+            if width == 1:
+                new_values.append(value)
+            else:
+                new_values.extend(value)
+    _extend(new_ids, ids[start:])
+    _extend(new_values, values[start * width:])
+    return new_ids, new_values
+
+
+def write_segment(f, header, doc_ids, norms, postings):
+    """
+    把段写入打开的二进制文件 f
+
+    doc_ids、norms 为数组；postings 按词的 UTF-8 字节序给出 (词, id 数组, 权重数组)。
+    """
+    term_offsets, term_bytes = array("Q", [0]), bytearray()
+    posting_offsets, ids, weights = array("Q", [0]), array("i"), array("f")
+    for term, term_ids, term_weights in postings:
+        term_bytes += term.encode("utf-8")
+        term_offsets.append(len(term_bytes))
+        _extend(ids, term_ids)
+        _extend(weights, term_weights)
+        posting_offsets.append(len(ids))
+    count = len(term_offsets) - 1
+
+    # 词的哈希表：槽位数为词数两倍以上的 2 的幂
+    size = 8
+    while size < count * 2:
+        size *= 2
+    table = array("i", bytes(4 * size))
+    for i in range(count):
+        slot = zlib.crc32(term_bytes[term_offsets[i]:term_offsets[i + 1]]) & (size - 1)
+        while table[slot]:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = i + 1
+
+    sections = {
+        "doc_ids": doc_ids, "norms": norms, "term_offsets": term_offsets, "term_bytes": term_bytes,
+        "posting_offsets": posting_offsets, "ids": ids, "weights": weights, "table": table,
+    }
+    layout, offset = {}, 0
+    for name in SECTIONS:
+        nbytes = len(memoryview(sections[name]).cast("B"))
+        layout[name] = [offset, nbytes]
+        offset += _aligned(nbytes)
+    meta = json.dumps({**header, "sections": layout}, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + _LENGTH.pack(len(meta)) + meta
+    f.write(prefix)
+    f.write(bytes(_aligned(len(prefix)) - len(prefix)))
+    for name in SECTIONS:
+        data = memoryview(sections[name]).cast("B")
+        f.write(data)
+        f.write(bytes(_aligned(len(data)) - len(data)))
+
+
+def _extend(target, source):
+    """把数组（或数组的 memoryview）整段追加到 target"""
+    target.frombytes(memoryview(source).cast("B"))
+
+
+def _aligned(n):
+    return (n + 7) & ~7
+
+
+class Segment:
+    """
+    只读映射的段文件
+
+    get(词) 返回 (id 数组, 权重数组)，都是直接指向映射内存的 memoryview。
+    """
+
+    def __init__(self, f, name=None):
+        self.name = name
+        self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError("不是搜索索引段文件")
+        (length,) = _LENGTH.unpack_from(self._mmap, len(MAGIC))
+        meta_start = len(MAGIC) + _LENGTH.size
+        header = json.loads(self._mmap[meta_start:meta_start + length])
+        base = _aligned(meta_start + length)
+        view = memoryview(self._mmap)
+        for section, (offset, nbytes) in header.pop("sections").items():
+            data = view[base + offset:base + offset + nbytes]
+            setattr(self, "_" + section, data.cast(_TYPECODES[section]) if section in _TYPECODES else data)
+        self.header = header
+        self.version = header["version"]
+        self.averages = header["averages"]
+        self.fields = header["fields"]
+        self.doc_ids = self._doc_ids
+        self._mask = len(self._table) - 1
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def term_count(self):
+        return len(self._term_offsets) - 1
+
+    def _term(self, i):
+        return self._term_bytes[self._term_offsets[i]:self._term_offsets[i + 1]]
+
+    def prefix_terms(self, prefix):
+        """以 prefix 开头的全部词：词按 UTF-8 字节序排列，二分查找起点"""
+        key = prefix.encode("utf-8")
+        lo, hi = 0, self.term_count()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._term(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, self.term_count()):
+            term = bytes(self._term(i))
+            if not term.startswith(key):
+                break
+            yield term.decode("utf-8")
+
+    def _find(self, term):
+        """词的序号，不存在时为 -1"""
+        key = term.encode("utf-8")
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            entry = self._table[slot]
+            if not entry:
+                return -1
+            if self._term(entry - 1) == key:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+
+    def _postings(self, i):
+        start, end = self._posting_offsets[i], self._posting_offsets[i + 1]
+        return self._ids[start:end], self._weights[start:end]
+
+    def get(self, term):
+        i = self._find(term)
+        return None if i < 0 else self._postings(i)
+
+    def doc_freq(self, term):
+        i = self._find(term)
+        return 0 if i < 0 else self._posting_offsets[i + 1] - self._posting_offsets[i]
+
+    def weight(self, term, doc):
+        entry = self.get(term)
+        if entry is None:
+            return 0.0
+        docs, weights = entry
+        i = bisect_left(docs, doc)
+        return weights[i] if i < len(docs) and docs[i] == doc else 0.0
+
+    def norms(self, doc):
+        """文章各字段的归一化系数，不在段中时为 None"""
+        i = bisect_left(self._doc_ids, doc)
+        if i == len(self._doc_ids) or self._doc_ids[i] != doc:
+            return None
+        width = len(self.fields)
+        return tuple(self._norms[i * width:(i + 1) * width])
+
+    def norm_rows(self):
+        return self._norms
+
+    def terms(self):
+        """按 UTF-8 字节序遍历 (词, id 数组, 权重数组)"""
+        for i in range(self.term_count()):
+            yield (bytes(self._term(i)).decode("utf-8"), *self._postings(i))
+
+
+def open_segment(path):
+    """映射段文件；文件已被删除（其他 worker 刚换上了新的段）时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            return Segment(f, os.path.basename(path))
+    except FileNotFoundError:
+        return None
+
+
+def create_segment(directory, header, doc_ids, norms, postings):
+    """
+    写出新的段文件并映射
+
+    directory 为 None 时写入匿名临时文件（只在本进程内使用）。
+    """
+    if directory is None:
+        with tempfile.TemporaryFile() as f:
+            write_segment(f, header, doc_ids, norms, postings)
+            f.flush()
+            return Segment(f)
+    name = f"segment-{header['version']}-{os.getpid()}-{os.urandom(4).hex()}.bin"
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write_segment(f, header, doc_ids, norms, postings)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return open_segment(path)
@@ -0,0 +1,130 @@
+"""
+json 存储引擎的分段快照文件
+
+数据目录结构：
+    manifest.json       已合并进分段的日志序号、各集合的 id 序列
+    users.json          用户
+    posts.json          文章元数据（不含正文）
+    post_bodies.json    文章正文（id -> content）
+    comments.json       评论
+    edges.json          点赞、收藏、关注关系
+    notifications.json  通知
+    history.json        浏览历史
+    sessions.json       登录会话
+    misc.json           其余集合（标签、分类、匿名消息……）
+    journal.log         写前日志
+
+压缩时只重写自上次压缩以来被修改过的分段；计数器、通知之类的小改动
+不会再把所有文章正文重新序列化一遍。
+"""
+
+import os
+
+import jsoncodec
+
+MANIFEST = "manifest.json"
+JOURNAL = "journal.log"
+
+# 分段 -> 存放的集合
+SEGMENTS = {
+    "users": ("users",),
+    "posts": ("posts",),
+    "comments": ("comments",),
+    "edges": ("likes", "bookmarks", "follows"),
+    "notifications": ("notifications",),
+    "history": ("history",),
+    "sessions": ("sessions",),
+}
+BODY_SEGMENT = "post_bodies"
+MISC_SEGMENT = "misc"
+
+# 单独存放到 post_bodies 分段的文章字段
+BODY_FIELD = "content"
+
+_COLLECTION_SEGMENT = {c: name for name, collections in SEGMENTS.items() for c in collections}
+
+
+def segment_of(collection):
+    return _COLLECTION_SEGMENT.get(collection, MISC_SEGMENT)
+
+
+def all_segments():
+    return set(SEGMENTS) | {BODY_SEGMENT, MISC_SEGMENT}
+
+
+def touched_segments(op):
+    """一条日志操作会弄脏哪些分段"""
+    kind, collection = op[0], op[1]
+    if collection != "posts":
+        return {segment_of(collection)}
+    if kind not in ("update", "unset"):
+        return {"posts", BODY_SEGMENT}
+    fields = op[3]
+    touched = set()
+    if BODY_FIELD in fields:
+        touched.add(BODY_SEGMENT)
+    if any(field != BODY_FIELD for field in fields):
+        touched.add("posts")
+    return touched
+
+
+def serialize_segment(name, tables):
+    """把已发布的一代数据中的某个分段序列化成字节"""
+    if name == BODY_SEGMENT:
+        posts = tables.get("posts")
+        records = posts.records.values() if posts else ()
+        return jsoncodec.dumps({"bodies": [[r["id"], r.get(BODY_FIELD, "")] for r in records]})
+    if name == "posts":
+        posts = tables.get("posts")
+        records = posts.records.values() if posts else ()
+        return jsoncodec.dumps({"collections": {
+            "posts": [{k: v for k, v in r.items() if k != BODY_FIELD} for r in records]
+        }})
+    if name == MISC_SEGMENT:
+        collections = [c for c in tables if segment_of(c) == MISC_SEGMENT]
+    else:
+        collections = [c for c in SEGMENTS[name] if c in tables]
+    return jsoncodec.dumps({"collections": {c: list(tables[c].records.values()) for c in collections}})
+
+
+def write_file(path, payload):
+    """原子写入：先写临时文件并 fsync，再 rename 覆盖"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_segment(data_dir, name, payload):
+    write_file(os.path.join(data_dir, f"{name}.json"), payload)
+
+
+def write_manifest(data_dir, manifest):
+    write_file(os.path.join(data_dir, MANIFEST), jsoncodec.dumps(manifest))
+
+
+def read_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    return jsoncodec.load(path)
+
+
+def load_segments(data_dir):
+    """读取全部分段，返回 {集合: 记录列表}，文章正文已合并回文章记录"""
+    data = {}
+    bodies = {}
+    for name in sorted(all_segments()):
+        path = os.path.join(data_dir, f"{name}.json")
+        if not os.path.exists(path):
+            continue
+        segment = jsoncodec.load(path)
+        if name == BODY_SEGMENT:
+            bodies = dict((post_id, content) for post_id, content in segment["bodies"])
+        else:
+            data.update(segment["collections"])
+    for post in data.get("posts", []):
+        post[BODY_FIELD] = bodies.get(post["id"], "")
+    return data
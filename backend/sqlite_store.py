@@ -0,0 +1,424 @@
+"""
+SQLite 存储引擎
+
+每个集合一张表：id 为自增主键（AUTOINCREMENT，删除后不复用），其余字段以 JSON 保存在 doc 列。
+storage 中声明的查找/排序字段组合会建立在 json_extract 表达式上的索引，
+过滤、排序和分页都由 SQLite 按索引执行，而不是在 Python 里扫描。
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import jsoncodec
+from storage import COLLECTIONS, LOOKUP_INDEXES, SORT_INDEXES, Change, StorageEngine, contained_values
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _identifier(name):
+    # 表名、字段名会拼进 SQL，只允许普通标识符
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"非法的名称: {name}")
+    return name
+
+
+def _field(name):
+    return f"json_extract(doc, '$.{_identifier(name)}')"
+
+
+def _where(conditions, contains=None, contains_any=None):
+    clauses, params = [], []
+    for field, value in conditions.items():
+        if value is None:
+            clauses.append(f"{_field(field)} IS NULL")
+        else:
+            clauses.append(f"{_field(field)} = ?")
+            params.append(value)
+    for field, value in (contains or {}).items():
+        for item in contained_values(value):
+            clauses.append(
+                f"EXISTS (SELECT 1 FROM json_each(doc, '$.{_identifier(field)}') WHERE json_each.value = ?)"
+            )
+            params.append(item)
+    for field, value in (contains_any or {}).items():
+        values = list(contained_values(value))
+        if not values:
+            clauses.append("0")
+            continue
+        placeholders = ", ".join("?" * len(values))
+        clauses.append(
+            f"EXISTS (SELECT 1 FROM json_each(doc, '$.{_identifier(field)}') WHERE json_each.value IN ({placeholders}))"
+        )
+        params.extend(values)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _after(order_by, descending, after):
+    """
+    游标分页的条件：排在 (排序值, id) 之后的记录
+
+    NULL 排在最前（升序时），需要单独处理，不能直接用行值比较。
+    """
+    value, record_id = after
+    op = "<" if descending else ">"
+    if not order_by:
+        return f"id {op} ?", [record_id]
+    field = _field(order_by)
+    if value is None:
+        clause = f"({field} IS NULL AND id {op} ?)"
+        return (clause if descending else f"({clause} OR {field} IS NOT NULL)"), [record_id]
+    clause = f"({field} {op} ? OR ({field} = ? AND id {op} ?))"
+    return (f"({clause} OR {field} IS NULL)" if descending else clause), [value, value, record_id]
+
+
+def _index_columns(collection):
+    """需要建索引的字段组合；是其他组合前缀的可以直接复用，不再单独建"""
+    combos = list(dict.fromkeys(LOOKUP_INDEXES.get(collection, []) + SORT_INDEXES.get(collection, [])))
+    return [
+        fields for fields in combos
+        if not any(other != fields and other[:len(fields)] == fields for other in combos)
+    ]
+
+
+def _dumps(record):
+    doc = {k: v for k, v in record.items() if k != "id"}
+    # 以 TEXT 存入，json_extract 不接受 BLOB
+    return jsoncodec.dumps(doc).decode("utf-8")
+
+
+def _row_to_record(row):
+    return {"id": row[0], **jsoncodec.loads(row[1])}
+
+
+def _dumps_change(record):
+    return None if record is None else jsoncodec.dumps(record).decode("utf-8")
+
+
+def _loads_change(doc):
+    return None if doc is None else jsoncodec.loads(doc)
+
+
+class SqliteTransaction:
+    """SQLite 写事务，读写都走当前线程在事务中的连接；changes 为提交后通知监听者的记录变更"""
+
+    def __init__(self, store):
+        self._store = store
+        self.changes = []
+
+    def all(self, collection):
+        return self._store.all(collection)
+
+    def get(self, collection, record_id):
+        return self._store.get(collection, record_id)
+
+    def find_one(self, collection, **conditions):
+        return self._store.find_one(collection, **conditions)
+
+    def find(self, collection, **conditions):
+        return self._store.find(collection, **conditions)
+
+    def count(self, collection, **conditions):
+        return self._store.count(collection, **conditions)
+
+    def query(self, collection, **options):
+        return self._store.query(collection, **options)
+
+    def version(self, collection):
+        return self._store.version(collection)
+
+    def insert(self, collection, record):
+        """插入记录并分配 id，返回插入后的记录"""
+        table = self._store._table(collection)
+        cur = self._store._conn().execute(f'INSERT INTO "{table}" (doc) VALUES (?)', (_dumps(record),))
+        record = {"id": cur.lastrowid, **record}
+        self.changes.append(Change(collection, record["id"], None, record))
+        return record
+
+    def update(self, collection, record_id, changes):
+        """更新记录的部分字段，返回更新后的记录"""
+        before = self.get(collection, record_id)
+        if before is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        record = {**before, **changes}
+        table = self._store._table(collection)
+        self._store._conn().execute(f'UPDATE "{table}" SET doc = ? WHERE id = ?', (_dumps(record), record_id))
+        self.changes.append(Change(collection, record_id, before, record))
+        return record
+
+    def unset(self, collection, record_id, fields):
+        """删除记录中的若干字段，返回更新后的记录"""
+        before = self.get(collection, record_id)
+        if before is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        record = {k: v for k, v in before.items() if k not in fields}
+        table = self._store._table(collection)
+        self._store._conn().execute(f'UPDATE "{table}" SET doc = ? WHERE id = ?', (_dumps(record), record_id))
+        self.changes.append(Change(collection, record_id, before, record))
+        return record
+
+    def increment(self, collection, record_id, field, delta=1, minimum=0):
+        """计数字段加减，结果不低于 minimum，返回新值"""
+        record = self.get(collection, record_id)
+        if record is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        value = max(minimum, record.get(field, 0) + delta)
+        self.update(collection, record_id, {field: value})
+        return value
+
+    def delete(self, collection, record_id):
+        """删除一条记录，返回被删除的记录"""
+        record = self.get(collection, record_id)
+        if record is None:
+            raise KeyError(f"{collection}#{record_id} 不存在")
+        table = self._store._table(collection)
+        self._store._conn().execute(f'DELETE FROM "{table}" WHERE id = ?', (record_id,))
+        self.changes.append(Change(collection, record_id, record, None))
+        return record
+
+    def delete_where(self, collection, **conditions):
+        """删除所有满足条件的记录，返回删除数量"""
+        targets = self.find(collection, **conditions)
+        for record in targets:
+            self.delete(collection, record["id"])
+        return len(targets)
+
+
+class SqliteStore(StorageEngine):
+    """
+    内嵌 SQLite 存储，每个线程使用独立连接（WAL 模式下读写互不阻塞）
+
+    每次有修改的提交都会递增 _commits 表中的提交序号，把它记为被修改集合的
+    版本（_versions 表），并把各条记录的变更按序号写进 _changes 表。refresh()
+    据此读入其他进程的提交，逐条通知监听者；需要的日志已被清理时才通知整体重建。
+    """
+
+    # 变更日志保留的秒数，周期维护时清理更早的；更久没有读入的 worker 只能整体重建
+    change_log_retention = 600
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._tables = set()
+        for collection in COLLECTIONS:
+            self._table(collection)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS "_commits" (id INTEGER PRIMARY KEY CHECK (id = 1), seq INTEGER NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO "_commits" (id, seq) VALUES (1, 0)')
+        conn.execute('CREATE TABLE IF NOT EXISTS "_versions" (collection TEXT PRIMARY KEY, seq INTEGER NOT NULL)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS "_changes" (id INTEGER PRIMARY KEY, seq INTEGER NOT NULL, at REAL NOT NULL, '
+            'collection TEXT NOT NULL, record_id INTEGER NOT NULL, before TEXT, after TEXT)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS "idx__changes_seq" ON "_changes" (seq)')
+        # 提交与通知在同一把锁内完成，监听者按提交顺序收到变更；
+        # _seen_seq 为已通知过的最大提交序号，只在这把锁内修改
+        self._notify_lock = threading.Lock()
+        self._seen_seq = self._commit_seq()
+
+    # —— 连接与表结构 ——
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _table(self, collection):
+        """返回表名，首次使用时建表并建立表达式索引"""
+        if collection in self._tables:
+            return collection
+        table = _identifier(collection)
+        conn = self._conn()
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)')
+        for fields in _index_columns(collection):
+            name = f"idx_{table}_{'_'.join(fields)}"
+            columns = ", ".join(_field(f) for f in fields)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})')
+        self._tables.add(collection)
+        return table
+
+    @contextmanager
+    def _read_snapshot(self):
+        """多条查询放在同一个读事务里，保证总数与分页结果一致"""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    # —— 读取 ——
+    def all(self, collection):
+        table = self._table(collection)
+        rows = self._conn().execute(f'SELECT id, doc FROM "{table}" ORDER BY id')
+        return [_row_to_record(row) for row in rows]
+
+    def get(self, collection, record_id) -> Optional[dict]:
+        table = self._table(collection)
+        row = self._conn().execute(f'SELECT id, doc FROM "{table}" WHERE id = ?', (record_id,)).fetchone()
+        return _row_to_record(row) if row else None
+
+    def find_one(self, collection, **conditions) -> Optional[dict]:
+        table = self._table(collection)
+        where, params = _where(conditions)
+        row = self._conn().execute(f'SELECT id, doc FROM "{table}"{where} ORDER BY id LIMIT 1', params).fetchone()
+        return _row_to_record(row) if row else None
+
+    def find(self, collection, **conditions):
+        table = self._table(collection)
+        where, params = _where(conditions)
+        rows = self._conn().execute(f'SELECT id, doc FROM "{table}"{where} ORDER BY id', params)
+        return [_row_to_record(row) for row in rows]
+
+    def count(self, collection, **conditions):
+        table = self._table(collection)
+        where, params = _where(conditions)
+        return self._conn().execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+
+    def version(self, collection):
+        row = self._conn().execute('SELECT seq FROM "_versions" WHERE collection = ?', (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def query(self, collection, order_by=None, descending=False, offset=0, limit=None,
+              contains=None, contains_any=None, after=None, **conditions):
+        table = self._table(collection)
+        where, params = _where(conditions, contains, contains_any)
+        direction = "DESC" if descending and order_by else "ASC"
+        if order_by:
+            order = f" ORDER BY {_field(order_by)} {direction}, id {direction}"
+        else:
+            order = " ORDER BY id"
+        page_where, page_params = where, list(params)
+        if after is not None:
+            clause, after_params = _after(order_by, direction == "DESC", after)
+            page_where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+            page_params += after_params
+        page_params += [-1 if limit is None else limit, offset]
+        with self._read_snapshot() as conn:
+            total = conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+            rows = conn.execute(f'SELECT id, doc FROM "{table}"{page_where}{order} LIMIT ? OFFSET ?', page_params)
+            return [_row_to_record(row) for row in rows], total
+
+    # —— 写入 ——
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE 事务：立即取得写锁，校验与修改之间不会被其他写者插入"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        tx = SqliteTransaction(self)
+        try:
+            yield tx
+            if tx.changes:
+                conn.execute('UPDATE "_commits" SET seq = seq + 1')
+                seq = self._commit_seq()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO "_versions" (collection, seq) VALUES (?, ?)',
+                    [(collection, seq) for collection in {change.collection for change in tx.changes}],
+                )
+                now = time.time()
+                conn.executemany(
+                    'INSERT INTO "_changes" (seq, at, collection, record_id, before, after) VALUES (?, ?, ?, ?, ?, ?)',
+                    [
+                        (seq, now, change.collection, change.id, _dumps_change(change.before), _dumps_change(change.after))
+                        for change in tx.changes
+                    ],
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._notify_lock:
+            if not tx.changes:
+                conn.execute("COMMIT")
+                return
+            # 仍持有写锁：先读出其他进程在这之前的提交，监听者按提交顺序收到变更
+            external = self._changes_between(self._seen_seq, seq - 1) if self._listeners else []
+            conn.execute("COMMIT")
+            self._seen_seq = seq
+            if external is None:
+                # 整体重建时已包含本次提交
+                self._notify(None)
+                return
+            if external:
+                self._notify(external)
+            self._notify(tx.changes)
+
+    # —— 多进程同步 ——
+    def _commit_seq(self):
+        return self._conn().execute('SELECT seq FROM "_commits"').fetchone()[0]
+
+    def _changes_between(self, after, upto):
+        """
+        提交序号在 (after, upto] 之间的记录变更，按提交顺序排列
+
+        其中有的提交已不在日志里（已被清理，或来自没有变更日志的旧版本）时返回 None。
+        """
+        if upto <= after:
+            return []
+        rows = self._conn().execute(
+            'SELECT seq, collection, record_id, before, after FROM "_changes" '
+            'WHERE seq > ? AND seq <= ? ORDER BY seq, id',
+            (after, upto),
+        ).fetchall()
+        if len({row[0] for row in rows}) < upto - after:
+            return None
+        return [Change(row[1], row[2], _loads_change(row[3]), _loads_change(row[4])) for row in rows]
+
+    def refresh(self):
+        """读入其他进程提交的修改并通知监听者（没有监听者时无需检查）"""
+        if not self._listeners or self._commit_seq() <= self._seen_seq:
+            return
+        with self._notify_lock:
+            # 本进程的提交在这把锁内完成并更新 _seen_seq，这里读到的新提交都来自其他进程
+            with self._read_snapshot():
+                seq = self._commit_seq()
+                changes = self._changes_between(self._seen_seq, seq)
+            if seq <= self._seen_seq:
+                return
+            self._seen_seq = seq
+            self._notify(changes)
+
+    def maintain(self):
+        """读入其他进程的提交，并清理过期的变更日志"""
+        self.refresh()
+        self._conn().execute('DELETE FROM "_changes" WHERE at < ?', (time.time() - self.change_log_retention,))
+
+    def import_dataset(self, data, sequences=None):
+        """一次性导入整个数据集（保留原有 id 与序列值），用于从 db.json 迁移"""
+        with self.transaction():
+            conn = self._conn()
+            for collection, records in data.items():
+                if not isinstance(records, list):
+                    continue
+                table = self._table(collection)
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO "{table}" (id, doc) VALUES (?, ?)',
+                    [(r["id"], _dumps(r)) for r in records],
+                )
+            for collection, sequence in (sequences or {}).items():
+                table = self._table(collection)
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+                conn.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                    (table, max(sequence, conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM "{table}"').fetchone()[0])),
+                )
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
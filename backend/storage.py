@@ -0,0 +1,198 @@
+"""
+存储引擎接口
+
+接口函数只依赖这里定义的方法，具体实现可替换：
+- json：常驻内存 + 按集合分段的快照文件 + 追加写日志（json_store.py）
+- sqlite：内嵌 SQLite 数据库，带索引（sqlite_store.py）
+
+记录统一是带整数 id 的字典；集合名沿用 db.json 的顶层键。
+"""
+
+import logging
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 所有数据集合
+COLLECTIONS = (
+    "users", "posts", "tags", "categories", "comments", "likes", "bookmarks",
+    "follows", "notifications", "history", "anonymous_messages", "sessions",
+)
+
+# 等值查找用到的字段组合（json 引擎建哈希索引，sqlite 建表达式索引）
+LOOKUP_INDEXES = {
+    "users": [("email",)],
+    "posts": [("slug",), ("authorId",)],
+    "tags": [("name",)],
+    "comments": [("postId",), ("authorId",)],
+    "likes": [("userId", "postId"), ("postId",)],
+    "bookmarks": [("userId", "postId"), ("userId",), ("postId",)],
+    "follows": [("followerId", "followingId"), ("followerId",), ("followingId",)],
+    "notifications": [("userId",), ("userId", "isRead")],
+    "history": [("userId", "postId"), ("userId",), ("postId",)],
+    "sessions": [("tokenHash",)],
+}
+
+# 排序查询用到的字段组合：前面是等值过滤字段，最后一个是排序字段
+# （json 引擎建有序索引并在写入时增量维护，sqlite 建表达式索引）
+SORT_INDEXES = {
+    "posts": [("created_at",), ("likes_count",), ("comments_count",), ("views_count",),
+              ("authorId", "created_at")],
+    "comments": [("created_at",)],
+    "notifications": [("userId", "created_at")],
+    "anonymous_messages": [("created_at",), ("is_deleted", "created_at")],
+}
+
+# 列表字段的倒排索引：值 -> 包含它的记录 id（json 引擎维护按 id 排序的倒排表，
+# contains / contains_any 查询对倒排表求交集、并集；sqlite 用 json_each 展开）
+LIST_INDEXES = {
+    "posts": ["tags"],
+}
+
+# 一条记录的变更：插入时 before 为 None，删除时 after 为 None
+Change = namedtuple("Change", "collection id before after")
+
+
+def matches(record, conditions):
+    """记录是否满足全部等值条件"""
+    return all(record.get(field) == value for field, value in conditions.items())
+
+
+def contained_values(value):
+    """contains 条件的值：单个值或值的列表"""
+    return value if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+
+
+def matches_contains(record, contains=None, contains_any=None):
+    """记录的列表字段是否包含 contains 中的全部值、contains_any 中的至少一个值"""
+    for field, value in (contains or {}).items():
+        items = record.get(field) or []
+        if not all(v in items for v in contained_values(value)):
+            return False
+    for field, value in (contains_any or {}).items():
+        items = record.get(field) or []
+        if not any(v in items for v in contained_values(value)):
+            return False
+    return True
+
+
+def sort_key(record, field):
+    """排序键：缺失的值排在最前（与 SQLite 中 NULL 的顺序一致）"""
+    value = record.get(field)
+    return (value is not None, value)
+
+
+class StorageEngine:
+    """
+    存储引擎接口
+
+    读取：all / get / find_one / find / count / query
+    写入：with engine.transaction() as tx，tx 提供同样的读取方法以及
+    insert / update / unset / increment / delete / delete_where。
+    返回的记录只读，调用方需要修改时应先复制。
+    提交后的变更通过 subscribe() 注册的监听者广播出去。
+    """
+
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        注册变更监听：每次提交后调用 listener(changes)，changes 为 Change 列表
+
+        其他 worker 提交、在 refresh() 时读入的修改同样会通知；无法得知具体改动时
+        （如整体重新加载了数据）changes 为 None，监听者应整体重建。
+        监听者在提交线程中同步执行，应尽快返回；抛出的异常只记录，不影响提交。
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, changes):
+        for listener in self._listeners:
+            try:
+                listener(changes)
+            except Exception:
+                logger.exception("变更监听 %r 执行失败", listener)
+
+    def all(self, collection):
+        """集合中的全部记录（按 id 升序）"""
+        raise NotImplementedError
+
+    def get(self, collection, record_id):
+        """按 id 获取记录，不存在时返回 None"""
+        raise NotImplementedError
+
+    def find_one(self, collection, **conditions):
+        """第一条满足等值条件的记录，不存在时返回 None"""
+        raise NotImplementedError
+
+    def find(self, collection, **conditions):
+        """所有满足等值条件的记录"""
+        raise NotImplementedError
+
+    def count(self, collection, **conditions):
+        """满足等值条件的记录数"""
+        raise NotImplementedError
+
+    def query(self, collection, order_by=None, descending=False, offset=0, limit=None,
+              contains=None, contains_any=None, after=None, **conditions):
+        """
+        过滤、排序并分页，返回 (当前页记录, 总数)
+
+        conditions 为等值条件；contains 为 {字段: 值或值列表}，要求列表字段包含全部这些值；
+        contains_any 为 {字段: 值列表}，要求列表字段至少包含其中一个。
+        排序键相同时按 id 同方向排序（与排序键一起可以直接走索引）。
+        after 为上一页最后一条记录的 (排序值, id)（游标分页，见 pagination.py），
+        只返回排在它之后的记录；总数不受 after 影响。
+        """
+        raise NotImplementedError
+
+    def version(self, collection):
+        """
+        集合的版本：最后一次修改它的提交序号
+
+        只增不减，且在共用同一份数据的所有 worker 之间一致（版本相同则数据相同），
+        可以用来构造 ETag。
+        """
+        raise NotImplementedError
+
+    def transaction(self):
+        """开启写事务（上下文管理器），异常退出时回滚"""
+        raise NotImplementedError
+
+    @contextmanager
+    def pinned(self):
+        """范围内的读取固定使用同一版本的数据（每个请求一次），默认无操作"""
+        yield
+
+    def refresh(self):
+        """读入其他进程提交的修改（每个请求开始时调用），默认无操作"""
+
+    def maintain(self):
+        """周期维护任务（如日志压缩），默认无操作"""
+
+    def close(self):
+        """关闭存储，释放文件句柄"""
+
+
+def create_storage(engine, data_dir, seed_path=None, sqlite_path=None):
+    """
+    按名称创建存储引擎
+
+    json 引擎的数据保存在 data_dir，首次启动时从 seed_path（旧版 db.json）导入；
+    sqlite 数据库文件不存在时，会先从 json 数据一次性迁移。
+    """
+    if engine == "json":
+        from json_store import JsonStore
+        return JsonStore(data_dir, seed_path)
+    if engine == "sqlite":
+        from sqlite_store import SqliteStore
+        from json_store import load_json_dataset
+        sqlite_path = sqlite_path or os.path.join(data_dir, "blog.sqlite3")
+        needs_migration = not os.path.exists(sqlite_path)
+        store = SqliteStore(sqlite_path)
+        if needs_migration:
+            store.import_dataset(*load_json_dataset(data_dir, seed_path))
+        return store
+    raise ValueError(f"未知的存储引擎: {engine}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+清理旧版本写进存储的按请求计算字段（author、is_liked、is_bookmarked、bookmarked_at、visited_at），
+以及已废弃的 view_records（每个访客 IP 一条，会随访客数量无限增长）
+
+用法:
+    python strip_computed_fields.py            清理后端当前使用的存储（读取 STORAGE_ENGINE / DATA_DIR / SQLITE_PATH）
+    python strip_computed_fields.py db.json    清理旧版单文件快照
+"""
+
+import os
+import sys
+
+import jsoncodec
+
+from projections import COMPUTED_POST_FIELDS, OBSOLETE_POST_FIELDS
+from storage import create_storage
+
+
+def leaked_fields(post):
+    return [field for field in COMPUTED_POST_FIELDS + OBSOLETE_POST_FIELDS if field in post]
+
+
+def strip_storage(storage):
+    """在一个事务里删除所有文章中的计算字段与废弃字段，返回 (清理的文章数, 删除的字段数)"""
+    posts_cleaned = fields_removed = 0
+    with storage.transaction() as tx:
+        for post in tx.all("posts"):
+            fields = leaked_fields(post)
+            if fields:
+                tx.unset("posts", post["id"], fields)
+                posts_cleaned += 1
+                fields_removed += len(fields)
+    return posts_cleaned, fields_removed
+
+
+def strip_snapshot_file(path):
+    """清理旧版 db.json（保持原有格式），返回 (清理的文章数, 删除的字段数)"""
+    data = jsoncodec.load(path)
+    posts_cleaned = fields_removed = 0
+    for post in data.get("posts", []):
+        fields = leaked_fields(post)
+        for field in fields:
+            del post[field]
+        if fields:
+            posts_cleaned += 1
+            fields_removed += len(fields)
+    if posts_cleaned:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(jsoncodec.dumps(data, indent=True))
+        os.replace(tmp_path, path)
+    return posts_cleaned, fields_removed
+
+
+def main(argv):
+    if len(argv) > 1:
+        path = argv[1]
+        print(f"🧹 清理快照文件 {path}")
+        posts_cleaned, fields_removed = strip_snapshot_file(path)
+    else:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        engine = os.getenv("STORAGE_ENGINE", "json")
+        data_dir = os.getenv("DATA_DIR", os.path.join(script_dir, "data"))
+        sqlite_path = os.getenv("SQLITE_PATH", os.path.join(script_dir, "blog.sqlite3"))
+        print(f"🧹 清理 {engine} 存储")
+        storage = create_storage(engine, data_dir, os.path.join(script_dir, "db.json"), sqlite_path)
+        try:
+            posts_cleaned, fields_removed = strip_storage(storage)
+        finally:
+            # json 引擎关闭时会压缩，清理结果写回分段文件
+            storage.close()
+
+    print("✅ 清理完成！")
+    print(f"📊 清理了 {posts_cleaned} 篇文章，删除 {fields_removed} 个字段")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv) else 1)
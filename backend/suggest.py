@@ -0,0 +1,244 @@
+"""
+搜索框的输入提示（/search/suggest），以及 /search/tags、/search/users
+
+标签（名称、描述）、用户（用户名、邮箱前缀）、文章标题分别建一个前缀索引：
+切词与全文搜索相同（tokenizer.py），所有词排成有序数组，查询的最后一个词按前缀
+二分查找，前面的词要求完整出现。结果按热度排序：标签按 post_count，用户按
+followers_count，文章按 views_count。
+
+每个词的条目列表按热度从高到低排好，前缀命中的词不多时把这几个列表归并，取到
+limit 条即停；命中的词多而条目少时（如用户名）把它们合在一起排序；前缀很短、
+命中的条目很多时（如只输入了一个字母），改为按热度顺序逐个检查全部条目——这时
+匹配的很多，很快就能凑够。每次按键只需检查很少的条目，与总数无关。
+"""
+
+import heapq
+import sys
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+
+from tokenizer import tokenize
+
+# 前缀命中的词不超过 KEY_LIMIT 个时归并各词的列表；更多时，命中的条目不超过
+# CANDIDATE_LIMIT 个则合在一起排序，否则按热度顺序逐个检查全部条目
+KEY_LIMIT = 32
+CANDIDATE_LIMIT = 1024
+
+
+def parse_query(query):
+    """查询拆成 (必须完整出现的词, 最后一个词作为前缀)；切不出词时前缀为 None"""
+    terms = tokenize(query)
+    if not terms:
+        return frozenset(), None
+    return frozenset(terms[:-1]), terms[-1]
+
+
+class PrefixIndex:
+    """
+    一类条目（标签、用户或文章）的前缀索引
+
+    _keys 为全部词的有序数组；_postings[词] 为包含它的条目，_ranked 为全部条目，
+    都是按 (-热度, id) 升序的数组，即热度从高到低。修改时二分查找原地调整。
+    """
+
+    def __init__(self, entries=()):
+        """entries 为 (id, 文本, 热度)，一次性排序建立"""
+        self._terms = {}
+        self._scores = {}
+        postings = {}
+        for item_id, text, score in entries:
+            terms = self._terms[item_id] = _terms(text)
+            score = self._scores[item_id] = score or 0
+            for term in terms:
+                postings.setdefault(term, []).append((-score, item_id))
+        for entries in postings.values():
+            entries.sort()
+        self._postings = postings
+        self._keys = sorted(postings)
+        self._ranked = sorted((-score, item_id) for item_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, item_id, text, score):
+        """加入或更新一个条目：text 为参与匹配的文本，score 为热度"""
+        self.remove(item_id)
+        terms = self._terms[item_id] = _terms(text)
+        score = self._scores[item_id] = score or 0
+        entry = (-score, item_id)
+        for term in terms:
+            entries = self._postings.get(term)
+            if entries is None:
+                entries = self._postings[term] = []
+                insort(self._keys, term)
+            insort(entries, entry)
+        insort(self._ranked, entry)
+
+    def rescore(self, item_id, score):
+        """只更新热度"""
+        old = self._scores.get(item_id)
+        if old is None or old == (score or 0):
+            return
+        old_entry, entry = (-old, item_id), (-(score or 0), item_id)
+        for entries in [*(self._postings[term] for term in self._terms[item_id]), self._ranked]:
+            del entries[bisect_left(entries, old_entry)]
+            insort(entries, entry)
+        self._scores[item_id] = score or 0
+
+    def remove(self, item_id):
+        score = self._scores.pop(item_id, None)
+        if score is None:
+            return
+        entry = (-score, item_id)
+        for term in self._terms.pop(item_id):
+            entries = self._postings[term]
+            del entries[bisect_left(entries, entry)]
+            if not entries:
+                del self._postings[term]
+                del self._keys[bisect_left(self._keys, term)]
+        del self._ranked[bisect_left(self._ranked, entry)]
+
+    def score(self, item_id):
+        return self._scores.get(item_id)
+
+    def matches(self, required, prefix):
+        """按热度从高到低遍历匹配的条目 id"""
+        if prefix is None:
+            return
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\U0010ffff", lo)
+        if hi - lo <= KEY_LIMIT:
+            # 命中的词不多：归并这几个词的列表
+            sources = [self._postings[key] for key in self._keys[lo:hi]]
+        else:
+            sources = []
+            total = 0
+            for i in range(lo, hi):
+                sources.append(self._postings[self._keys[i]])
+                total += len(sources[-1])
+                if total > CANDIDATE_LIMIT:
+                    sources = None
+                    break
+            if sources is not None:
+                # 命中的词多但条目少（如用户名）：直接合在一起排序
+                sources = [sorted(entry for entries in sources for entry in entries)]
+        # 必须出现的词中有更少见的，从它出发
+        rarest = min((self._postings.get(term, ()) for term in required), key=len, default=None)
+        if rarest is not None and (sources is None or len(rarest) < sum(map(len, sources))):
+            sources = [rarest]
+        if sources is None:
+            # 前缀很短，匹配的条目很多，按热度顺序逐个检查，很快就能凑够
+            for _, item_id in self._ranked:
+                terms = self._terms[item_id]
+                if required <= terms and any(term.startswith(prefix) for term in terms):
+                    yield item_id
+            return
+        keys = frozenset(self._keys[lo:hi])
+        seen = set()
+        for _, item_id in heapq.merge(*sources):
+            # 同一条目可能出现在多个词的列表里
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            terms = self._terms[item_id]
+            if required <= terms and not keys.isdisjoint(terms):
+                yield item_id
+
+
+def _terms(text):
+    return frozenset(sys.intern(term) for term in tokenize(text))
+
+
+# 各类条目参与匹配的文本与热度
+def _tag_entry(tag):
+    return f"{tag.get('name') or ''} {tag.get('description') or ''}", tag.get("post_count")
+
+
+def _user_entry(user):
+    email = (user.get("email") or "").split("@")[0]
+    return f"{user.get('username') or ''} {email}", user.get("followers_count")
+
+
+def _post_entry(post):
+    return post.get("title") or "", post.get("views_count")
+
+
+ENTRIES = {"tags": _tag_entry, "users": _user_entry, "posts": _post_entry}
+
+
+class Suggestions:
+    """
+    标签、用户、文章标题的输入提示
+
+    on_change 注册为存储的变更监听，增删改即时反映（只有计数变化时不重新切词）；
+    无法得知具体改动时整体重建，重建期间的变更在完成后补上。
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._indexes = {collection: PrefixIndex() for collection in ENTRIES}
+        # 重建期间收到的变更，重建完成后补上
+        self._rebuilding = None
+        self.rebuild()
+
+    def rebuild(self):
+        """从存储重新建立全部前缀索引"""
+        with self._rebuild_lock:
+            with self._lock:
+                self._rebuilding = []
+            with self.storage.pinned():
+                indexes = {
+                    collection: PrefixIndex((record["id"], *entry(record)) for record in self.storage.all(collection))
+                    for collection, entry in ENTRIES.items()
+                }
+            with self._lock:
+                changes, self._rebuilding = self._rebuilding, None
+                self._indexes = indexes
+                self._apply(changes)
+
+    def on_change(self, changes):
+        """存储的变更监听"""
+        if changes is None:
+            self.rebuild()
+            return
+        changes = [change for change in changes if change.collection in ENTRIES]
+        if not changes:
+            return
+        with self._lock:
+            self._apply(changes)
+            if self._rebuilding is not None:
+                self._rebuilding.extend(changes)
+
+    def _apply(self, changes):
+        """把变更写进前缀索引（需持有锁）"""
+        for change in changes:
+            index = self._indexes[change.collection]
+            if change.after is None:
+                index.remove(change.id)
+                continue
+            entry = ENTRIES[change.collection]
+            text, score = entry(change.after)
+            if change.before is not None and entry(change.before)[0] == text and index.score(change.id) is not None:
+                index.rescore(change.id, score)
+            else:
+                index.set(change.id, text, score)
+
+    def search(self, kind, query, offset=0, limit=None):
+        """某一类（"tags" / "users" / "posts"）中匹配的条目按热度排序，返回 ([id], 匹配总数)"""
+        required, prefix = parse_query(query)
+        with self._lock:
+            matched = list(self._indexes[kind].matches(required, prefix))
+        end = None if limit is None else offset + limit
+        return matched[offset:end], len(matched)
+
+    def suggest(self, query, limit=5):
+        """各类中最热门的 limit 条：{"tags": [id], "users": [id], "posts": [id]}"""
+        required, prefix = parse_query(query)
+        with self._lock:
+            return {
+                kind: list(islice(index.matches(required, prefix), limit))
+                for kind, index in self._indexes.items()
+            }
@@ -0,0 +1,66 @@
+"""
+全文搜索的切词
+
+文章大多是中文夹杂英文的 Markdown，按空格切分没有意义。切词分几步：
+去掉 Markdown 语法（链接地址、图片地址、HTML 标签、代码块标记等），NFKC 归一化
+（全角字母数字、全角标点转半角），转小写，然后把连续的中日韩文字切成相邻两字
+一组的二元词（“前端开发” -> 前端、端开、开发），其余连续的字母数字作为一个词。
+单独出现的一个汉字保留为单字词。查询中的单个汉字（如逐字输入时的第一个字）由搜索
+按前缀匹配以它开头的二元词（见 search.py）。
+"""
+
+import re
+import unicodedata
+
+# 中日韩文字：统一表意文字（含扩展 A、兼容表意文字）、假名、谚文音节
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+
+# NFKC 会改变、且切词时不会被当作标点丢弃的字符：兼容表意文字、连字、全角字母数字、
+# 半角片假名、组合附加符号。文本里没有这些字符时跳过归一化（中文的全角标点本来就会被丢弃）
+_NEEDS_NFKC = re.compile("[\uf900-\ufaff\ufb00-\ufb4f\uff10-\uff19\uff21-\uff3a\uff41-\uff5a\uff65-\uff9f\u0300-\u036f]")
+
+_TOKEN = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RUN = re.compile(rf"[{_CJK}]")
+
+_MARKDOWN = [
+    (re.compile(r"^\s*(```|~~~).*$", re.MULTILINE), " "),     # 代码块围栏（保留代码内容）
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r" \1 "),          # 图片：只留替代文字
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r" \1 "),           # 链接：只留链接文字
+    (re.compile(r"^\s*\[[^\]]+\]:\s*\S+.*$", re.MULTILINE), " "),  # 引用式链接的定义
+    (re.compile(r"<[^>\n]+>"), " "),                           # HTML 标签、自动链接
+    (re.compile(r"https?://\S+"), " "),                        # 裸地址
+]
+
+
+def strip_markdown(text):
+    """去掉 Markdown 中不属于正文的部分；强调、标题等符号在切词时自然会被丢弃"""
+    for pattern, replacement in _MARKDOWN:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def normalize(text):
+    """NFKC 归一化（全角转半角）并转小写"""
+    if _NEEDS_NFKC.search(text):
+        text = unicodedata.normalize("NFKC", text)
+    return text.lower()
+
+
+def tokenize(text, markdown=False):
+    """切词，返回词的列表（按出现顺序，可重复）"""
+    if not text:
+        return []
+    if markdown:
+        text = strip_markdown(text)
+    tokens = []
+    for run in _TOKEN.findall(normalize(text)):
+        if len(run) > 1 and _CJK_RUN.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def is_single_cjk(token):
+    """单个中日韩文字的词：文章中连续出现的汉字只按二元词索引"""
+    return len(token) == 1 and _CJK_RUN.match(token) is not None
@@ -0,0 +1,85 @@
+"""
+文章浏览量统计
+
+- ViewDeduplicator：同一 (文章, 客户端) 在去重窗口内只计一次浏览，内存占用有上限
+- ViewCounter：浏览量先在内存中累加，由后台任务批量写入 views_count
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class ViewDeduplicator:
+    """
+    按时间分桶的哈希集合
+
+    每个桶覆盖 window / slots 秒，只保留最近 slots + 1 个桶，过期的桶整体丢弃，
+    因此同一个键至少在 window 秒内被视为重复。每个桶最多记录固定数量的键：
+    桶满时新访问照常计数但不再记录（宁可多计，也不丢浏览量）。
+    """
+
+    def __init__(self, window=60, slots=4, capacity=100_000, clock=time.monotonic):
+        self.slot_seconds = window / slots
+        self._keep = slots + 1
+        self._bucket_capacity = max(1, capacity // self._keep)
+        self._clock = clock
+        self._buckets = deque()  # (时间片序号, 键集合)
+        self._lock = threading.Lock()
+
+    def first_view(self, post_id, client):
+        """窗口内第一次访问返回 True（应计入浏览量）"""
+        key = hash((post_id, client))
+        slot = int(self._clock() // self.slot_seconds)
+        with self._lock:
+            while self._buckets and self._buckets[0][0] <= slot - self._keep:
+                self._buckets.popleft()
+            if any(key in keys for _, keys in self._buckets):
+                return False
+            if not self._buckets or self._buckets[-1][0] != slot:
+                self._buckets.append((slot, set()))
+            current = self._buckets[-1][1]
+            if len(current) < self._bucket_capacity:
+                current.add(key)
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(keys) for _, keys in self._buckets)
+
+
+class ViewCounter:
+    """浏览量在内存中累加，flush() 时在一个事务里批量加到文章的 views_count"""
+
+    def __init__(self, storage, field="views_count"):
+        self.storage = storage
+        self.field = field
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, post_id):
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + 1
+
+    def pending(self, post_id):
+        """尚未写入存储的浏览量"""
+        return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """写入累计的浏览量，返回写入的总数；失败时保留到下次"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self.storage.transaction() as tx:
+                for post_id, delta in pending.items():
+                    # 期间被删除的文章直接丢弃
+                    if tx.get("posts", post_id):
+                        tx.increment("posts", post_id, self.field, delta)
+        except Exception:
+            with self._lock:
+                for post_id, delta in pending.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + delta
+            raise
+        return sum(pending.values())
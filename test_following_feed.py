@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+关注动态回归测试
+
+随机发文、关注、取关、删文、修改发布时间，定期把 FollowingFeed 给出的时间线
+（完整遍历，以及按游标逐页读取）与直接扫描存储得到的结果对比。容量、扇出阈值
+和缓存的用户数都调得很小，覆盖时间线截断、热门作者读时合并和 LRU 淘汰。
+json 与 sqlite 两种引擎各跑一遍。
+
+用法：python test_following_feed.py [随机种子]        也可以用 pytest 运行
+"""
+
+import os
+import random
+import sys
+import tempfile
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from feed import FollowingFeed  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+USERS = 30
+PAGE_SIZE = 5
+
+
+def brute_force(storage, user_id):
+    """关注的作者的全部文章，按 (created_at, id) 倒序"""
+    authors = {follow["followingId"] for follow in storage.find("follows", followerId=user_id)}
+    posts = [post for post in storage.all("posts") if post["authorId"] in authors]
+    posts.sort(key=lambda post: (post["created_at"], post["id"]), reverse=True)
+    return [post["id"] for post in posts]
+
+
+def paged(storage, feed, user_id):
+    """按游标逐页读取整条时间线"""
+    ids, after = [], None
+    while True:
+        page = list(islice(feed.posts(user_id, after), PAGE_SIZE))
+        if not page:
+            return ids
+        ids += page
+        last = storage.get("posts", page[-1])
+        after = (last["created_at"], last["id"])
+
+
+def _step(tx, rng, clock):
+    op = rng.random()
+    if op < 0.4:
+        tx.insert("posts", {"authorId": rng.randint(1, USERS), "created_at": f"2025-{clock:06d}", "title": "x"})
+    elif op < 0.55:
+        # 偏向关注少数几个作者，让他们成为热门作者
+        follower, author = rng.randint(1, USERS), rng.choice([1, 2, 3, rng.randint(1, USERS)])
+        if not tx.find_one("follows", followerId=follower, followingId=author):
+            tx.insert("follows", {"followerId": follower, "followingId": author})
+    elif op < 0.62:
+        follows = tx.all("follows")
+        if follows:
+            tx.delete("follows", rng.choice(follows)["id"])
+    elif op < 0.7:
+        posts = tx.all("posts")
+        if posts:
+            tx.delete("posts", rng.choice(posts)["id"])
+    elif op < 0.75:
+        posts = tx.all("posts")
+        if posts:
+            tx.update("posts", rng.choice(posts)["id"], {"created_at": f"2025-{rng.randint(0, clock):06d}"})
+
+
+def check_feed(engine, seed=1, steps=1500):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        storage = create_storage(engine, os.path.join(directory, "data"), None, os.path.join(directory, "blog.sqlite3"))
+        with storage.transaction() as tx:
+            for i in range(USERS):
+                tx.insert("users", {"email": f"u{i}@test.com"})
+        feed = FollowingFeed(storage, capacity=7, fanout_limit=4, max_users=10)
+        storage.subscribe(feed.on_change)
+        clock = 0
+        for step in range(steps):
+            # 时钟有时不前进，制造相同的发布时间
+            clock += rng.choice([1, 1, 0])
+            with storage.transaction() as tx:
+                _step(tx, rng, clock)
+            if step % 10:
+                continue
+            user_id = rng.randint(1, USERS)
+            expected = brute_force(storage, user_id)
+            assert list(feed.posts(user_id)) == expected, f"{engine} 第 {step} 步: 用户 {user_id} 的时间线不一致"
+            assert paged(storage, feed, user_id) == expected, f"{engine} 第 {step} 步: 用户 {user_id} 逐页读取不一致"
+        storage.close()
+
+
+def test_feed_json():
+    check_feed("json")
+
+
+def test_feed_sqlite():
+    check_feed("sqlite")
+
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for engine in ("json", "sqlite"):
+        check_feed(engine, seed)
+        print(f"✅ PASS {engine} seed {seed}: 关注动态与直接扫描一致")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+搜索索引重启回归测试
+
+正常关闭后重启，存储各集合的版本应与关闭前一致，磁盘上的搜索段直接沿用，
+不应整体重建。分别检查 json 与 sqlite 引擎：先写文章，再写其他集合（会话、
+浏览记录之类），使文章的版本落后于整体的日志序号。
+
+用法：python test_search_restart.py        也可以用 pytest 运行
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import search  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+def _open(engine, directory):
+    storage = create_storage(engine, os.path.join(directory, "data"), None, os.path.join(directory, "blog.sqlite3"))
+    index = SearchIndex(storage, os.path.join(directory, "search"))
+    storage.subscribe(index.on_change)
+    return storage, index
+
+
+def _shutdown(storage, index):
+    # 与 main.py 的 lifespan 相同：先合并搜索段，再关闭存储
+    index.merge()
+    storage.close()
+
+
+def check_restart(engine):
+    builds = []
+    build_segment = search.build_segment
+
+    def counting_build(*args, **kwargs):
+        builds.append(args)
+        return build_segment(*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage, index = _open(engine, directory)
+        with storage.transaction() as tx:
+            author = tx.insert("users", {"email": "restart@test.com", "username": "restart"})
+            tx.insert("posts", {"authorId": author["id"], "title": "Rust 入门", "content": "所有权与借用检查", "tags": []})
+        # 文章之后再写别的集合
+        with storage.transaction() as tx:
+            tx.insert("sessions", {"userId": author["id"], "token": "t"})
+        before = storage.version("posts")
+        _shutdown(storage, index)
+
+        search.build_segment = counting_build
+        try:
+            for _ in range(2):
+                storage, index = _open(engine, directory)
+                assert storage.version("posts") == before, f"{engine}: 文章版本 {before} -> {storage.version('posts')}"
+                assert not index._stale, f"{engine}: 重启后搜索段被判为过期"
+                assert index.search("借用", 0, 10)[1] == 1
+                _shutdown(storage, index)
+        finally:
+            search.build_segment = build_segment
+        assert not builds, f"{engine}: 重启后重建了 {len(builds)} 次搜索段"
+
+
+def test_restart_json():
+    check_restart("json")
+
+
+def test_restart_sqlite():
+    check_restart("sqlite")
+
+
+if __name__ == "__main__":
+    for engine in ("json", "sqlite"):
+        check_restart(engine)
+        print(f"✅ PASS {engine}: 重启后沿用搜索段")
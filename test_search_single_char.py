@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+单字搜索回归测试
+
+文章里连续的汉字只按二元词索引，查询单个汉字（逐字输入时的第一个字）应匹配以它
+开头的二元词以及单独出现的这个字。分别检查段文件中的文章、段之后新增的文章
+（增量层）、删除的文章，以及单字与其他词组合的查询。
+
+用法：python test_search_single_char.py        也可以用 pytest 运行
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from search import SearchIndex  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+def _ids(index, query):
+    hits, total = index.search(query)
+    assert total == len(hits)
+    return {post_id for post_id, _ in hits}
+
+
+def check_single_char(engine):
+    with tempfile.TemporaryDirectory() as directory:
+        storage = create_storage(engine, os.path.join(directory, "data"), None, os.path.join(directory, "blog.sqlite3"))
+        with storage.transaction() as tx:
+            frontend = tx.insert("posts", {"title": "前端开发入门", "content": "vue 组件"})["id"]
+            alone = tx.insert("posts", {"title": "向 前 看", "content": "python"})["id"]
+            backend = tx.insert("posts", {"title": "后端开发", "content": "数据库"})["id"]
+        # 以上文章在段文件里，之后的修改进增量层
+        index = SearchIndex(storage, os.path.join(directory, "search"))
+        storage.subscribe(index.on_change)
+        assert _ids(index, "前") == {frontend, alone}
+        assert _ids(index, "开") == {frontend, backend}
+
+        with storage.transaction() as tx:
+            later = tx.insert("posts", {"title": "前面的路", "content": "vue"})["id"]
+        assert _ids(index, "前") == {frontend, alone, later}
+        # 单字与其他词组合：都要出现
+        assert _ids(index, "vue 前") == {frontend, later}
+        assert _ids(index, "前 python") == {alone}
+
+        with storage.transaction() as tx:
+            tx.delete("posts", frontend)
+            tx.update("posts", backend, {"title": "前沿技术"})
+        assert _ids(index, "前") == {alone, later, backend}
+        index.merge()
+        assert _ids(index, "前") == {alone, later, backend}
+        assert _ids(index, "后") == set()
+        storage.close()
+
+
+def test_single_char_json():
+    check_single_char("json")
+
+
+def test_single_char_sqlite():
+    check_single_char("sqlite")
+
+
+if __name__ == "__main__":
+    for engine in ("json", "sqlite"):
+        check_single_char(engine)
+        print(f"✅ PASS {engine}: 单个汉字匹配以它开头的二元词")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+SQLite 多进程同步回归测试
+
+两个 SqliteStore 实例共用一个数据库文件，模拟两个 worker。一方随机写入，另一方
+穿插着自己的写入和 refresh()；监听者只凭收到的变更维护一份记录副本，应始终与
+数据库一致，而且只有变更日志被清理后才会收到整体重建（changes 为 None）。
+
+用法：python test_sqlite_refresh.py [随机种子]        也可以用 pytest 运行
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlite_store import SqliteStore  # noqa: E402
+
+COLLECTIONS = ["posts", "tags"]
+
+
+class Mirror:
+    """只凭变更通知维护的记录副本"""
+
+    def __init__(self, store):
+        self.store = store
+        self.rebuilds = 0
+        self.load()
+
+    def load(self):
+        self.records = {(c, r["id"]): r for c in COLLECTIONS for r in self.store.all(c)}
+
+    def on_change(self, changes):
+        if changes is None:
+            self.rebuilds += 1
+            self.load()
+            return
+        for change in changes:
+            key = (change.collection, change.id)
+            current = self.records.get(key)
+            # 变更按提交顺序到达：before 必须与副本中的记录一致
+            assert current == change.before, f"{key}: 副本 {current} 与变更前 {change.before} 不一致"
+            if change.after is None:
+                del self.records[key]
+            else:
+                self.records[key] = change.after
+
+
+def _write(store, rng):
+    with store.transaction() as tx:
+        for _ in range(rng.randint(1, 3)):
+            collection = rng.choice(COLLECTIONS)
+            records = tx.all(collection)
+            op = rng.random()
+            if op < 0.45 or not records:
+                tx.insert(collection, {"name": f"n{rng.randint(0, 99)}", "count": 0})
+            elif op < 0.8:
+                tx.increment(collection, rng.choice(records)["id"], "count")
+            else:
+                tx.delete(collection, rng.choice(records)["id"])
+
+
+def check_refresh(seed=0, steps=400):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "blog.sqlite3")
+        writer, reader = SqliteStore(path), SqliteStore(path)
+        mirror = Mirror(reader)
+        reader.subscribe(mirror.on_change)
+        for step in range(steps):
+            op = rng.random()
+            if op < 0.5:
+                _write(writer, rng)
+            elif op < 0.75:
+                _write(reader, rng)
+            else:
+                reader.refresh()
+                expected = {(c, r["id"]): r for c in COLLECTIONS for r in reader.all(c)}
+                assert mirror.records == expected, f"第 {step} 步: 副本与数据库不一致"
+        assert mirror.rebuilds == 0, f"收到 {mirror.rebuilds} 次整体重建"
+
+        # 变更日志被清理后，落后的 worker 只能整体重建
+        _write(writer, rng)
+        writer.change_log_retention = -1
+        writer.maintain()
+        reader.refresh()
+        assert mirror.rebuilds == 1
+        assert mirror.records == {(c, r["id"]): r for c in COLLECTIONS for r in reader.all(c)}
+        writer.close()
+        reader.close()
+
+
+def test_refresh_delivers_changes():
+    for seed in range(3):
+        check_refresh(seed)
+
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    check_refresh(seed)
+    print(f"✅ PASS seed {seed}: refresh 逐条通知其他进程的提交")
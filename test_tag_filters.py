@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+多标签查询回归测试
+
+对 json 与 sqlite 引擎做同样的随机增删改，定期用随机的 contains（全部包含）/
+contains_any（包含其一）条件、排序字段与方向、附加条件、游标、offset 和 limit
+查询文章，结果的 id 与总数都应与逐条过滤、排序的结果一致。
+
+用法：python test_tag_filters.py [随机种子]        也可以用 pytest 运行
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from storage import create_storage, matches_contains, sort_key  # noqa: E402
+
+TAGS = list("abcdefg")
+
+
+def _random_post(rng):
+    return {
+        "authorId": rng.randint(1, 3),
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+        "likes_count": rng.choice([None, 0, 1, 2, 3]),
+        "created_at": f"{rng.randint(0, 50):03d}",
+    }
+
+
+def _random_query(rng, records):
+    """随机的查询参数，以及逐条过滤、排序得到的 (id 列表, 总数)"""
+    names = rng.sample(TAGS, rng.randint(1, 3))
+    filters = {"contains": {"tags": names}} if rng.random() < 0.5 else {"contains_any": {"tags": names}}
+    order_by = rng.choice([None, "created_at", "likes_count"])
+    descending = order_by is not None and rng.random() < 0.5
+    conditions = {"authorId": rng.randint(1, 3)} if rng.random() < 0.3 else {}
+    limit, offset = rng.choice([None, 1, 3, 10]), rng.choice([0, 0, 2])
+
+    matched = [
+        record for record in records
+        if matches_contains(record, **filters) and all(record.get(k) == v for k, v in conditions.items())
+    ]
+
+    def key(record):
+        return (sort_key(record, order_by), record["id"]) if order_by else record["id"]
+
+    matched.sort(key=key, reverse=descending)
+    after, page = None, matched
+    if matched and rng.random() < 0.5:
+        pivot = rng.choice(matched)
+        after = (pivot.get(order_by) if order_by else None, pivot["id"])
+        page = [record for record in matched if (key(record) < key(pivot) if descending else key(record) > key(pivot))]
+    end = None if limit is None else offset + limit
+    options = dict(order_by=order_by, descending=descending, offset=offset, limit=limit, after=after,
+                   **filters, **conditions)
+    return options, [record["id"] for record in page[offset:end]], len(matched)
+
+
+def check_tag_filters(seed=0, steps=600):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        engines = [
+            create_storage("json", os.path.join(directory, "data"), None, None),
+            create_storage("sqlite", os.path.join(directory, "sqlite"), None, os.path.join(directory, "blog.sqlite3")),
+        ]
+        for step in range(steps):
+            op = rng.random()
+            existing = engines[0].all("posts")
+            if op < 0.5 or not existing:
+                post = _random_post(rng)
+                ids = set()
+                for storage in engines:
+                    with storage.transaction() as tx:
+                        ids.add(tx.insert("posts", post)["id"])
+                assert len(ids) == 1
+            elif op < 0.75:
+                post_id = rng.choice(existing)["id"]
+                changes = rng.choice([{"tags": rng.sample(TAGS, 2)}, {"likes_count": rng.randint(0, 5)}, {"authorId": 2}])
+                for storage in engines:
+                    with storage.transaction() as tx:
+                        tx.update("posts", post_id, changes)
+            else:
+                post_id = rng.choice(existing)["id"]
+                for storage in engines:
+                    with storage.transaction() as tx:
+                        tx.delete("posts", post_id)
+            if step % 5:
+                continue
+            for _ in range(5):
+                options, expected, total = _random_query(rng, engines[0].all("posts"))
+                for storage in engines:
+                    records, got_total = storage.query("posts", **options)
+                    name = type(storage).__name__
+                    assert [record["id"] for record in records] == expected, f"{name} 第 {step} 步: {options}"
+                    assert got_total == total, f"{name} 第 {step} 步: 总数 {got_total} != {total}，{options}"
+        for storage in engines:
+            storage.close()
+
+
+def test_tag_filters():
+    for seed in range(3):
+        check_tag_filters(seed)
+
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    check_tag_filters(seed)
+    print(f"✅ PASS seed {seed}: 多标签查询与逐条过滤一致")